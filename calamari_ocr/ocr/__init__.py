@@ -1,5 +1,5 @@
 from calamari_ocr.ocr.codec import Codec
-from calamari_ocr.ocr.dataset import FileDataSet, DataSet, RawDataSet
+from calamari_ocr.ocr.dataset import FileDataSet, DataSet, RawDataSet, PackedDataSet
 from calamari_ocr.ocr.evaluator import Evaluator
 from calamari_ocr.ocr.predictor import Predictor, MultiPredictor, PredictionResult
 from calamari_ocr.ocr.trainer import Trainer
@@ -14,7 +14,7 @@ class DataAugmenter(ABC):
         if n_augmentations <= 0:
             return data, gt_txt
 
-        return zip(*[self.augment_single(data, gt_txt) for _ in range(n_augmentations)])
+        return tuple(zip(*[self.augment_single(data, gt_txt) for _ in range(n_augmentations)]))
 
     def augment_data_tuple(self, t):
         return self.augment_data(*t)
@@ -10,7 +10,7 @@ class CTCDecoder(ABC):
         super().__init__()
 
     @abstractmethod
-    def decode(self, probabilities):
+    def decode(self, probabilities, lazy=False):
         """
         Decoding algorithm of the individual CTCDecoder. This abstract function is reimplemented
         by the DefaultCTCDecoder and the FuzzyCTCDecoder.
@@ -20,6 +20,8 @@ class CTCDecoder(ABC):
         probabilities : array_like
             Prediction probabilities of the neural net to decode or shape (length x character probability).
             The blank index must be 0.
+        lazy : bool
+            Return a LazyPrediction instead of a Prediction object
 
         Returns
         -------
@@ -27,7 +29,27 @@ class CTCDecoder(ABC):
         """
         return Prediction()
 
-    def find_alternatives(self, probabilities, sentence, threshold):
+    def decode_batch(self, probabilities, seq_len, lazy=False):
+        """
+        Decode a full batch of predictions
+
+        Parameters
+        ----------
+        probabilities : array_like
+            Prediction probabilities of the neural net of shape (batch x length x character probability).
+            The blank index must be 0.
+        seq_len : array_like
+            The valid length of each sequence in the batch
+        lazy : bool
+            Return LazyPredictions instead of Prediction objects
+
+        Returns
+        -------
+            list of Prediction objects
+        """
+        return [self.decode(p[:s], lazy=lazy) for p, s in zip(probabilities, seq_len)]
+
+    def find_alternatives(self, probabilities, sentence, threshold, lazy=False):
         """
         Find alternatives to the decoded sentence in the logits.
         E.g. if a 'c' is decoded in the range 2 to 4, this algorithm will add all characters in the interval [2, 4] to
@@ -44,31 +66,124 @@ class CTCDecoder(ABC):
             The position refer to the character position in the logits.
         threshold : float
             Minimum confidence for alternative characters to be listed.
+        lazy : bool
+            Return a LazyPrediction that creates the Prediction object only on demand
         Returns
         -------
-            a Prediction object
+            a Prediction object (or LazyPrediction if `lazy`)
+
+        """
+        labels = np.array([c for c, _, _ in sentence], dtype=np.int64)
+        starts = np.array([start for _, start, _ in sentence], dtype=np.int64)
+        ends = np.array([end for _, _, end in sentence], dtype=np.int64)
+
+        if len(sentence) == 0:
+            alternatives = LazyPrediction(probabilities, labels, starts, ends,
+                                          np.zeros(0, dtype=np.int64), np.zeros(0, dtype=probabilities.dtype),
+                                          np.zeros(0, dtype=np.int64))
+            return alternatives if lazy else alternatives.to_prediction()
+
+        n_classes = probabilities.shape[1]
+
+        # maximum probability of each class in the range of each character
+        # reduceat reduces up to the next index (and the last index up to the end)
+        ranges = np.stack([starts, ends], axis=1).reshape([-1])
+        if ranges[-1] >= len(probabilities):
+            ranges = ranges[:-1]
+
+        p = np.maximum.reduceat(probabilities, ranges, axis=0)[::2]
+
+        # select the top k candidates of all positions, k is the maximum number of characters above the threshold
+        n_alternatives = np.sum(p >= threshold, axis=1)
+        k = min(max(1, np.max(n_alternatives)), n_classes)
+        rows = np.arange(len(p))[:, np.newaxis]
+        if k < n_classes:
+            candidates = np.argpartition(-p, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(n_classes), (len(p), 1))
+
+        # sort by descending probability, on equal probabilities the higher label comes first
+        candidates = candidates[rows, np.lexsort((-candidates, -p[rows, candidates]), axis=1)]
 
+        # positions without any character above the threshold keep the best one
+        no_alternative = n_alternatives == 0
+        candidates[no_alternative, 0] = n_classes - 1 - np.argmax(p[no_alternative, ::-1], axis=1)
+        n_alternatives = np.maximum(n_alternatives, 1)
+
+        mask = np.arange(k)[np.newaxis, :] < n_alternatives[:, np.newaxis]
+        alternative_labels = candidates[mask]
+        alternative_probabilities = p[np.nonzero(mask)[0], alternative_labels]
+
+        alternatives = LazyPrediction(probabilities, labels, starts, ends,
+                                      alternative_labels, alternative_probabilities, n_alternatives)
+        return alternatives if lazy else alternatives.to_prediction()
+
+
+class LazyPrediction:
+    def __init__(self, probabilities, labels, starts, ends, alternative_labels, alternative_probabilities,
+                 n_alternatives):
+        """
+        Decoded output of a CTCDecoder that creates the Prediction object only on demand.
+
+        Creating the protobuf messages of all alternatives is expensive but only required for voting or to write
+        extended prediction data.
+
+        Parameters
+        ----------
+        probabilities : array_like
+            Prediction of the neural net of shape (length x character probability).
+        labels : array_like
+            The decoded labels
+        starts : array_like
+            Start position of each label in the logits
+        ends : array_like
+            End position of each label in the logits
+        alternative_labels : array_like
+            Flat list of the alternative characters of all positions sorted by the probability per position
+        alternative_probabilities : array_like
+            The probabilities of the `alternative_labels`
+        n_alternatives : array_like
+            The number of alternatives of each position
+        """
+        self.logits = probabilities
+        self.labels = labels
+        self.starts = starts
+        self.ends = ends
+        self.alternative_labels = alternative_labels
+        self.alternative_probabilities = alternative_probabilities
+        self.n_alternatives = n_alternatives
+
+    def to_prediction(self, with_logits=True):
+        """
+        Create the Prediction object
+
+        Parameters
+        ----------
+        with_logits : bool
+            Copy the full prediction matrix into the logits of the Prediction. This is expensive in both memory
+            and serialization time.
+
+        Returns
+        -------
+            a Prediction object
         """
-        # find alternatives
         pred = Prediction()
-        pred.labels[:] = [c for c, _, _ in sentence]
+        pred.labels[:] = self.labels.tolist()
         pred.is_voted_result = False
-        pred.logits.rows, pred.logits.cols = probabilities.shape
-        pred.logits.data[:] = probabilities.reshape([-1])
-        for c, start, end in sentence:
-            p = probabilities[start:end]
-            p = np.max(p, axis=0)
+        if with_logits and self.logits is not None:
+            pred.logits.rows, pred.logits.cols = self.logits.shape
+            pred.logits.data[:] = self.logits.reshape([-1])
 
+        alternatives = zip(self.alternative_labels.tolist(), self.alternative_probabilities.tolist())
+        for start, end, n in zip(self.starts.tolist(), self.ends.tolist(), self.n_alternatives.tolist()):
             pos = pred.positions.add()
             pos.start = start
             pos.end = end
 
-            for label in reversed(sorted(range(len(p)), key=lambda v: p[v])):
-                if p[label] < threshold and len(pos.chars) > 0:
-                    break
-                else:
-                    char = pos.chars.add()
-                    char.label = label
-                    char.probability = p[label]
+            for _ in range(n):
+                label, probability = next(alternatives)
+                char = pos.chars.add()
+                char.label = label
+                char.probability = probability
 
         return pred
@@ -10,22 +10,50 @@ class DefaultCTCDecoder(CTCDecoder):
 
         super().__init__()
 
-    def decode(self, probabilities):
-        last_char = self.blank
-        chars = np.argmax(probabilities, axis=1)
-        sentence = []
-        for idx, c in enumerate(chars):
-            if c != self.blank:
-                if c != last_char:
-                    sentence.append((c, idx, idx + 1))
-                else:
-                    _, start, end = sentence[-1]
-                    del sentence[-1]
-                    sentence.append((c, start, idx + 1))
-
-            last_char = c
-
-        return self.find_alternatives(probabilities, sentence, self.threshold)
+    def decode(self, probabilities, lazy=False):
+        return self.decode_batch(probabilities[np.newaxis], [len(probabilities)], lazy=lazy)[0]
+
+    def decode_batch(self, probabilities, seq_len, lazy=False):
+        sentences = self.greedy_sentences(probabilities, seq_len)
+        return [self.find_alternatives(p[:s], sentence, self.threshold, lazy=lazy)
+                for p, s, sentence in zip(probabilities, seq_len, sentences)]
+
+    def greedy_sentences(self, probabilities, seq_len):
+        """
+        Best path decoding of a full batch. Repeated characters are merged and blanks are removed.
+
+        Parameters
+        ----------
+        probabilities : array_like
+            Prediction probabilities of shape (batch x length x character probability)
+        seq_len : array_like
+            The valid length of each sequence in the batch
+
+        Returns
+        -------
+            list of the decoded sentence (list of tuple (character index, start pos, end pos)) of each sequence
+        """
+        chars = np.argmax(probabilities, axis=2)
+        batch_size, max_len = chars.shape
+        valid = np.arange(max_len)[np.newaxis, :] < np.reshape(seq_len, (-1, 1))
+        blank_col = np.full((batch_size, 1), self.blank, dtype=chars.dtype)
+        prev_chars = np.concatenate([blank_col, chars[:, :-1]], axis=1)
+        next_chars = np.concatenate([chars[:, 1:], blank_col], axis=1)
+        next_valid = np.concatenate([valid[:, 1:], np.zeros((batch_size, 1), dtype=bool)], axis=1)
+
+        # a character spans the range of equal consecutive non blank labels
+        is_char = valid & (chars != self.blank)
+        starts = is_char & (chars != prev_chars)
+        ends = is_char & (~next_valid | (chars != next_chars))
+
+        batch_idx, start_idx = np.nonzero(starts)
+        _, end_idx = np.nonzero(ends)
+        labels = chars[batch_idx, start_idx]
+        splits = np.cumsum(np.bincount(batch_idx, minlength=batch_size))[:-1]
+
+        return [list(zip(c, s, e)) for c, s, e in zip(np.split(labels, splits),
+                                                      np.split(start_idx, splits),
+                                                      np.split(end_idx + 1, splits))]
 
     def prob_of_sentence(self, probabilities):
         # do a forward pass and compute the full sentence probability
@@ -35,4 +63,4 @@ class DefaultCTCDecoder(CTCDecoder):
 if __name__ == "__main__":
     d = DefaultCTCDecoder()
     r = d.decode(np.array(np.transpose([[0.8, 0, 0.7, 0.2, 0.1], [0.1, 0.4, 0.2, 0.7, 0.8], [0.1, 0.6, 0.1, 0.1, 0.1]])))
-    print(r)
\ No newline at end of file
+    print(r)
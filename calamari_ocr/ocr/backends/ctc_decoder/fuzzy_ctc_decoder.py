@@ -10,7 +10,7 @@ class FuzzyCTCDecoder(CTCDecoder):
         self._blank_threshold = blank_threshold
         self._alternatives_threshold = alternatives_threshold
 
-    def decode(self, probabilities):
+    def decode(self, probabilities, lazy=False):
         blanks = probabilities[:, self._blank] >= self._blank_threshold
         sentence = []
         # where blank is True 'character changes' are expected
@@ -30,7 +30,7 @@ class FuzzyCTCDecoder(CTCDecoder):
         # get the best char in each range
         sentence = [(np.argmax(np.max(probabilities[start:end], axis=0)), start, end) for _, start, end in sentence]
 
-        return self.find_alternatives(probabilities, sentence, self._alternatives_threshold)
+        return self.find_alternatives(probabilities, sentence, self._alternatives_threshold, lazy=lazy)
 
 
 if __name__ == "__main__":
@@ -135,7 +135,7 @@ class ModelInterface(ABC):
 
         Returns
         -------
-        list of Prediction
+        list of Prediction or LazyPrediction
 
         See Also
         --------
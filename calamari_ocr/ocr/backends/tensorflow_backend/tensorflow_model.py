@@ -8,11 +8,38 @@ from calamari_ocr.ocr.backends.model_interface import ModelInterface
 from calamari_ocr.proto import LayerParams, NetworkParams
 
 
+def default_bucket_boundaries(min_length=16, max_length=10000, growth=1.25):
+    """ Geometrically growing boundaries of the line length buckets
+
+    Lines within a bucket differ in length by at most `growth`, which bounds the padding in a batch.
+
+    Returns
+    -------
+    list of int
+        the bucket boundaries
+    """
+    boundaries = [min_length]
+    while boundaries[-1] < max_length:
+        boundaries.append(max(boundaries[-1] + 1, int(boundaries[-1] * growth)))
+
+    return boundaries
+
+
+def padding_ratio(seq_len):
+    """ Fraction of padded frames in a batch of sequences with lengths `seq_len` """
+    if len(seq_len) == 0:
+        return 0
+
+    return 1 - np.sum(seq_len) / (len(seq_len) * np.max(seq_len))
+
+
 class TensorflowModel(ModelInterface):
-    def __init__(self, network_proto, graph, session, graph_type="train", batch_size=1, reuse_weights=False):
+    def __init__(self, network_proto, graph, session, graph_type="train", batch_size=1, reuse_weights=False,
+                 bucket_boundaries=None):
         super().__init__(network_proto, graph_type, batch_size, implementation_handles_batching=True)
         self.graph = graph
         self.session = session
+        self.bucket_boundaries = bucket_boundaries if bucket_boundaries is not None else default_bucket_boundaries()
         self.gpu_available = any([d.device_type == "GPU" for d in self.session.list_devices()])
 
         # load fuzzy ctc module if available
@@ -28,10 +55,11 @@ class TensorflowModel(ModelInterface):
 
             # inputs either as placeholders or as data set (faster)
             if self.implementation_handles_batching:
-                self.inputs, self.input_seq_len, self.targets, self.dropout_rate, self.data_iterator = \
+                self.inputs, self.input_seq_len, self.targets, self.dropout_rate, self.input_indices, self.data_iterator = \
                     self.create_dataset_inputs(batch_size, network_proto.features)
             else:
                 self.data_iterator = None
+                self.input_indices = None
                 self.inputs, self.input_seq_len, self.targets, self.dropout_rate = self.create_placeholders()
 
             # create network and solver (if train)
@@ -226,32 +254,42 @@ class TensorflowModel(ModelInterface):
     def create_dataset_inputs(self, batch_size, line_height, buffer_size=1000):
         with tf.variable_scope("", reuse=False):
             def gen():
-                for i, l in zip(self.raw_images, self.raw_labels):
+                for index, (i, l) in enumerate(zip(self.raw_images, self.raw_labels)):
                     if self.graph_type == "train" and len(l) == 0:
                         continue
 
-                    yield i, l, [len(i)], [len(l)]
+                    yield i, l, [len(i)], [len(l)], [index]
 
-            def convert_to_sparse(data, labels, len_data, len_labels):
+            def convert_to_sparse(data, labels, len_data, len_labels, indices_data):
                 indices = tf.where(tf.not_equal(labels, -1))
                 values = tf.gather_nd(labels, indices) - 1
                 shape = tf.shape(labels, out_type=tf.int64)
-                return data / 255, tf.SparseTensor(indices, values, shape), len_data, len_labels
+                return data / 255, tf.SparseTensor(indices, values, shape), len_data, len_labels, indices_data
 
-            dataset = tf.data.Dataset.from_generator(gen, (tf.float32, tf.int32, tf.int32, tf.int32))
+            dataset = tf.data.Dataset.from_generator(gen, (tf.float32, tf.int32, tf.int32, tf.int32, tf.int32))
             if self.graph_type == "train":
                 dataset = dataset.repeat().shuffle(buffer_size, seed=self.network_proto.backend.random_seed)
             else:
                 pass
 
-            dataset = dataset.padded_batch(batch_size, ([None, line_height], [None], [1], [1]),
-                                           padding_values=(np.float32(0), np.int32(-1), np.int32(0), np.int32(0)))
+            # batch lines of similar length (bucket by sequence length) to reduce the padding
+            # the original order of the lines is restored on prediction by the line indices
+            boundaries = tf.constant(self.bucket_boundaries, dtype=tf.int32)
+
+            def bucket_key(data, labels, len_data, len_labels, indices_data):
+                return tf.to_int64(tf.reduce_sum(tf.to_int32(tf.less_equal(boundaries, len_data[0]))))
+
+            def batch_bucket(key, bucket):
+                return bucket.padded_batch(batch_size, ([None, line_height], [None], [1], [1], [1]),
+                                           padding_values=(np.float32(0), np.int32(-1), np.int32(0), np.int32(0), np.int32(0)))
+
+            dataset = dataset.apply(tf.contrib.data.group_by_window(bucket_key, batch_bucket, window_size=batch_size))
             dataset = dataset.map(convert_to_sparse)
 
             data_initializer = dataset.prefetch(5).make_initializable_iterator()
             inputs = data_initializer.get_next()
             dropout_rate = tf.placeholder(tf.float32, shape=(), name="dropout_rate")
-            return inputs[0], tf.reshape(inputs[2], [-1]), inputs[1], dropout_rate, data_initializer
+            return inputs[0], tf.reshape(inputs[2], [-1]), inputs[1], dropout_rate, tf.reshape(inputs[4], [-1]), data_initializer
 
     def create_cer(self, decoded, targets):
         # character error rate
@@ -291,6 +329,9 @@ class TensorflowModel(ModelInterface):
 
         gvs = optimizer.compute_gradients(cost)
 
+        # the gradients are only applied if the loss is finite, thus a single run computes the loss and updates
+        finite_cost = tf.is_finite(cost)
+
         training_ops = []
         if self.network_proto.clipping_mode == NetworkParams.CLIP_NONE:
             pass
@@ -302,7 +343,9 @@ class TensorflowModel(ModelInterface):
             max_grads = 1000
 
             grads = [grad for grad, _ in gvs]
-            l2 = tf.minimum(tf.global_norm([grad for grad in grads]), max_l2)
+            # the average must be updated outside of the cond below (its variables can not be created in a cond),
+            # thus a non finite norm is replaced by 0 (which only slightly decays the average)
+            l2 = tf.minimum(tf.where(finite_cost, tf.global_norm([grad for grad in grads]), 0.0), max_l2)
             l2_ema_op, l2_ema = ema.apply([l2]), ema.average(l2)
             grads, _ = tf.clip_by_global_norm(grads,
                                               clip_norm=tf.minimum(l2_ema / max_l2 * max_grads, max_grads))
@@ -319,8 +362,18 @@ class TensorflowModel(ModelInterface):
         else:
             raise Exception("Unsupported clipping mode {}".format(self.network_proto.clipping_mode))
 
-        training_ops.append(optimizer.apply_gradients(gvs, name='grad_update_op'))
-        train_op = tf.group(training_ops, name="train_op")
+        def apply_gradients():
+            # the update is built in the root name scope, otherwise the non slot variables of the solver (e.g. the
+            # beta1_power of Adam) would be created in the scope of the cond and existing checkpoints would not load
+            with tf.name_scope(None):
+                update_op = optimizer.apply_gradients(gvs, name='grad_update_op')
+
+            with tf.control_dependencies([update_op]):
+                return tf.constant(True)
+
+        # the train op yields whether the gradients were applied
+        with tf.control_dependencies(training_ops):
+            train_op = tf.cond(finite_cost, apply_gradients, lambda: tf.constant(False), name="train_op")
 
         return train_op, cost, cer
 
@@ -389,8 +442,9 @@ class TensorflowModel(ModelInterface):
             saver.save(self.session, output_file)
 
     def train_batch(self, x, len_x, y):
+        # the gradients are only applied if the loss is finite (see `create_solver`)
         out = self.session.run(
-            [self.loss, self.train_op, self.logits, self.output_seq_len, self.cer, self.decoded],
+            [self.loss, self.train_op, self.logits, self.output_seq_len, self.cer, self.decoded, self.input_seq_len],
             feed_dict={
                 self.inputs: x,
                 self.input_seq_len: len_x,
@@ -399,39 +453,22 @@ class TensorflowModel(ModelInterface):
             }
         )
 
-        if np.isfinite(out[0]):
-            # only update gradients if finite loss
-            self.session.run(
-                [self.train_op],
-                feed_dict={
-                    self.inputs: x,
-                    self.input_seq_len: len_x,
-                    self.targets: y,
-                    self.dropout_rate: self.network_proto.dropout,
-                }
-            )
-        else:
+        if not out[1]:
             print("WARNING: Infinite loss. Skipping batch.", file=sys.stderr)
 
         return out
 
     def train_dataset(self):
-        out = self.session.run(
-            [self.loss, self.softmax, self.output_seq_len, self.cer, self.decoded, self.targets],
+        # the gradients are only applied if the loss is finite (see `create_solver`)
+        *out, applied = self.session.run(
+            [self.loss, self.softmax, self.output_seq_len, self.cer, self.decoded, self.targets, self.input_seq_len,
+             self.train_op],
             feed_dict={
                 self.dropout_rate: self.network_proto.dropout,
             }
         )
 
-        if np.isfinite(out[0]):
-            # only update gradients if finite loss
-            self.session.run(
-                [self.train_op],
-                feed_dict={
-                    self.dropout_rate: self.network_proto.dropout,
-                }
-            )
-        else:
+        if not applied:
             print("WARNING: Infinite loss. Skipping batch.", file=sys.stderr)
 
         return out
@@ -447,7 +484,7 @@ class TensorflowModel(ModelInterface):
 
     def predict_dataset(self):
         return self.session.run(
-            [self.softmax, self.output_seq_len, self.decoded],
+            [self.softmax, self.output_seq_len, self.decoded, self.input_indices],
             feed_dict={
                 self.dropout_rate: 0,
             })
@@ -457,10 +494,10 @@ class TensorflowModel(ModelInterface):
             x, len_x = TensorflowModel.__sparse_data_to_dense(batch_x)
             y = TensorflowModel.__to_sparse_matrix(batch_y)
 
-            cost, probs, seq_len, ler, decoded = self.train_batch(x, len_x, y)
+            cost, _, probs, seq_len, ler, decoded, input_seq_len = self.train_batch(x, len_x, y)
             gt = batch_y
         else:
-            cost, probs, seq_len, ler, decoded, gt = self.train_dataset()
+            cost, probs, seq_len, ler, decoded, gt, input_seq_len = self.train_dataset()
             gt = TensorflowModel.__sparse_to_lists(gt)
 
         probs = np.roll(probs, 1, axis=2)
@@ -471,21 +508,32 @@ class TensorflowModel(ModelInterface):
             "decoded": TensorflowModel.__sparse_to_lists(decoded),
             "gt": gt,
             "logits_lengths": seq_len,
+            "padding": padding_ratio(input_seq_len),
         }
 
     def predict(self):
+        # the batches are bucketed by line length, thus restore the original order of the lines
+        predictions = {}
+        next_index = 0
         try:
             while True:
-                probs, seq_len, decoded = self.predict_dataset()
+                probs, seq_len, decoded, indices = self.predict_dataset()
                 probs = np.roll(probs, 1, axis=2)
                 # decoded = TensorflowBackend.__sparse_to_lists(decoded)
-                for l, s in zip(probs, seq_len):
-                    yield self.ctc_decoder.decode(l[:s])
+                for p, i in zip(self.ctc_decoder.decode_batch(probs, seq_len, lazy=True), indices):
+                    predictions[i] = p
+
+                while next_index in predictions:
+                    yield predictions.pop(next_index)
+                    next_index += 1
 
         except tf.errors.OutOfRangeError as e:
             # no more data available
             pass
 
+        for i in sorted(predictions.keys()):
+            yield predictions[i]
+
     @staticmethod
     def __to_sparse_matrix(y, shift_values=-1):
         batch_size = len(y)
@@ -507,7 +555,7 @@ class TensorflowModel(ModelInterface):
         max_line_length = max(len_x)
 
         # transform into batch (batch size, T, height)
-        full_x = np.zeros((batch_size, max_line_length, x[0].shape[1]))
+        full_x = np.zeros((batch_size, max_line_length, x[0].shape[1]), dtype=np.float32)
         for batch, xb in enumerate(x):
             full_x[batch, :len(xb)] = xb
 
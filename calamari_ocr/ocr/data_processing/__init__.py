@@ -2,8 +2,11 @@ from calamari_ocr.ocr.data_processing.center_normalizer import CenterNormalizer
 from calamari_ocr.ocr.data_processing.data_preprocessor import DataPreprocessor, NoopDataPreprocessor, MultiDataProcessor
 from calamari_ocr.ocr.data_processing.data_range_normalizer import DataRangeNormalizer
 from calamari_ocr.ocr.data_processing.final_preparation import FinalPreparation
+from calamari_ocr.ocr.data_processing.binarizer import Binarizer, FixedThresholdBinarizer, OtsuBinarizer, \
+    SauvolaBinarizer, binarizer_from_name
 
 from calamari_ocr.ocr.data_processing.default_data_preprocessor import DefaultDataPreprocessor
+from calamari_ocr.ocr.data_processing.cached_data_preprocessor import DataPreprocessorCache, CachedDataPreprocessor
 
 from calamari_ocr.proto import DataPreprocessorParams
 
@@ -14,13 +17,15 @@ def data_processor_from_proto(data_preprocessor_params):
             [data_processor_from_proto(c) for c in data_preprocessor_params.children]
         )
     elif data_preprocessor_params.type == DataPreprocessorParams.DEFAULT_NORMALIZER:
-        return DefaultDataPreprocessor(data_preprocessor_params.line_height, data_preprocessor_params.pad)
+        return DefaultDataPreprocessor(data_preprocessor_params.line_height, data_preprocessor_params.pad,
+                                       fast_resampling=data_preprocessor_params.fast_resampling)
     elif data_preprocessor_params.type == DataPreprocessorParams.NOOP_NORMALIZER:
         return NoopDataPreprocessor()
     elif data_preprocessor_params.type == DataPreprocessorParams.RANGE_NORMALIZER:
         return DataRangeNormalizer()
     elif data_preprocessor_params.type == DataPreprocessorParams.CENTER_NORMALIZER:
-        return CenterNormalizer(data_preprocessor_params.line_height)
+        return CenterNormalizer(data_preprocessor_params.line_height,
+                                fast_resampling=data_preprocessor_params.fast_resampling)
     elif data_preprocessor_params.type == DataPreprocessorParams.FINAL_PREPARATION:
         return FinalPreparation()
 
@@ -0,0 +1,81 @@
+from abc import abstractmethod
+
+import numpy as np
+from skimage.filters import threshold_otsu, threshold_sauvola
+
+from calamari_ocr.ocr.data_processing.data_preprocessor import DataPreprocessor
+
+
+class Binarizer(DataPreprocessor):
+    def __init__(self):
+        """ Binarize grey scale images into uint8 images with foreground 0 and background 255
+
+        Subclasses only compute the threshold (a scalar or one value per pixel) in the value range of the image,
+        the thresholding itself is a single vectorized pass.
+        """
+        super().__init__()
+
+    @abstractmethod
+    def threshold(self, data):
+        """ The threshold of the image `data`, pixels above the threshold are background """
+        pass
+
+    def _apply_single(self, data):
+        if data.ndim == 3:
+            data = np.mean(data, axis=2)
+
+        out = np.empty(data.shape, dtype=np.uint8)
+        np.multiply(data > self.threshold(data), 255, out=out, casting='unsafe')
+        return out
+
+
+class FixedThresholdBinarizer(Binarizer):
+    def __init__(self, threshold=0.9):
+        """
+        :param threshold: the threshold relative to the value range of the image, i.e. 0...1
+        """
+        super().__init__()
+        self.relative_threshold = threshold
+
+    def threshold(self, data):
+        if np.issubdtype(data.dtype, np.integer):
+            return self.relative_threshold * np.iinfo(data.dtype).max
+
+        return self.relative_threshold
+
+
+class OtsuBinarizer(Binarizer):
+    def threshold(self, data):
+        if np.amin(data) == np.amax(data):
+            # an empty image is background only
+            return -np.inf
+
+        return threshold_otsu(data)
+
+
+class SauvolaBinarizer(Binarizer):
+    def __init__(self, window_size=25, k=0.2):
+        """
+        :param window_size: odd size of the local window around each pixel
+        :param k: weight of the local standard deviation
+        """
+        super().__init__()
+        self.window_size = window_size
+        self.k = k
+
+    def threshold(self, data):
+        return threshold_sauvola(data, window_size=self.window_size, k=self.k)
+
+
+BINARIZERS = {
+    "fixed": FixedThresholdBinarizer,
+    "otsu": OtsuBinarizer,
+    "sauvola": SauvolaBinarizer,
+}
+
+
+def binarizer_from_name(name, **kwargs):
+    if name not in BINARIZERS:
+        raise Exception("Unknown binarization '{}'. Available: {}".format(name, sorted(BINARIZERS.keys())))
+
+    return BINARIZERS[name](**kwargs)
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from calamari_ocr.ocr.data_processing.data_preprocessor import DataPreprocessor
+
+
+class DataPreprocessorCache:
+    def __init__(self, cache_dir, max_size=1024 ** 3, stale_tmp_age=3600):
+        """ On-disk cache of preprocessed lines
+
+        Each line is stored as .npy file named by a hash of the image content and the parameters of the preprocessor.
+        Files are written atomically (temporary file and rename), thus the cache can be shared by concurrent readers
+        and writers, e.g. parallel fold trainings. If the total size exceeds `max_size` the least recently used
+        entries are deleted.
+
+        Parameters
+        ----------
+        cache_dir : str
+            directory of the cache, created if it does not exist
+        max_size : int
+            maximum size of the cache in bytes
+        stale_tmp_age : float
+            age in seconds after which temporary files of crashed writers are deleted
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        self.stale_tmp_age = stale_tmp_age
+
+        # bytes written by this process since the last eviction
+        self._written_since_eviction = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def wrap(self, data_preproc, data_preproc_params):
+        """ Cache the outputs of a data preprocessor
+
+        Parameters
+        ----------
+        data_preproc : DataPreprocessor
+            the data preprocessor to cache
+        data_preproc_params : DataPreprocessorParams
+            the parameters of `data_preproc`, they are part of the key of each entry
+
+        Returns
+        -------
+        CachedDataPreprocessor
+        """
+        return CachedDataPreprocessor(data_preproc, data_preproc_params, self)
+
+    def key(self, data, params_hash):
+        data = np.ascontiguousarray(data)
+        h = hashlib.sha1(params_hash)
+        h.update(str(data.dtype).encode("utf-8"))
+        h.update(str(data.shape).encode("utf-8"))
+        h.update(data)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def load(self, key):
+        """ Load an entry
+
+        Returns
+        -------
+        array_like or None
+            the cached data or None if the entry does not exist (e.g. if it was just evicted by another process)
+        """
+        path = self.path(key)
+        try:
+            data = np.load(path, allow_pickle=False)
+        except (IOError, OSError, ValueError):
+            return None
+
+        try:
+            # mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+
+        return data
+
+    def store(self, key, data):
+        path = self.path(key)
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, data, allow_pickle=False)
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        # only scan the cache after a reasonable amount of new data
+        self._written_since_eviction += data.nbytes
+        if self._written_since_eviction > self.max_size / 10:
+            self.evict()
+
+    def evict(self):
+        """ Delete the least recently used entries until the cache is smaller than `max_size`
+
+        Entries that are deleted concurrently by other processes are ignored.
+        """
+        self._written_since_eviction = 0
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+
+                if filename.endswith(".tmp"):
+                    if now - st.st_mtime > self.stale_tmp_age:
+                        self._remove(path)
+                elif filename.endswith(".npy"):
+                    entries.append((st.st_mtime, st.st_size, path))
+
+        total_size = sum([size for _, size, _ in entries])
+        if total_size <= self.max_size:
+            return
+
+        for _, size, path in sorted(entries):
+            self._remove(path)
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CachedDataPreprocessor(DataPreprocessor):
+    def __init__(self, data_preproc, data_preproc_params, cache):
+        """ Data preprocessor that looks up the outputs of `data_preproc` in a `DataPreprocessorCache`
+
+        Parameters
+        ----------
+        data_preproc : DataPreprocessor
+            the actual preprocessor
+        data_preproc_params : DataPreprocessorParams
+            the parameters of `data_preproc`
+        cache : DataPreprocessorCache
+            the cache to use
+        """
+        super().__init__()
+        self.data_preproc = data_preproc
+        self.cache = cache
+        self.params_hash = hashlib.sha1(data_preproc_params.SerializeToString(deterministic=True)).digest()
+
+    def _apply_batch(self, datas):
+        keys = [self.cache.key(data, self.params_hash) if isinstance(data, np.ndarray) else None for data in datas]
+        outputs = [self.cache.load(key) if key else None for key in keys]
+
+        # process all lines that are not cached at once
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if len(missing) > 0:
+            for i, output in zip(missing, self.data_preproc._apply_batch([datas[i] for i in missing])):
+                if keys[i]:
+                    self.cache.store(keys[i], output)
+
+                outputs[i] = output
+
+        return outputs
+
+    def _apply_single(self, data):
+        if not isinstance(data, np.ndarray):
+            return self.data_preproc._apply_single(data)
+
+        key = self.cache.key(data, self.params_hash)
+        cached = self.cache.load(key)
+        if cached is not None:
+            return cached
+
+        data = self.data_preproc._apply_single(data)
+        self.cache.store(key, data)
+        return data
@@ -3,25 +3,72 @@ from tqdm import tqdm
 import numpy as np
 import multiprocessing
 
-from calamari_ocr.utils import parallel_map
+from calamari_ocr.utils import parallel_map, prefetch_map
 
 
 class DataPreprocessor(ABC):
+    # maximum number of lines that are passed at once to `_apply_batch`
+    max_batch_size = 16
+
     def __init__(self):
         super().__init__()
 
-    def apply(self, data, processes=1, progress_bar=False, max_tasks_per_child=100):
+    def apply(self, data, processes=1, progress_bar=False, max_tasks_per_child=None):
         if isinstance(data, np.ndarray):
             return self._apply_single(data)
         elif isinstance(data, list):
             if len(data) == 0:
                 return []
 
-            return parallel_map(self._apply_single, data, desc="Data Preprocessing",
-                                processes=processes, progress_bar=progress_bar, max_tasks_per_child=max_tasks_per_child)
+            # distribute the batches to all processes
+            n_processes = processes if processes > 0 else multiprocessing.cpu_count()
+            batch_size = max(1, min(self.max_batch_size, len(data) // n_processes))
+            batches = [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
+            out = parallel_map(self._apply_batch, batches, desc="Data Preprocessing",
+                               processes=processes, progress_bar=progress_bar, max_tasks_per_child=max_tasks_per_child)
+            return [d for batch in out for d in batch]
         else:
             raise Exception("Unknown instance of txts: {}. Supported list and str".format(type(data)))
 
+    def apply_prefetched(self, chunks, processes=1, prefetch=2):
+        """ Lazily preprocess chunks of data in background processes
+
+        See `prefetch_map`
+
+        Parameters
+        ----------
+        chunks : iterable of list of images
+            the data to preprocess
+        processes : int
+            number of processes to use
+        prefetch : int
+            number of chunks to preprocess ahead
+
+        Yields
+        ------
+        list of images
+            the preprocessed chunk
+        """
+        batched_chunks = ([chunk[i:i + self.max_batch_size] for i in range(0, len(chunk), self.max_batch_size)]
+                          for chunk in chunks)
+        for batches in prefetch_map(self._apply_batch, batched_chunks, processes=processes, prefetch=prefetch):
+            yield [d for batch in batches for d in batch]
+
+    def _apply_batch(self, datas):
+        """ Apply the preprocessor to a batch of data
+
+        Override this if a preprocessor can process multiple lines more efficiently at once
+
+        Parameters
+        ----------
+        datas : list of images
+
+        Returns
+        -------
+        list of images
+        """
+        return [self._apply_single(data) for data in datas]
+
     @abstractmethod
     def _apply_single(self, data):
         pass
@@ -48,3 +95,9 @@ class MultiDataProcessor(DataPreprocessor):
             data = proc._apply_single(data)
 
         return data
+
+    def _apply_batch(self, datas):
+        for proc in self.sub_processors:
+            datas = proc._apply_batch(datas)
+
+        return datas
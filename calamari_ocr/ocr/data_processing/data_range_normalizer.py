@@ -3,8 +3,12 @@ from calamari_ocr.ocr.data_processing.data_preprocessor import DataPreprocessor
 
 
 class DataRangeNormalizer(DataPreprocessor):
-    def __init__(self):
+    def __init__(self, dtype=None):
+        """
+        :param dtype: floating point type of the output, by default float64 for integer and unchanged for float images
+        """
         super().__init__()
+        self.dtype = dtype
 
     def _apply_single(self, data):
         """
@@ -15,19 +19,20 @@ class DataRangeNormalizer(DataPreprocessor):
         :rtype np.array in range 0...1 (unsigned) or -1...1 (signed)
         """
         if data.dtype == np.dtype('uint8'):
-            data = data / 255.0
+            data = np.divide(data, 255.0, dtype=self.dtype)
         if data.dtype == np.dtype('int8'):
-            data = data / 127.0
+            data = np.divide(data, 127.0, dtype=self.dtype)
         elif data.dtype == np.dtype('uint16'):
-            data = data / 65536.0
+            data = np.divide(data, 65536.0, dtype=self.dtype)
         elif data.dtype == np.dtype('int16'):
-            data = data / 32767.0
+            data = np.divide(data, 32767.0, dtype=self.dtype)
         elif data.dtype in [np.dtype('f'), np.dtype('float32'), np.dtype('float64')]:
-            pass
+            if self.dtype is not None:
+                data = data.astype(self.dtype, copy=False)
         else:
             raise Exception("unknown image type: {}".format(data.dtype))
 
         if data.ndim == 3:
-            data = np.mean(data, axis=2)
+            data = np.mean(data, axis=2, dtype=self.dtype)
 
         return data
\ No newline at end of file
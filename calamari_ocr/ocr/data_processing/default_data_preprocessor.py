@@ -1,15 +1,97 @@
+import numpy as np
+
 from calamari_ocr.ocr.data_processing.data_range_normalizer import DataRangeNormalizer
 from calamari_ocr.ocr.data_processing.data_preprocessor import MultiDataProcessor
-from calamari_ocr.ocr.data_processing.center_normalizer import CenterNormalizer
+from calamari_ocr.ocr.data_processing.center_normalizer import CenterNormalizer, scale_to_h_separable
 from calamari_ocr.ocr.data_processing.final_preparation import FinalPreparation
 
 
 class DefaultDataPreprocessor(MultiDataProcessor):
-    def __init__(self, line_height, pad=0):
+    def __init__(self, line_height, pad=0, fast_resampling=False):
+        """ Range normalization, center normalization, and final preparation of lines
+
+        If `fast_resampling` is set, the steps are not chained but fused into a single float32 kernel
+        (see `_apply_fused`) that uses the separable resampler. Its output matches the chained steps with the
+        separable resampler up to float32 rounding.
+
+        Parameters
+        ----------
+        line_height : int
+            the target height of the lines
+        pad : int
+            padding (in pixels) that is added left and right of each line
+        fast_resampling : bool
+            use the fused float32 kernel with the separable resampler
+        """
+        self.range_normalizer = DataRangeNormalizer()
+        self.center_normalizer = CenterNormalizer(target_height=line_height, fast_resampling=fast_resampling)
+        self.final_preparation = FinalPreparation(pad=pad)
         super().__init__(
             [
-                DataRangeNormalizer(),
-                CenterNormalizer(target_height=line_height),
-                FinalPreparation(pad=pad),
+                self.range_normalizer,
+                self.center_normalizer,
+                self.final_preparation,
             ]
         )
+        self.fused = fast_resampling
+        self._float32_range_normalizer = DataRangeNormalizer(dtype=np.float32)
+
+    def _apply_single(self, data):
+        if not self.fused:
+            return super()._apply_single(data)
+
+        return self._apply_fused([data])[0]
+
+    def _apply_batch(self, datas):
+        if not self.fused:
+            return super()._apply_batch(datas)
+
+        return self._apply_fused(datas)
+
+    def _apply_fused(self, datas):
+        """ Preprocess lines from the decoded images to the final padded uint8 lines
+
+        Compared to chaining the single preprocessors all intermediate images are float32, the range normalization
+        is a single conversion, the inversion and normalization for measuring the center line are in place, and the
+        final lines are written into one contiguous buffer. Only the filters of the center measurement are kept in
+        float64 (see `CenterNormalizer.measure_batch`), in float32 near ties of the maxima yield different center lines.
+        """
+        normalizer = self.center_normalizer
+        intermediate_height = int(normalizer.target_height * 1.5)
+
+        imgs, cvals = [], []
+        for data in datas:
+            img = self._float32_range_normalizer._apply_single(data)
+            cval = np.amax(img)
+            if intermediate_height < img.shape[0]:
+                img = scale_to_h_separable(img, intermediate_height, cval=cval)
+
+            imgs.append(img)
+            cvals.append(cval)
+
+        # measure and dewarp all lines of the same height at once
+        groups = {}
+        for i, img in enumerate(imgs):
+            groups.setdefault(img.shape[0], []).append(i)
+
+        dewarped = [None] * len(imgs)
+        for indices in groups.values():
+            valid, temps = [], []
+            for i in indices:
+                temp = np.subtract(np.amax(imgs[i]), imgs[i], dtype=np.float32)
+                temp_max = np.amax(temp)
+                if temp_max == 0:
+                    # white images are passed as they are
+                    dewarped[i] = temp
+                    continue
+
+                temp /= temp_max
+                valid.append(i)
+                temps.append(temp)
+
+            if len(valid) > 0:
+                for i, (center, r) in zip(valid, normalizer.measure_batch(temps)):
+                    dewarped[i] = normalizer._dewarp_columns(imgs[i], center, r, cvals[i], np.float32)
+
+        lines = [scale_to_h_separable(d, normalizer.target_height, cval=cval) for d, cval in zip(dewarped, cvals)]
+        return self.final_preparation._apply_batch(lines)
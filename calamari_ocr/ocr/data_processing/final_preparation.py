@@ -12,27 +12,48 @@ class FinalPreparation(DataPreprocessor):
         self.pad_value = pad_value
         self.as_uint8 = as_uint8            # To save memory!
 
-    def _apply_single(self, data):
-        if self.normalize:
-            amax = np.amax(data)
-            if amax > 0:
-                data = data * 1.0 / amax
+    def _output_dtype(self):
+        return np.uint8 if self.as_uint8 else np.float32
 
-        if self.invert:
-            data = np.amax(data) - data
+    def _output_shape(self, shape):
+        h, w = shape
+        return (w + 2 * self.pad, h) if self.transpose else (h, w + 2 * self.pad)
+
+    def _fill_value(self):
+        return int(self.pad_value * 255) if self.as_uint8 else self.pad_value
 
-        if self.transpose:
-            data = data.T
+    def _apply_into(self, data, out):
+        """ Write the prepared `data` into the (padded) output buffer `out`
 
+        All operations are computed in place in a single float32 buffer, the padding is only filled, and the final
+        values are directly written (and casted) into `out`.
+        """
         if self.pad > 0:
             if self.transpose:
-                w = data.shape[1]
-                data = np.vstack([np.full((self.pad, w), self.pad_value), data, np.full((self.pad, w), self.pad_value)])
+                out[:self.pad] = self._fill_value()
+                out[-self.pad:] = self._fill_value()
+                out = out[self.pad:-self.pad]
             else:
-                w = data.shape[0]
-                data = np.hstack([np.full((w, self.pad), self.pad_value), data, np.full((w, self.pad), self.pad_value)])
+                out[:, :self.pad] = self._fill_value()
+                out[:, -self.pad:] = self._fill_value()
+                out = out[:, self.pad:-self.pad]
+
+        values = np.array(data.T if self.transpose else data, dtype=np.float32)
+
+        if self.normalize:
+            amax = np.amax(values)
+            if amax > 0:
+                values /= amax
+
+        if self.invert:
+            np.subtract(np.amax(values), values, out=values)
 
         if self.as_uint8:
-            data = (data * 255).astype(np.uint8)
+            np.multiply(values, 255, out=out, casting='unsafe')
+        else:
+            out[...] = values
 
-        return data
+    def _apply_single(self, data):
+        out = np.empty(self._output_shape(data.shape), dtype=self._output_dtype())
+        self._apply_into(data, out)
+        return out
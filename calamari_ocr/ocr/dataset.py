@@ -2,11 +2,15 @@ from abc import ABC, abstractmethod
 import skimage.io as skimage_io
 import codecs
 import os
+import threading
+from collections import OrderedDict
 
 import numpy as np
 
-from calamari_ocr.utils import parallel_map, split_all_ext
+from calamari_ocr.utils import parallel_map, prefetch_map, split_all_ext
 from calamari_ocr.utils.Abbyy.Reader import XMLReader
+from calamari_ocr.ocr.data_processing.data_range_normalizer import DataRangeNormalizer
+from calamari_ocr.ocr.data_processing.binarizer import binarizer_from_name
 
 
 class DataSet(ABC):
@@ -133,7 +137,7 @@ class DataSet(ABC):
         self.loaded = False
         self._samples.append(sample)
 
-    def load_samples(self, processes=1, progress_bar=False):
+    def load_samples(self, processes=1, progress_bar=False, use_thread_pool=False):
         """ Load the samples into the memory
 
         This is usefull if a FileDataset shall load its files.
@@ -141,9 +145,12 @@ class DataSet(ABC):
         Parameters
         ----------
         processes : int
-            number of processes to use for loading
+            number of processes (or threads) to use for loading
         progress_bar : bool
             show a progress bar of the progress
+        use_thread_pool : bool
+            load the samples with threads instead of processes. Image decoding releases the GIL, thus threads
+            avoid the costs of transferring the images between processes.
 
         Returns
         -------
@@ -152,23 +159,15 @@ class DataSet(ABC):
         if self.loaded:
             return self._samples
 
-        data = parallel_map(self._load_sample, self._samples, desc="Loading Dataset", processes=processes, progress_bar=progress_bar)
+        data = parallel_map(self._load_sample, self._samples, desc="Loading Dataset", processes=processes,
+                            progress_bar=progress_bar, use_thread_pool=use_thread_pool)
 
         invalid_samples = []
         for i, ((line, text), sample) in enumerate(zip(data, self._samples)):
             sample["image"] = line
             sample["text"] = text
-            if self.has_images:
-                # skip invalid imanges (e. g. corrupted or empty files)
-                if line is None or (line.size == 0 or np.amax(line) == np.amin(line)):
-                    if self.skip_invalid:
-                        invalid_samples.append(i)
-                        if line is None:
-                            print("Empty data: Image at '{}' is None (possibly corrupted)".format(sample['id']))
-                        else:
-                            print("Empty data: Image at '{}' is empty".format(sample['id']))
-                    else:
-                        raise Exception("Empty data: Image at '{}' is empty".format(sample['id']))
+            if not self._check_sample(sample):
+                invalid_samples.append(i)
 
         if self.remove_invalid:
             # remove all invalid samples (reversed order!)
@@ -179,6 +178,83 @@ class DataSet(ABC):
 
         return self._samples
 
+    def stream_samples(self, window_size, processes=1, progress_bar=False, use_thread_pool=False):
+        """ Load the samples window by window
+
+        In contrast to `load_samples` the loaded images are not stored in the dataset, thus only a single window
+        of samples is held in the memory at once. An already loaded dataset is simply split into windows.
+
+        Parameters
+        ----------
+        window_size : int
+            number of samples to load at once. If <= 0 the complete dataset is loaded by `load_samples`
+        processes : int
+            number of processes (or threads) to use for loading
+        progress_bar : bool
+            show a progress bar of the loading progress (only if the complete dataset is loaded)
+        use_thread_pool : bool
+            load the samples with threads. The next window is loaded in the background while the current one is
+            processed by the consumer.
+
+        Yields
+        ------
+        list of samples
+            Copies of the samples of the current window including their "image" and "text"
+        """
+        if window_size <= 0:
+            yield self.load_samples(processes=processes, progress_bar=progress_bar, use_thread_pool=use_thread_pool)
+            return
+
+        if self.loaded:
+            for i in range(0, len(self._samples), window_size):
+                yield self._samples[i:i + window_size]
+
+            return
+
+        windows = [self._samples[i:i + window_size] for i in range(0, len(self._samples), window_size)]
+        if use_thread_pool:
+            datas = prefetch_map(self._load_sample, windows, processes=processes, prefetch=1, use_thread_pool=True)
+        else:
+            datas = (parallel_map(self._load_sample, window, processes=processes) for window in windows)
+
+        for data, window in zip(datas, windows):
+            samples = []
+            for (line, text), sample in zip(data, window):
+                sample = dict(sample, image=line, text=text)
+                if self._check_sample(sample) or not self.remove_invalid:
+                    samples.append(sample)
+
+            yield samples
+
+    def _check_sample(self, sample):
+        """ Check if a loaded sample is valid
+
+        Parameters
+        ----------
+        sample : dict
+            the loaded sample
+
+        Returns
+        -------
+        bool
+            False if the sample is invalid but `skip_invalid` is set, otherwise an Exception is raised
+        """
+        if self.has_images:
+            line = sample["image"]
+            # skip invalid imanges (e. g. corrupted or empty files)
+            if line is None or (line.size == 0 or np.amax(line) == np.amin(line)):
+                if self.skip_invalid:
+                    if line is None:
+                        print("Empty data: Image at '{}' is None (possibly corrupted)".format(sample['id']))
+                    else:
+                        print("Empty data: Image at '{}' is empty".format(sample['id']))
+
+                    return False
+                else:
+                    raise Exception("Empty data: Image at '{}' is empty".format(sample['id']))
+
+        return True
+
     @abstractmethod
     def _load_sample(self, sample):
         """ Load a single sample
@@ -352,12 +428,88 @@ class FileDataSet(DataSet):
         return img
 
 
+class _CachedPage:
+    def __init__(self, remaining_lines):
+        """ Entry of the page cache of the `AbbyyDataSet`
+
+        The page is decoded by the first thread that requests it, all other threads wait for `decoded`. If the
+        decoding failed, `error` is raised in all threads.
+        """
+        self.decoded = threading.Event()
+        self.image = None
+        self.error = None
+        self.remaining_lines = remaining_lines
+
+
+class AbbyyPageLoader:
+    def __init__(self, binarizer=None):
+        """ Decode page images of FineReader documents and crop their lines
+
+        Parameters
+        ----------
+        binarizer : Binarizer, optional
+            binarize the full page once before the lines are cropped
+        """
+        self.binarizer = binarizer
+
+    def decode(self, image_path):
+        """ Return the uint8 grey scale page image, or None if the image can not be decoded """
+        try:
+            img = skimage_io.imread(image_path, as_gray=True)
+        except:
+            return None
+
+        if img.dtype == bool:
+            # 1-bit pages
+            img = img.astype(np.uint8) * np.uint8(255)
+        elif img.dtype != np.uint8:
+            # colored pages are converted to float grey scale images
+            img = np.clip(DataRangeNormalizer()._apply_single(img) * 255, 0, 255).round().astype(np.uint8)
+
+        if self.binarizer is not None:
+            img = self.binarizer.apply(img)
+
+        return img
+
+    @staticmethod
+    def crop(page_image, rect):
+        """ Cut the line at `rect` out of the page, the copy does not keep the page alive """
+        return page_image[max(0, rect.top):max(0, rect.bottom), max(0, rect.left):max(0, rect.right)].copy()
+
+    def load(self, page):
+        """ Decode the image of `page` once and crop all of its lines
+
+        Parameters
+        ----------
+        page : Page
+            the page of the FineReader document
+
+        Returns
+        -------
+        list of tuple
+            the line, the format, and the line image (None if the page image can not be decoded) for each format of
+            each line of the page
+        """
+        lines = [(line, fo) for line in page.getLines() for fo in line.formats]
+        if len(lines) == 0:
+            return []
+
+        page_image = self.decode(page.imgFile)
+        return [(line, fo, self.crop(page_image, line.rect) if page_image is not None else None)
+                for line, fo in lines]
+
+
 class AbbyyDataSet(DataSet):
 
-    def __init__(self, files, skip_invalid=False, remove_invalid=True, binary=False):
+    def __init__(self, files, skip_invalid=False, remove_invalid=True, binary=False, binarization="fixed",
+                 max_cached_pages=4, read_chars=True, processes=1):
 
         """ Create a dataset from a Path as String
 
+        Each page image is decoded only once, the lines are cropped out of the decoded page. A decoded page is
+        released as soon as all of its lines are loaded, a bounded LRU cache of decoded pages covers the case that
+        the lines of a page are not loaded consecutively (e.g. the lines are distributed to multiple processes).
+
         Parameters
          ----------
         files : [], required
@@ -366,12 +518,30 @@ class AbbyyDataSet(DataSet):
             skip invalid files
         remove_invalid : bool, optional
             remove invalid files
+        binary : bool, optional
+            binarize the lines
+        binarization : str, optional
+            the thresholding of binarized pages: "fixed", "otsu", or "sauvola" (see `binarizer_from_name`). The
+            threshold is computed on the full page, which is binarized once before the lines are cropped.
+        max_cached_pages : int, optional
+            maximum number of decoded pages that are kept in memory
+        read_chars : bool, optional
+            read the ground truth of lines that are stored as single chars (see `XMLReader`)
+        processes : int, optional
+            number of xml files that are read in parallel
         """
 
         super().__init__(True, True, skip_invalid, remove_invalid)
 
-        self.book = XMLReader(files, skip_invalid, remove_invalid).read()
+        self.book = XMLReader(files, skip_invalid, remove_invalid, read_chars=read_chars, processes=processes).read()
         self.binary = binary
+        self.page_loader = AbbyyPageLoader(binarizer_from_name(binarization) if binary else None)
+        self.max_cached_pages = max_cached_pages
+        self._non_existing_as_empty = False
+
+        self._lines_per_page = {}
+        self._page_cache = OrderedDict()
+        self._page_cache_lock = threading.Lock()
 
         count = 0
         for page in self.book.pages:
@@ -383,9 +553,62 @@ class AbbyyDataSet(DataSet):
                         "line": line,
                         "format": fo
                     })
+                    self._lines_per_page[page.imgFile] = self._lines_per_page.get(page.imgFile, 0) + 1
                     count = count + 1
 
+    def __getstate__(self):
+        # each process uses its own page cache
+        state = self.__dict__.copy()
+        state["_page_cache"] = OrderedDict()
+        del state["_page_cache_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._page_cache_lock = threading.Lock()
+
+    def _load_page(self, image_path):
+        """ Return the decoded page image, or None if the image can not be decoded
+
+        Every call counts as one loaded line of that page. Once all lines of a page are loaded the page is removed
+        from the cache. Errors of the decoding are raised in all threads that wait for the page.
+        """
+        with self._page_cache_lock:
+            entry = self._page_cache.get(image_path)
+            owner = entry is None
+            if owner:
+                entry = _CachedPage(self._lines_per_page.get(image_path, 1))
+                self._page_cache[image_path] = entry
+            else:
+                self._page_cache.move_to_end(image_path)
+
+            entry.remaining_lines -= 1
+            if entry.remaining_lines <= 0:
+                del self._page_cache[image_path]
+
+            while len(self._page_cache) > max(1, self.max_cached_pages):
+                self._page_cache.popitem(last=False)
 
+        if owner:
+            try:
+                entry.image = self.page_loader.decode(image_path)
+            except Exception as e:
+                entry.error = e
+                # a failed page is not cached, later requests decode it again
+                with self._page_cache_lock:
+                    if self._page_cache.get(image_path) is entry:
+                        del self._page_cache[image_path]
+
+                raise
+            finally:
+                # never leave the waiting threads blocked
+                entry.decoded.set()
+        else:
+            entry.decoded.wait()
+            if entry.error is not None:
+                raise entry.error
+
+        return entry.image
 
     def _load_sample(self, sample):
         image_path = sample["image_path"]
@@ -393,33 +616,161 @@ class AbbyyDataSet(DataSet):
         text = sample["format"].text
 
         if image_path is None:
-            return None
+            return None, text
 
         if not os.path.exists(image_path):
             if self._non_existing_as_empty:
-                return np.zeros((1, 1))
+                return np.zeros((1, 1)), text
             else:
                 raise Exception("Image file at '{}' does not exist".format(image_path))
 
-        try:
-            img = skimage_io.imread(image_path, as_gray=True)
-        except:
-            return None
+        page = self._load_page(image_path)
+        if page is None:
+            return None, text
 
-        ly, lx = img.shape
+        return self.page_loader.crop(page, line.rect), text
 
-        # Cut the Image
-        img = img[line.rect.top: -ly + line.rect.bottom, line.rect.left: -lx + line.rect.right]
 
-        """Binarize Image"""
-        if self.binary:
-            for i in range(len(img)):
-                for j in range(len(img[0])):
-                    #threshold
-                    if img[i][j] > 0.9:
-                        img[i][j] = 255
-                    else:
-                        img[i][j] = 0
+class PackedDataSet(DataSet):
+    MAGIC = b"CALPACK1"
+    EXTENSION = ".cpack"
+    # magic, number of samples, offset of the index, offset of the text table, size of the text table
+    HEADER = np.dtype([("magic", "S8"), ("n_samples", "<u8"), ("index_offset", "<u8"),
+                       ("text_offset", "<u8"), ("text_size", "<u8")])
+    # offset and shape of the image in the blob, offsets and lengths (in bytes) of the id and text in the text table
+    # a text length of -1 denotes a sample without text
+    INDEX = np.dtype([("offset", "<u8"), ("height", "<u4"), ("width", "<u4"),
+                      ("id_offset", "<u8"), ("id_length", "<i8"), ("text_offset", "<u8"), ("text_length", "<i8")])
 
-        return img, text
+    def __init__(self, path, skip_invalid=False, remove_invalid=True):
+        """ Create a dataset from a single packed file
 
+        A packed file (see `PackedDataSet.write`) consists of a header, a blob of all uint8 line images, an index of
+        the offsets and shapes of the images, and an UTF-8 text table of all ids and ground truth texts.
+        The file is opened as `numpy.memmap`, the loaded images are read-only views of the file without any copy.
+
+        Parameters
+        ----------
+        path : str
+            path to the packed file
+        skip_invalid : bool, optional
+            skip invalid files
+        remove_invalid : bool, optional
+            remove invalid files
+        """
+        self.path = path
+        self._data = None
+        header = self._header()
+        if header["magic"] != PackedDataSet.MAGIC:
+            raise Exception("File at '{}' is not a packed dataset".format(path))
+
+        index = self._index(header)
+        text_table = bytes(self._mmap()[header["text_offset"]:header["text_offset"] + header["text_size"]])
+
+        super().__init__(has_images=True, has_texts=bool(np.any(index["text_length"] >= 0)),
+                         skip_invalid=skip_invalid,
+                         remove_invalid=remove_invalid)
+
+        for i, (_, _, _, id_offset, id_length, text_offset, text_length) in enumerate(index.tolist()):
+            self.add_sample({
+                "id": text_table[id_offset:id_offset + id_length].decode("utf-8"),
+                "pack_index": i,
+                "text": text_table[text_offset:text_offset + text_length].decode("utf-8") if text_length >= 0 else None,
+            })
+
+        self._entries = index
+
+    def __getstate__(self):
+        # the memory map is reopened by each process
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def _mmap(self):
+        if self._data is None:
+            self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+
+        return self._data
+
+    def _header(self):
+        return np.frombuffer(self._mmap(), dtype=PackedDataSet.HEADER, count=1)[0]
+
+    def _index(self, header):
+        return np.frombuffer(self._mmap(), dtype=PackedDataSet.INDEX, count=int(header["n_samples"]),
+                             offset=int(header["index_offset"]))
+
+    def load_samples(self, processes=1, progress_bar=False, use_thread_pool=False):
+        # reading from the memory map does not benefit of multiple processes or threads
+        return super().load_samples(processes=1, progress_bar=progress_bar)
+
+    def stream_samples(self, window_size, processes=1, progress_bar=False, use_thread_pool=False):
+        return super().stream_samples(window_size, processes=1, progress_bar=progress_bar)
+
+    def _load_sample(self, sample):
+        entry = self._entries[sample["pack_index"]]
+        offset, h, w = int(entry["offset"]), int(entry["height"]), int(entry["width"])
+        return self._mmap()[offset:offset + h * w].reshape((h, w)), sample["text"]
+
+    @staticmethod
+    def write(path, samples, n_samples):
+        """ Write samples to a packed file
+
+        The images are converted to uint8 grey scale images.
+
+        Parameters
+        ----------
+        path : str
+            output path of the packed file
+        samples : iterable of dict
+            the loaded samples (see `DataSet.stream_samples`) with "id", "image", and (optional) "text"
+        n_samples : int
+            the number of samples, required to reserve the space of the index
+        """
+        header = np.zeros(1, dtype=PackedDataSet.HEADER)
+        index = np.zeros(n_samples, dtype=PackedDataSet.INDEX)
+        text_table = bytearray()
+        range_normalizer = DataRangeNormalizer()
+
+        with open(path, 'wb') as f:
+            # reserve the header, the images are written first
+            f.write(header.tobytes())
+            i = 0
+            for sample in samples:
+                if i >= n_samples:
+                    raise Exception("More samples than the expected {}".format(n_samples))
+
+                image = sample["image"]
+                if image.dtype != np.uint8 or image.ndim != 2:
+                    image = np.clip(range_normalizer._apply_single(image) * 255, 0, 255).round().astype(np.uint8)
+
+                entry = index[i]
+                entry["offset"] = f.tell()
+                entry["height"], entry["width"] = image.shape
+                f.write(np.ascontiguousarray(image).tobytes())
+
+                sample_id = sample["id"].encode("utf-8")
+                entry["id_offset"] = len(text_table)
+                entry["id_length"] = len(sample_id)
+                text_table += sample_id
+
+                text = sample.get("text", None)
+                if text is None:
+                    entry["text_length"] = -1
+                else:
+                    text = text.encode("utf-8")
+                    entry["text_offset"] = len(text_table)
+                    entry["text_length"] = len(text)
+                    text_table += text
+
+                i += 1
+
+            header["magic"] = PackedDataSet.MAGIC
+            header["n_samples"] = i
+            header["index_offset"] = f.tell()
+            f.write(index[:i].tobytes())
+            header["text_offset"] = f.tell()
+            header["text_size"] = len(text_table)
+            f.write(text_table)
+
+            f.seek(0)
+            f.write(header.tobytes())
@@ -17,7 +17,7 @@ class Evaluator:
         self.text_preprocessor = text_preprocessor if text_preprocessor is not None else DefaultTextPreprocessor()
         self.preloaded_gt = None
 
-    def preload_gt(self, gt_dataset, progress_bar=False):
+    def preload_gt(self, gt_dataset, progress_bar=False, processes=1):
         """ Preload gt to be used for several experiments
 
         Use this method to specify ground truth data to be tested versus many predictions
@@ -28,9 +28,11 @@ class Evaluator:
             the ground truth
         progress_bar : bool, optional
             show a progress bar
+        processes : int, optional
+            the number of threads to use for loading
 
         """
-        gt_dataset.load_samples(progress_bar=progress_bar)
+        gt_dataset.load_samples(processes=processes, progress_bar=progress_bar, use_thread_pool=True)
         self.preloaded_gt = self.text_preprocessor.apply(gt_dataset.text_samples(), progress_bar=progress_bar)
 
     def run(self, _sentinel=None, gt_dataset=None, pred_dataset=None, processes=1, progress_bar=False):
@@ -59,10 +61,10 @@ class Evaluator:
         if self.preloaded_gt:
             gt_data = self.preloaded_gt
         else:
-            gt_dataset.load_samples(progress_bar=progress_bar)
+            gt_dataset.load_samples(processes=processes, progress_bar=progress_bar, use_thread_pool=True)
             gt_data = self.text_preprocessor.apply(gt_dataset.text_samples(), progress_bar=progress_bar)
 
-        pred_dataset.load_samples(progress_bar=progress_bar)
+        pred_dataset.load_samples(processes=processes, progress_bar=progress_bar, use_thread_pool=True)
         pred_data = self.text_preprocessor.apply(pred_dataset.text_samples(), progress_bar=progress_bar)
 
         return self.evaluate(gt_data=gt_data, pred_data=pred_data, processes=processes, progress_bar=progress_bar)
@@ -1,4 +1,7 @@
 import time
+import os
+import threading
+from multiprocessing.pool import ThreadPool
 
 from tqdm import tqdm
 
@@ -10,39 +13,73 @@ from calamari_ocr.ocr.text_processing import text_processor_from_proto
 from calamari_ocr.ocr.data_processing import data_processor_from_proto
 from calamari_ocr.ocr import Codec
 from calamari_ocr.ocr.backends import create_backend_from_proto
+from calamari_ocr.ocr.backends.ctc_decoder.ctc_decoder import LazyPrediction
 from calamari_ocr.proto import CheckpointParams
+from calamari_ocr.utils.multiprocessing import acquire_pools, release_pools
+
+
+LOGITS_FORMATS = ["proto", "numpy", "none"]
 
 
 class PredictionResult:
-    def __init__(self, prediction, codec, text_postproc):
+    def __init__(self, prediction, codec, text_postproc, logits_format="proto"):
         """ The output of a networks prediction (PredictionProto) with additional information
 
         It stores all required information for decoding (`codec`) and interpreting the output.
 
         Parameters
         ----------
-        prediction : PredictionProto
-            prediction the DNN
+        prediction : PredictionProto or LazyPrediction
+            prediction the DNN. A LazyPrediction is converted to a PredictionProto on the first access of `prediction`
         codec : Codec
             codec required to decode the `prediction`
         text_postproc : TextPostprocessor
             text processor to apply to the decodec `prediction` to receive the actual prediction sentence
+        logits_format : {"proto", "numpy", "none"}
+            How to store the logits of a LazyPrediction. "proto" copies the logits into the PredictionProto,
+            "numpy" only keeps them as float32 array in `logits`, and "none" drops the logits.
         """
-        self.prediction = prediction
-        self.logits = np.reshape(prediction.logits.data, (prediction.logits.rows, prediction.logits.cols))
+        if logits_format not in LOGITS_FORMATS:
+            raise Exception("Unknown logits format '{}'. Supported are {}".format(logits_format, LOGITS_FORMATS))
+
         self.codec = codec
         self.text_postproc = text_postproc
+        self.logits_format = logits_format
         self.chars = codec.decode(prediction.labels)
         self.sentence = self.text_postproc.apply("".join(self.chars))
-        self.prediction.sentence = self.sentence
 
-        for p in self.prediction.positions:
+        if isinstance(prediction, LazyPrediction):
+            if logits_format == "none":
+                prediction.logits = None
+
+            self._lazy_prediction = prediction
+            self._prediction = None
+            self.logits = prediction.logits
+        else:
+            self._lazy_prediction = None
+            self._set_prediction(prediction)
+            self.logits = np.reshape(prediction.logits.data, (prediction.logits.rows, prediction.logits.cols))
+
+    @property
+    def prediction(self):
+        if self._prediction is None:
+            self._set_prediction(self._lazy_prediction.to_prediction(with_logits=self.logits_format == "proto"))
+            self._lazy_prediction = None
+
+        return self._prediction
+
+    def _set_prediction(self, prediction):
+        self._prediction = prediction
+        self._prediction.sentence = self.sentence
+
+        for p in self._prediction.positions:
             for c in p.chars:
-                c.char = codec.code2char[c.label]
+                c.char = self.codec.code2char[c.label]
 
 
 class Predictor:
-    def __init__(self, checkpoint=None, text_postproc=None, data_preproc=None, codec=None, network=None, batch_size=1, processes=1):
+    def __init__(self, checkpoint=None, text_postproc=None, data_preproc=None, codec=None, network=None, batch_size=1, processes=1,
+                 prefetch=2, logits_format="proto", preproc_cache=None):
         """ Predicting a dataset based on a trained model
 
         Parameters
@@ -64,10 +101,22 @@ class Predictor:
             Batch size to use for prediction
         processes : int, optional
             The number of processes to use for prediction
+        prefetch : int, optional
+            The number of chunks of lines that are preprocessed in the background while the network predicts
+        logits_format : {"proto", "numpy", "none"}
+            How to store the logits of the predictions, see `PredictionResult`.
+            Use "numpy" or "none" if the logits are not written to a PredictionProto to save memory and time.
+        preproc_cache : DataPreprocessorCache, optional
+            On-disk cache for the preprocessed lines of the `data_preproc` loaded from the `checkpoint`
         """
         self.network = network
         self.checkpoint = checkpoint
         self.processes = processes
+        self.prefetch = prefetch
+        self.logits_format = logits_format
+        # lines are passed in chunks to the network, so that the preprocessing of the next chunks can be run
+        # simultaneously by the background processes
+        self.chunk_size = max(1, batch_size) * max(4, processes if processes > 0 else os.cpu_count())
 
         if checkpoint:
             if network:
@@ -82,6 +131,8 @@ class Predictor:
             self.network = backend.create_net(restore=self.checkpoint, weights=None, graph_type="predict", batch_size=batch_size)
             self.text_postproc = text_postproc if text_postproc else text_processor_from_proto(self.model_params.text_postprocessor, "post")
             self.data_preproc = data_preproc if data_preproc else data_processor_from_proto(self.model_params.data_preprocessor)
+            if preproc_cache and not data_preproc:
+                self.data_preproc = preproc_cache.wrap(self.data_preproc, self.model_params.data_preprocessor)
         elif network:
             self.model_params = None
             self.network_params = network.network_proto
@@ -94,7 +145,15 @@ class Predictor:
 
         self.codec = codec if codec else Codec(self.model_params.codec.charset)
 
-    def predict_dataset(self, dataset, progress_bar=True):
+    def __enter__(self):
+        """ Keep the worker pools of the preprocessing alive until the predictor is exited, see `pool_scope` """
+        acquire_pools()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        release_pools()
+
+    def predict_dataset(self, dataset, progress_bar=True, window_size=0):
         """ Predict a complete dataset
 
         Parameters
@@ -103,6 +162,10 @@ class Predictor:
             Dataset to predict
         progress_bar : bool, optional
             hide or show a progress bar
+        window_size : int, optional
+            Number of lines that are loaded, preprocessed, and predicted at once. Only one window is held in the
+            memory, thus the memory consumption does not depend on the size of the `dataset`.
+            If <= 0 the complete dataset is loaded at once.
 
         Yields
         -------
@@ -111,13 +174,24 @@ class Predictor:
         dict
             Dataset entry of the prediction result
         """
-        dataset.load_samples(processes=1, progress_bar=progress_bar)
-        datas = dataset.prediction_samples()
+        with self:
+            if window_size <= 0:
+                dataset.load_samples(processes=self.processes, progress_bar=progress_bar, use_thread_pool=True)
+                datas = dataset.prediction_samples()
+
+                prediction_results = self.predict_raw(datas, progress_bar)
+
+                for prediction, sample in zip(prediction_results, dataset.samples()):
+                    yield prediction, sample
 
-        prediction_results = self.predict_raw(datas, progress_bar)
+                return
 
-        for prediction, sample in zip(prediction_results, dataset.samples()):
-            yield prediction, sample
+            with tqdm(total=len(dataset), desc="Prediction", disable=not progress_bar) as pbar:
+                for samples in dataset.stream_samples(window_size, processes=self.processes, use_thread_pool=True):
+                    datas = [sample["image"] for sample in samples]
+                    for prediction, sample in zip(self.predict_raw(datas, progress_bar=False), samples):
+                        pbar.update(1)
+                        yield prediction, sample
 
     def predict_raw(self, datas, progress_bar=True, apply_preproc=True):
         """ Predict raw data
@@ -134,24 +208,28 @@ class Predictor:
         PredictionResult
             A single PredictionResult
         """
-        # preprocessing step
-        if apply_preproc:
-            datas = self.data_preproc.apply(datas, processes=self.processes, progress_bar=progress_bar)
+        chunks = [datas[i:i + self.chunk_size] for i in range(0, len(datas), self.chunk_size)]
 
-        # create backend
-        self.network.set_data(datas)
+        # preprocessing step, the next chunks are preprocessed in the background while predicting the current one
+        if apply_preproc:
+            if len(chunks) > 1:
+                chunks = self.data_preproc.apply_prefetched(chunks, processes=self.processes, prefetch=self.prefetch)
+            else:
+                chunks = [self.data_preproc.apply(chunk, processes=self.processes) for chunk in chunks]
 
-        if progress_bar:
-            out = tqdm(self.network.prediction_step(), desc="Prediction", total=len(datas))
-        else:
-            out = self.network.prediction_step()
+        with tqdm(desc="Prediction", total=len(datas), disable=not progress_bar) as pbar:
+            for chunk in chunks:
+                self.network.set_data(chunk)
 
-        for p in out:
-            yield PredictionResult(p, codec=self.codec, text_postproc=self.text_postproc)
+                for p in self.network.prediction_step():
+                    pbar.update(1)
+                    yield PredictionResult(p, codec=self.codec, text_postproc=self.text_postproc,
+                                           logits_format=self.logits_format)
 
 
 class MultiPredictor:
-    def __init__(self, checkpoints=[], text_postproc=None, data_preproc=None, batch_size=1, processes=1):
+    def __init__(self, checkpoints=[], text_postproc=None, data_preproc=None, batch_size=1, processes=1, prefetch=2,
+                 logits_format="proto", preproc_cache=None):
         """Predict multiple models to use voting
 
         Parameters
@@ -166,45 +244,128 @@ class MultiPredictor:
             The number of files to process simultaneously by the DNN
         processes : int, optional
             The number of processes to use
+        prefetch : int, optional
+            The number of batches that are preprocessed in the background while the networks predict
+        logits_format : {"proto", "numpy", "none"}
+            How to store the logits of the predictions, see `PredictionResult`
+        preproc_cache : DataPreprocessorCache, optional
+            On-disk cache for the preprocessed lines
         """
         if len(checkpoints) == 0:
             raise Exception("No checkpoints provided.")
 
         self.processes = processes
         self.checkpoints = checkpoints
-        self.predictors = [Predictor(cp, batch_size=batch_size, processes=processes) for cp in checkpoints]
+        self.predictors = [Predictor(cp, batch_size=batch_size, processes=processes, prefetch=prefetch,
+                                     logits_format=logits_format, preproc_cache=preproc_cache)
+                           for cp in checkpoints]
         self.batch_size = batch_size
+        self.prefetch = prefetch
 
         # check if all checkpoints share the same preprocessor
         # then we only need to apply the preprocessing once and share the data accross the models
         preproc_params = self.predictors[0].model_params.data_preprocessor
         self.same_preproc = all([preproc_params == p.model_params.data_preprocessor for p in self.predictors])
 
-    def predict_dataset(self, dataset, progress_bar=True):
-        start_time = time.time()
-        dataset.load_samples(processes=1, progress_bar=progress_bar)
-        datas = dataset.prediction_samples()
+        # the threads of the models, shared by all predictions until the (outermost) context is exited
+        self._thread_pool = None
+        self._thread_pool_users = 0
+        self._thread_pool_lock = threading.Lock()
+
+    def __enter__(self):
+        """ Keep the worker pools of the preprocessing and the threads of the models alive until the predictor is
+        exited, see `pool_scope`
+        """
+        acquire_pools()
+        with self._thread_pool_lock:
+            if self._thread_pool_users == 0:
+                # all models predict each chunk simultaneously, each one in its own session, thus one thread per
+                # model is sufficient since tensorflow releases the GIL
+                self._thread_pool = ThreadPool(len(self.predictors))
+
+            self._thread_pool_users += 1
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._thread_pool_lock:
+            self._thread_pool_users -= 1
+            if self._thread_pool_users == 0:
+                self._thread_pool.close()
+                self._thread_pool.join()
+                self._thread_pool = None
+
+        release_pools()
+
+    def predict_raw(self, datas, progress_bar=True):
+        """ Predict raw data with all models
+
+        Parameters
+        ----------
+        datas : list of array_like
+            list of images
+        progress_bar : bool, optional
+            Show or hide a progress bar
+
+        Yields
+        -------
+        tuple of PredictionResult
+            The PredictionResult of each model
+        """
+        with self:
+            for result in tqdm(self._predict(datas), total=len(datas), desc="Prediction", disable=not progress_bar):
+                yield result
+
+    def _predict(self, datas):
+        chunk_size = self.predictors[0].chunk_size
+        chunks = [datas[i:i + chunk_size] for i in range(0, len(datas), chunk_size)]
 
         # preprocessing step (if all share the same preprocessor)
+        # the next chunks are preprocessed in the background while the networks predict the current one
         if self.same_preproc:
-            datas = self.predictors[0].data_preproc.apply(datas, processes=self.processes, progress_bar=progress_bar)
+            chunks = self.predictors[0].data_preproc.apply_prefetched(chunks, processes=self.processes,
+                                                                      prefetch=self.prefetch)
 
-        def progress_bar_wrapper(l):
-            if progress_bar:
-                l = list(l)
-                return tqdm(l, total=len(l), desc="Prediction")
-            else:
-                return l
+        def predict_chunk(predictor, chunk):
+            return list(predictor.predict_raw(chunk, progress_bar=False, apply_preproc=not self.same_preproc))
 
-        for data_idx in progress_bar_wrapper(range(0, len(datas), self.batch_size)):
-            batch_data = datas[data_idx:data_idx+self.batch_size]
-            samples = dataset.samples()[data_idx:data_idx+self.batch_size]
+        for chunk in chunks:
+            # list of the predictions of each model [model][line]
+            prediction = self._thread_pool.starmap(predict_chunk, [(predictor, chunk) for predictor in self.predictors])
+            yield from zip(*prediction)
 
-            # predict_raw returns list of [pred (batch_size), time]
-            prediction = [predictor.predict_raw(batch_data, progress_bar=False, apply_preproc=not self.same_preproc)
-                          for predictor in self.predictors]
+    def predict_dataset(self, dataset, progress_bar=True, window_size=0):
+        """ Predict a complete dataset with all models
 
-            for result, sample in zip(zip(*prediction), samples):
-                yield result, sample
+        Parameters
+        ----------
+        dataset : Dataset
+            Dataset to predict
+        progress_bar : bool, optional
+            hide or show a progress bar
+        window_size : int, optional
+            Number of lines that are loaded, preprocessed, and predicted at once.
+            If <= 0 the complete dataset is loaded at once.
 
-        print("Prediction of {} models took {}s".format(len(self.predictors), time.time() - start_time))
+        Yields
+        -------
+        tuple of PredictionResult
+            The PredictionResult of each model
+        dict
+            Dataset entry of the prediction result
+        """
+        start_time = time.time()
+        n_lines = 0
+
+        with self, tqdm(total=len(dataset), desc="Prediction", disable=not progress_bar) as pbar:
+            for window_samples in dataset.stream_samples(window_size, processes=self.processes,
+                                                         progress_bar=progress_bar and window_size <= 0,
+                                                         use_thread_pool=True):
+                datas = [sample["image"] for sample in window_samples]
+                for result, sample in zip(self._predict(datas), window_samples):
+                    n_lines += 1
+                    pbar.update(1)
+                    yield result, sample
+
+        dt = time.time() - start_time
+        print("Prediction of {} models took {}s ({:.2f} lines/s)".format(len(self.predictors), dt, n_lines / max(dt, 1e-6)))
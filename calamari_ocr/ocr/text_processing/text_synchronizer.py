@@ -47,44 +47,108 @@ class Sync:
         self.substr[idx, :] = v
 
 
+def match_lengths(c1, c2):
+    """ Length of the common substring that starts at each pair of positions of two texts
+
+    The lengths are computed by a dynamic program over the integer encoded texts: the matrix of equal characters is
+    skewed so that each of its diagonals is a column, then the length of the match that starts at a pair of positions
+    is the distance to the next mismatch in its column.
+
+    Parameters
+    ----------
+    c1 : array_like of int
+        the first encoded text
+    c2 : array_like of int
+        the second encoded text
+
+    Returns
+    -------
+    array_like of int
+        the lengths, shape (len(c1), len(c2))
+    """
+    n, m = len(c1), len(c2)
+    if n == 0 or m == 0:
+        return np.zeros((n, m), dtype=np.int32)
+
+    # row i of `diagonals` holds the equal characters of c1[i] and c2[k + i - n] in column k, the padding (left and
+    # right) ends all matches at the end of the texts
+    width = 2 * n + m
+    skewed = np.zeros(n * (width + 1), dtype=bool)
+    skewed[:n * width].reshape(n, width)[:, n:n + m] = np.equal.outer(c1, c2)
+    diagonals = skewed.reshape(n, width + 1)[:, :n + m]
+
+    rows = np.arange(n, dtype=np.int32)[:, np.newaxis]
+    next_mismatch = np.minimum.accumulate(np.where(diagonals, np.int32(n), rows)[::-1], axis=0)[::-1]
+    lengths = next_mismatch - rows
+
+    # undo the skew, lengths[i, k] belongs to the pair (i, k + i - n)
+    return lengths.ravel()[n:].reshape(n, n + m - 1)[:, :m]
+
+
+def longest_match(lengths, start1, stop1, start2, stop2):
+    """ Longest common substring of the ranges `start1...stop1` and `start2...stop2` (inclusive) of two texts
+
+    Parameters
+    ----------
+    lengths : array_like of int
+        the lengths of the matches of the complete texts, see `match_lengths`
+    start1 : int
+        first position of the range in the first text
+    stop1 : int
+        last position of the range in the first text
+    start2 : int
+        first position of the range in the second text
+    stop2 : int
+        last position of the range in the second text
+
+    Returns
+    -------
+    int
+        the length of the match, 0 if there is none
+    int
+        the start of the match in the first text
+    int
+        the start of the match in the second text, of all longest matches the first one in order of the start in the
+        first text and then in the second text is returned
+    """
+    n, m = stop1 - start1 + 1, stop2 - start2 + 1
+    if n <= 0 or m <= 0:
+        return 0, 0, 0
+
+    # the matches end at the end of the ranges
+    bounded = np.minimum(lengths[start1:stop1 + 1, start2:stop2 + 1],
+                         np.minimum.outer(np.arange(n, 0, -1, dtype=np.int32), np.arange(m, 0, -1, dtype=np.int32)))
+
+    # the first maximum in row-major order
+    index = int(np.argmax(bounded))
+    length = int(bounded.flat[index])
+    if length == 0:
+        return 0, 0, 0
+
+    i, j = divmod(index, m)
+    return length, start1 + i, start2 + j
+
+
 def synchronize(texts):
     num_text = len(texts)
 
+    # the texts (or sequences of hashable elements) are compared as integer arrays
+    codes = {}
+    encoded = [np.array([codes.setdefault(c, len(codes)) for c in text], dtype=np.int64) for text in texts]
+    # all matches are searched between the first and each other text
+    matches = [None] + [match_lengths(encoded[0], c) for c in encoded[1:]]
+
     def init():
         sync = Sync(texts)
         for i, text in enumerate(texts):
             sync.set_all(i, [0, len(text) - 1, len(text)])
 
         if sync.is_valid():
-            return [sync]
+            return sync
 
-        return []
+        return None
 
-    def longest_match(maxlen, c1, start1, stop1, c2, start2, stop2):
-        mstart1 = 0
-        mstart2 = 0
-        s1limit = stop1 - maxlen
-        s2limit = stop2 - maxlen
-        for s1 in range(start1, s1limit + 1):
-            for s2 in range(start2, s2limit + 1):
-                if c1[s1] == c2[s2]:
-                    i1 = s1 + 1
-                    i2 = s2 + 1
-                    while i1 <= stop1 and i2 <= stop2 and c1[i1] == c2[i2]:
-                        i1 += 1
-                        i2 += 1
-
-                    increase = i1 - s1 - maxlen
-                    if increase > 0:
-                        s1limit -= increase
-                        s2limit -= increase
-                        maxlen += increase
-                        mstart1 = s1
-                        mstart2 = s2
-
-        return maxlen, mstart1, mstart2
-
-    def save_match(synclist, num_text, sync, start, length, match):
+    def save_match(sync, start, length, match):
         left, right = Sync(texts), Sync(texts)
         for i in range(num_text):
             stop = start[i] + length - 1
@@ -93,50 +157,46 @@ def synchronize(texts):
             sync.set_all(i, [start[i], stop, length])
 
         sync.match = match
-        if left.is_valid():
-            synclist.insert(synclist.index(sync), left)
+        return left, right
 
-        if right.is_valid():
-            synclist.insert(synclist.index(sync) + 1, right)
+    def recursive_sync(sync):
+        """ Split `sync` at the longest match of all texts, and the parts left and right of the match recursively
 
-    def recursive_sync(synclist, texts, start_index):
-        sync = synclist[start_index]
+        Returns the synchronized parts of `sync` in order
+        """
         if np.any(sync.lengths() == 0):
-            return
+            return [sync]
 
-        start = np.zeros(len(texts), dtype=int)
+        start = np.zeros(num_text, dtype=int)
         start[0] = sync.start(0)
         length = sync.length(0)
-        for i, text in enumerate(texts[1:], 1):
-            length, new_start, start[i] = longest_match(0, texts[0], start[0], start[0] + length - 1,
-                                                        text, sync.start(i), sync.stop(i))
+        for i in range(1, num_text):
+            length, new_start, start[i] = longest_match(matches[i], start[0], start[0] + length - 1,
+                                                        sync.start(i), sync.stop(i))
 
             if length == 0:
-                return
+                return [sync]
 
             change = new_start - start[0]
             if change > 0:
                 for j in range(i):
                     start[j] += change
 
-        save_match(synclist, len(texts), sync, start, length, True)
-
-        start_index = synclist.index(sync)
-        if start_index - 1 >= 0:
-            recursive_sync(synclist, texts, start_index - 1)
+        left, right = save_match(sync, start, length, True)
 
-        start_index = synclist.index(sync)
-        if start_index + 1 < len(synclist):
-            recursive_sync(synclist, texts, start_index + 1)
+        synclist = recursive_sync(left) if left.is_valid() else []
+        synclist.append(sync)
+        if right.is_valid():
+            synclist += recursive_sync(right)
 
-        return
+        return synclist
 
-    synclist = init()
+    sync = init()
 
-    if len(synclist) > 0:
-        recursive_sync(synclist, texts, 0)
+    if sync is None:
+        return []
 
-    return synclist
+    return recursive_sync(sync)
 
 
 if __name__ == "__main__":
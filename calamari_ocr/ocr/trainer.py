@@ -2,12 +2,16 @@ from calamari_ocr.ocr.text_processing import text_processor_from_proto
 from calamari_ocr.ocr.data_processing import data_processor_from_proto
 from calamari_ocr.ocr import Codec
 from calamari_ocr.ocr.backends import create_backend_from_proto
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import shutil
+import tempfile
 import time
 import os
 import numpy as np
 import bidi.algorithm as bidi
 
-from calamari_ocr.utils import RunningStatistics, checkpoint_path
+from calamari_ocr.utils import RunningStatistics, checkpoint_path, pool_scope
 
 from calamari_ocr.ocr import Predictor, Evaluator
 from calamari_ocr.proto import CheckpointParams
@@ -15,6 +19,138 @@ from calamari_ocr.proto import CheckpointParams
 from google.protobuf import json_format
 
 
+class AsyncEarlyStoppingValidator:
+    def __init__(self, network_params, batch_size, codec, txt_preproc, txt_postproc,
+                 validation_datas, validation_txts, processes, snapshot_dir):
+        """ Validate snapshots of the weights in a background thread while the training continues
+
+        The validation net is created in its own backend (graph and session), so it does not block the training
+        session. At most one snapshot is validated at once.
+
+        Parameters
+        ----------
+        network_params : NetworkParams
+            the parameters of the trained network
+        batch_size : int
+            batch size of the validation net
+        codec : Codec
+            the codec of the trained network
+        txt_preproc : TextProcessor
+            text preprocessor that is applied on the predicted sentences
+        txt_postproc : TextProcessor
+            text postprocessor of the predicted sentences
+        validation_datas : list of array_like
+            the preprocessed validation lines
+        validation_txts : list of str
+            the preprocessed validation ground truth
+        processes : int
+            processes to use for the text processing and evaluation
+        snapshot_dir : str
+            directory for the temporary snapshots, should be on the same device as the best model
+        """
+        self.network_params = network_params
+        self.batch_size = batch_size
+        self.codec = codec
+        self.txt_preproc = txt_preproc
+        self.txt_postproc = txt_postproc
+        self.validation_datas = validation_datas
+        self.validation_txts = validation_txts
+        self.processes = processes
+        self.snapshot_dir = tempfile.mkdtemp(prefix=".early_stopping_", dir=snapshot_dir)
+
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.net = None
+        self.predictor = None
+
+    def submit(self, train_net, at_iter, state=None):
+        """ Store a snapshot of the weights of `train_net` and validate it in the background
+
+        Parameters
+        ----------
+        train_net : ModelInterface
+            the net whose weights are validated
+        at_iter : int
+            the iteration of the snapshot
+        state : object, optional
+            the training state at the time of the snapshot (e.g. statistics), it is returned by `wait`
+
+        Returns
+        -------
+        str
+            path of the snapshot
+        """
+        if self.pending is not None:
+            raise Exception("The previous snapshot must be finished before a new one can be validated")
+
+        snapshot = os.path.join(self.snapshot_dir, "snapshot{:08d}.ckpt".format(at_iter))
+        train_net.save_checkpoint(snapshot)
+        self.pending = (self.executor.submit(self._validate, snapshot), at_iter, snapshot, state)
+        return snapshot
+
+    def poll(self):
+        """ Result of the pending validation if it is finished, see `wait` """
+        if self.pending is None or not self.pending[0].done():
+            return None
+
+        return self.wait()
+
+    def wait(self):
+        """ Wait for the pending validation
+
+        Returns
+        -------
+        tuple or None
+            accuracy, iteration, path, and training state of the validated snapshot, or None if no validation is
+            pending
+        """
+        if self.pending is None:
+            return None
+
+        future, at_iter, snapshot, state = self.pending
+        self.pending = None
+        return future.result(), at_iter, snapshot, state
+
+    def close(self):
+        """ Stop the background thread and remove all snapshots
+
+        A pending validation is cancelled if it has not started yet, otherwise it is finished first, because it still
+        reads its snapshot and uses the worker pools.
+        """
+        if self.pending is not None:
+            self.pending[0].cancel()
+            self.pending = None
+
+        self.executor.shutdown(wait=True)
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+
+    def _validate(self, snapshot):
+        if self.net is None:
+            backend = create_backend_from_proto(self.network_params)
+            self.net = backend.create_net(restore=None, weights=None, graph_type="test", batch_size=self.batch_size)
+            self.net.set_data(self.validation_datas, self.validation_txts)
+            self.net.prepare()
+            self.predictor = Predictor(codec=self.codec, text_postproc=self.txt_postproc, network=self.net,
+                                       logits_format="none")
+
+        self.net.load_weights(snapshot, restore_only_trainable=False)
+        out = self.predictor.predict_raw(self.validation_datas, progress_bar=False, apply_preproc=False)
+        pred_texts = self.txt_preproc.apply([d.sentence for d in out], processes=self.processes)
+        result = Evaluator.evaluate(gt_data=self.validation_txts, pred_data=pred_texts, processes=self.processes)
+        return 1 - result["avg_ler"]
+
+    @staticmethod
+    def remove_snapshot(snapshot):
+        for path in glob.glob(snapshot + ".*"):
+            os.remove(path)
+
+    @staticmethod
+    def move_snapshot(snapshot, checkpoint_path):
+        """ Move all files of the snapshot to `checkpoint_path` (the json of the params is not part of a snapshot) """
+        for path in glob.glob(snapshot + ".*"):
+            os.replace(path, checkpoint_path + path[len(snapshot):])
+
+
 class Trainer:
     def __init__(self, checkpoint_params,
                  dataset,
@@ -26,7 +162,8 @@ class Trainer:
                  n_augmentations=0,
                  weights=None,
                  codec=None,
-                 codec_whitelist=[]):
+                 codec_whitelist=[],
+                 async_early_stopping=False):
         """Train a DNN using given preprocessing, weights, and data
 
         The purpose of the Trainer is handle a default training mechanism.
@@ -66,6 +203,9 @@ class Trainer:
             If provided the Codec will not be computed automaticall based on the GT, but instead `codec` will be used
         codec_whitelist : obj:`list` of :obj:`str`
             List of characters to be kept when the loaded `weights` have a different codec than the new one.
+        async_early_stopping : bool, optional
+            Validate snapshots of the weights in a background thread (see `AsyncEarlyStoppingValidator`) while the
+            training continues. The best model decision is applied when the validation is finished.
         """
         self.checkpoint_params = checkpoint_params
         self.dataset = dataset
@@ -78,6 +218,7 @@ class Trainer:
         self.weights = checkpoint_path(weights) if weights else None
         self.codec = codec
         self.codec_whitelist = codec_whitelist
+        self.async_early_stopping = async_early_stopping
 
     def train(self, progress_bar=False):
         """ Launch the training
@@ -88,17 +229,24 @@ class Trainer:
             Show or hide any progress bar
 
         """
+        # the preprocessing, text processing, and all early stopping evaluations share the same worker pools
+        with pool_scope():
+            self._train(progress_bar)
+
+    def _train(self, progress_bar):
         checkpoint_params = self.checkpoint_params
 
         train_start_time = time.time() + self.checkpoint_params.total_time
 
-        self.dataset.load_samples(processes=1, progress_bar=progress_bar)
+        self.dataset.load_samples(processes=checkpoint_params.processes, progress_bar=progress_bar,
+                                  use_thread_pool=True)
         datas, txts = self.dataset.train_samples(skip_empty=checkpoint_params.skip_invalid_gt)
         if len(datas) == 0:
             raise Exception("Empty dataset is not allowed. Check if the data is at the correct location")
 
         if self.validation_dataset:
-            self.validation_dataset.load_samples(processes=1, progress_bar=progress_bar)
+            self.validation_dataset.load_samples(processes=checkpoint_params.processes, progress_bar=progress_bar,
+                                                 use_thread_pool=True)
             validation_datas, validation_txts = self.validation_dataset.train_samples(skip_empty=checkpoint_params.skip_invalid_gt)
             if len(validation_datas) == 0:
                 raise Exception("Validation dataset is empty. Provide valid validation data for early stopping.")
@@ -173,6 +321,7 @@ class Trainer:
         loss_stats = RunningStatistics(checkpoint_params.stats_size, checkpoint_params.loss_stats)
         ler_stats = RunningStatistics(checkpoint_params.stats_size, checkpoint_params.ler_stats)
         dt_stats = RunningStatistics(checkpoint_params.stats_size, checkpoint_params.dt_stats)
+        padding_stats = RunningStatistics(checkpoint_params.stats_size, [])
 
         early_stopping_enabled = self.validation_dataset is not None \
                                  and checkpoint_params.early_stopping_frequency > 0 \
@@ -182,26 +331,41 @@ class Trainer:
         early_stopping_best_at_iter = checkpoint_params.early_stopping_best_at_iter
 
         early_stopping_predictor = Predictor(codec=codec, text_postproc=self.txt_postproc,
-                                             network=test_net)
+                                             network=test_net, logits_format="none")
 
         # Start the actual training
         # ====================================================================================
 
         iter = checkpoint_params.iter
 
-        # helper function to write a checkpoint
-        def make_checkpoint(base_dir, prefix, version=None):
+        # the statistics of the training, a snapshot is written with the statistics at its time
+        def training_state():
+            return {
+                "loss_stats": list(loss_stats.values),
+                "ler_stats": list(ler_stats.values),
+                "dt_stats": list(dt_stats.values),
+                "total_time": time.time() - train_start_time,
+            }
+
+        # helper function to write a checkpoint, either of the current weights or of a snapshot of the weights
+        def make_checkpoint(base_dir, prefix, version=None, snapshot=None, snapshot_iter=None, snapshot_state=None):
             if version:
                 checkpoint_path = os.path.abspath(os.path.join(base_dir, "{}{}.ckpt".format(prefix, version)))
             else:
                 checkpoint_path = os.path.abspath(os.path.join(base_dir, "{}{:08d}.ckpt".format(prefix, iter + 1)))
             print("Storing checkpoint to '{}'".format(checkpoint_path))
-            train_net.save_checkpoint(checkpoint_path)
-            checkpoint_params.iter = iter
-            checkpoint_params.loss_stats[:] = loss_stats.values
-            checkpoint_params.ler_stats[:] = ler_stats.values
-            checkpoint_params.dt_stats[:] = dt_stats.values
-            checkpoint_params.total_time = time.time() - train_start_time
+            if snapshot:
+                AsyncEarlyStoppingValidator.move_snapshot(snapshot, checkpoint_path)
+                checkpoint_params.iter = snapshot_iter - 1
+                state = snapshot_state
+            else:
+                train_net.save_checkpoint(checkpoint_path)
+                checkpoint_params.iter = iter
+                state = training_state()
+            checkpoint_params.loss_stats[:] = state["loss_stats"]
+            checkpoint_params.ler_stats[:] = state["ler_stats"]
+            checkpoint_params.dt_stats[:] = state["dt_stats"]
+            checkpoint_params.total_time = state["total_time"]
             checkpoint_params.early_stopping_best_accuracy = early_stopping_best_accuracy
             checkpoint_params.early_stopping_best_cur_nbest = early_stopping_best_cur_nbest
             checkpoint_params.early_stopping_best_at_iter = early_stopping_best_at_iter
@@ -211,8 +375,55 @@ class Trainer:
 
             return checkpoint_path
 
+        last_checkpoint = None
+
+        # helper function to apply the result of a validation, returns whether to stop the training
+        def early_stopping_update(accuracy, at_iter, snapshot=None, snapshot_state=None):
+            nonlocal early_stopping_best_accuracy, early_stopping_best_cur_nbest, early_stopping_best_at_iter
+            nonlocal last_checkpoint
+
+            if accuracy > early_stopping_best_accuracy:
+                early_stopping_best_accuracy = accuracy
+                early_stopping_best_cur_nbest = 1
+                early_stopping_best_at_iter = at_iter
+                # overwrite as best model
+                last_checkpoint = make_checkpoint(
+                    checkpoint_params.early_stopping_best_model_output_dir,
+                    prefix="",
+                    version=checkpoint_params.early_stopping_best_model_prefix,
+                    snapshot=snapshot,
+                    snapshot_iter=at_iter,
+                    snapshot_state=snapshot_state,
+                )
+                print("Found better model with accuracy of {:%}".format(early_stopping_best_accuracy))
+            else:
+                early_stopping_best_cur_nbest += 1
+                if snapshot:
+                    AsyncEarlyStoppingValidator.remove_snapshot(snapshot)
+                print("No better model found. Currently accuracy of {:%} at iter {} (remaining nbest = {})".
+                      format(early_stopping_best_accuracy, early_stopping_best_at_iter,
+                             checkpoint_params.early_stopping_nbest - early_stopping_best_cur_nbest))
+
+            return accuracy > 0 and early_stopping_best_cur_nbest >= checkpoint_params.early_stopping_nbest
+
+        def async_early_stopping_update(finished):
+            if finished is None:
+                return False
+
+            accuracy, at_iter, snapshot, snapshot_state = finished
+            print("Validation of the model at iter {} finished".format(at_iter))
+            return early_stopping_update(accuracy, at_iter, snapshot, snapshot_state)
+
+        if early_stopping_enabled and self.async_early_stopping:
+            early_stopping_validator = AsyncEarlyStoppingValidator(
+                network_params, checkpoint_params.batch_size, codec, self.txt_preproc, self.txt_postproc,
+                validation_datas, validation_txts, checkpoint_params.processes,
+                snapshot_dir=checkpoint_params.early_stopping_best_model_output_dir,
+            )
+        else:
+            early_stopping_validator = None
+
         try:
-            last_checkpoint = None
             n_infinite_losses = 0
             n_max_infinite_losses = 5
 
@@ -243,13 +454,15 @@ class Trainer:
                 ler_stats.push(result['ler'])
 
                 dt_stats.push(time.time() - iter_start_time)
+                padding_stats.push(result['padding'])
 
                 if iter % checkpoint_params.display == 0:
                     # apply postprocessing to display the true output
                     pred_sentence = self.txt_postproc.apply("".join(codec.decode(result["decoded"][0])))
                     gt_sentence = self.txt_postproc.apply("".join(codec.decode(result["gt"][0])))
 
-                    print("#{:08d}: loss={:.8f} ler={:.8f} dt={:.8f}s".format(iter, loss_stats.mean(), ler_stats.mean(), dt_stats.mean()))
+                    print("#{:08d}: loss={:.8f} ler={:.8f} dt={:.8f}s padding={:.2%}".format(
+                        iter, loss_stats.mean(), ler_stats.mean(), dt_stats.mean(), padding_stats.mean()))
                     # Insert utf-8 ltr/rtl direction marks for bidi support
                     lr = "\u202A\u202B"
                     print(" PRED: '{}{}{}'".format(lr[bidi.get_base_level(pred_sentence)], pred_sentence, "\u202C"))
@@ -258,7 +471,21 @@ class Trainer:
                 if (iter + 1) % checkpoint_params.checkpoint_frequency == 0:
                     last_checkpoint = make_checkpoint(checkpoint_params.output_dir, checkpoint_params.output_model_prefix)
 
+                if early_stopping_validator and async_early_stopping_update(early_stopping_validator.poll()):
+                    print("Early stopping now.")
+                    break
+
                 if early_stopping_enabled and (iter + 1) % checkpoint_params.early_stopping_frequency == 0:
+                    if early_stopping_validator:
+                        # only one snapshot is validated at once, thus wait for the previous one
+                        if async_early_stopping_update(early_stopping_validator.wait()):
+                            print("Early stopping now.")
+                            break
+
+                        print("Validating a snapshot of the model in the background")
+                        early_stopping_validator.submit(train_net, iter + 1, training_state())
+                        continue
+
                     print("Checking early stopping model")
 
                     out = early_stopping_predictor.predict_raw(validation_datas,
@@ -268,32 +495,22 @@ class Trainer:
                     result = Evaluator.evaluate(gt_data=validation_txts, pred_data=pred_texts, progress_bar=progress_bar)
                     accuracy = 1 - result["avg_ler"]
 
-                    if accuracy > early_stopping_best_accuracy:
-                        early_stopping_best_accuracy = accuracy
-                        early_stopping_best_cur_nbest = 1
-                        early_stopping_best_at_iter = iter + 1
-                        # overwrite as best model
-                        last_checkpoint = make_checkpoint(
-                            checkpoint_params.early_stopping_best_model_output_dir,
-                            prefix="",
-                            version=checkpoint_params.early_stopping_best_model_prefix,
-                        )
-                        print("Found better model with accuracy of {:%}".format(early_stopping_best_accuracy))
-                    else:
-                        early_stopping_best_cur_nbest += 1
-                        print("No better model found. Currently accuracy of {:%} at iter {} (remaining nbest = {})".
-                              format(early_stopping_best_accuracy, early_stopping_best_at_iter,
-                                     checkpoint_params.early_stopping_nbest - early_stopping_best_cur_nbest))
-
-                    if accuracy > 0 and early_stopping_best_cur_nbest >= checkpoint_params.early_stopping_nbest:
+                    if early_stopping_update(accuracy, iter + 1):
                         print("Early stopping now.")
                         break
 
+            if early_stopping_validator:
+                # apply the validation of the last snapshot
+                async_early_stopping_update(early_stopping_validator.wait())
+
         except KeyboardInterrupt as e:
             print("Storing interrupted checkpoint")
             make_checkpoint(checkpoint_params.output_dir,
                             checkpoint_params.output_model_prefix,
                             "interrupted")
             raise e
+        finally:
+            if early_stopping_validator:
+                early_stopping_validator.close()
 
         print("Total time {}s for {} iterations.".format(time.time() - train_start_time, iter))
@@ -0,0 +1,368 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from calamari_ocr.ocr.backends.ctc_decoder.default_ctc_decoder import DefaultCTCDecoder
+from calamari_ocr.ocr.codec import Codec
+from calamari_ocr.ocr.data_processing import CenterNormalizer, DefaultDataPreprocessor, MultiDataProcessor
+from calamari_ocr.ocr.data_processing.center_normalizer import scale_to_h, scale_to_h_separable
+from calamari_ocr.ocr.predictor import PredictionResult, LOGITS_FORMATS
+from calamari_ocr.ocr.text_processing import TextNormalizer
+from calamari_ocr.ocr.text_processing.text_processor import NoopTextProcessor
+from calamari_ocr.test.test_center_normalizer import random_line
+from calamari_ocr.test.test_ctc_decoder import random_batch
+from calamari_ocr.utils import parallel_map
+
+
+def benchmark_prediction_logits(args):
+    """ Time and memory required to decode and store the predictions of `args.n_lines` lines for each logits format
+
+    The predictions of all lines are kept in memory (as it is the case during voting), the PredictionProto of
+    each line is created and serialized as it is required for writing the extended prediction data.
+    """
+    rnd = np.random.RandomState(args.seed)
+    codec = Codec([chr(0x4E00 + i) for i in range(args.n_classes)])
+    decoder = DefaultCTCDecoder()
+    text_postproc = NoopTextProcessor()
+    # reuse a few random batches to keep the memory of the input data low
+    n_batches = (args.n_lines + args.batch_size - 1) // args.batch_size
+    batches = [random_batch(rnd, args.batch_size, args.line_length, args.n_classes, blank_ratio=0.6, noise=1e-5,
+                            min_len=args.line_length // 2)
+               for _ in range(min(n_batches, 8))]
+
+    print("{:>8s} {:>10s} {:>12s} {:>16s}".format("logits", "time [s]", "peak [MB]", "serialized [MB]"))
+    for logits_format in LOGITS_FORMATS:
+        tracemalloc.start()
+        start = time.time()
+        results = []
+        serialized_size = 0
+        for i in range(n_batches):
+            probabilities, seq_len = batches[i % len(batches)]
+            for p in decoder.decode_batch(probabilities, seq_len, lazy=True):
+                r = PredictionResult(p, codec=codec, text_postproc=text_postproc, logits_format=logits_format)
+                serialized_size += len(r.prediction.SerializeToString())
+                results.append(r)
+
+        duration = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del results
+
+        print("{:>8s} {:>10.2f} {:>12.1f} {:>16.1f}".format(
+            logits_format, duration, peak / 1024 ** 2, serialized_size / 1024 ** 2))
+
+
+def timeit(f, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        f()
+
+    return (time.time() - start) / repeats
+
+
+def benchmark_dewarp(args):
+    """ Time of the dewarping of the CenterNormalizer and of the complete DefaultDataPreprocessor for several
+    line widths. The column gathering of the dewarping is compared to the previous implementation (a slice per column).
+    """
+    rnd = np.random.RandomState(args.seed)
+    normalizer = CenterNormalizer(target_height=args.line_height)
+    data_preproc = DefaultDataPreprocessor(args.line_height, pad=16)
+
+    print("{:>6s} {:>16s} {:>16s} {:>12s} {:>16s}".format(
+        "width", "loop [ms]", "gather [ms]", "dewarp [ms]", "preproc [ms]"))
+    for width in [100, 200, 500, 1000, 2000, 5000]:
+        img = random_line(rnd, int(args.line_height * 1.5), width)
+        temp = np.amax(img) - img
+        center, r = normalizer.measure(temp / np.amax(temp))
+        padded = np.vstack([np.ones((r, width)), img, np.ones((r, width))])
+        center = center + r
+
+        def loop():
+            return np.array([padded[center[i] - r:center[i] + r, i] for i in range(width)], dtype='f').T
+
+        def gather():
+            rows = center[np.newaxis, :] + np.arange(-r, r)[:, np.newaxis]
+            return padded[rows, np.arange(width)[np.newaxis, :]].astype('f')
+
+        print("{:>6d} {:>16.3f} {:>16.3f} {:>12.3f} {:>16.3f}".format(
+            width,
+            timeit(loop, args.repeats) * 1000,
+            timeit(gather, args.repeats) * 1000,
+            timeit(lambda: normalizer.dewarp(img, cval=1), args.repeats) * 1000,
+            timeit(lambda: data_preproc.apply(img), args.repeats) * 1000,
+        ))
+
+
+def benchmark_center_normalizer_batch(args):
+    """ Throughput of the CenterNormalizer on single lines and on batches of lines """
+    rnd = np.random.RandomState(args.seed)
+    normalizer = CenterNormalizer(target_height=args.line_height)
+    imgs = [random_line(rnd, rnd.randint(args.line_height, args.line_height * 3), rnd.randint(100, 2000))
+            for _ in range(256)]
+    cvals = [np.amax(img) for img in imgs]
+
+    print("{:>10s} {:>12s}".format("batch size", "lines/s"))
+    for batch_size in [1, 4, 16, 64]:
+        def run():
+            for i in range(0, len(imgs), batch_size):
+                normalizer.normalize_batch(imgs[i:i + batch_size], cvals=cvals[i:i + batch_size])
+
+        print("{:>10d} {:>12.1f}".format(batch_size, len(imgs) / timeit(run, max(1, args.repeats // 10))))
+
+
+def benchmark_resampling(args):
+    """ Time of scaling lines to the line height by `affine_transform` and by the separable resampler, and the
+    throughput of the complete DefaultDataPreprocessor with both
+    """
+    rnd = np.random.RandomState(args.seed)
+    intermediate_height = int(args.line_height * 1.5)
+
+    print("{:>6s} {:>14s} {:>15s} {:>14s} {:>15s}".format(
+        "width", "affine [ms]", "separable [ms]", "preproc [ms]", "fast prep. [ms]"))
+    for width in [100, 500, 1000, 2000, 5000]:
+        img = random_line(rnd, intermediate_height, width).astype(np.float32)
+        print("{:>6d} {:>14.3f} {:>15.3f} {:>14.3f} {:>15.3f}".format(
+            width,
+            timeit(lambda: scale_to_h(img, args.line_height), args.repeats) * 1000,
+            timeit(lambda: scale_to_h_separable(img, args.line_height), args.repeats) * 1000,
+            timeit(lambda: DefaultDataPreprocessor(args.line_height).apply(img), args.repeats) * 1000,
+            timeit(lambda: DefaultDataPreprocessor(args.line_height, fast_resampling=True).apply(img),
+                   args.repeats) * 1000,
+        ))
+
+
+def benchmark_preprocessing_latency(args):
+    """ Per-line latency of the DefaultDataPreprocessor: the chained steps with `affine_transform`, the chained
+    steps with the separable resampler, and the fused float32 kernel
+    """
+    rnd = np.random.RandomState(args.seed)
+    imgs = [(random_line(rnd, rnd.randint(args.line_height // 2, args.line_height * 3),
+                               rnd.randint(100, 2000)) * 255).astype(np.uint8)
+            for _ in range(max(1, args.repeats) * 10)]
+    fused = DefaultDataPreprocessor(args.line_height, pad=16, fast_resampling=True)
+    data_preprocs = [
+        ("chained", DefaultDataPreprocessor(args.line_height, pad=16)),
+        ("chained separable", MultiDataProcessor(fused.sub_processors)),
+        ("fused", fused),
+    ]
+
+    print("{:>18s} {:>12s} {:>12s} {:>12s}".format("preprocessor", "mean [ms]", "median [ms]", "p95 [ms]"))
+    for name, data_preproc in data_preprocs:
+        latencies = []
+        for img in imgs:
+            start = time.time()
+            data_preproc.apply(img)
+            latencies.append((time.time() - start) * 1000)
+
+        print("{:>18s} {:>12.3f} {:>12.3f} {:>12.3f}".format(
+            name, np.mean(latencies), np.median(latencies), np.percentile(latencies, 95)))
+
+
+def _identity(x):
+    return x
+
+
+def benchmark_parallel_map(args):
+    """ Time to transfer lines to worker processes and back by pickling and by the shared memory transport, and
+    time of a cheap text preprocessing with single elements and automatically sized chunks
+    """
+    rnd = np.random.RandomState(args.seed)
+    imgs = [(random_line(rnd, args.line_height * 2, rnd.randint(500, 3000)) * 255).astype(np.uint8)
+            for _ in range(max(1, args.repeats) * 20)]
+    size = sum([img.nbytes for img in imgs]) / 1024 ** 2
+
+    print("{:>14s} {:>10s} {:>10s}".format("transport", "time [s]", "MB/s"))
+    for shared_memory in [False, True]:
+        duration = timeit(lambda: parallel_map(_identity, imgs, processes=2, shared_memory=shared_memory), 3)
+        print("{:>14s} {:>10.3f} {:>10.1f}".format(
+            "shared memory" if shared_memory else "pickle", duration, size / duration))
+
+    # a cheap function on many elements is dominated by the inter process communication
+    text_preproc = TextNormalizer()
+    txts = ["".join(chr(c) for c in rnd.randint(32, 1000, size=rnd.randint(10, 80))) for _ in range(args.n_lines)]
+    print("{:>14s} {:>10s}".format("chunksize", "time [s]"))
+    for chunksize in [1, None]:
+        duration = timeit(lambda: parallel_map(text_preproc._apply_single, txts, processes=2, chunksize=chunksize), 3)
+        print("{:>14s} {:>10.3f}".format(str(chunksize or "auto"), duration))
+
+
+def benchmark_train_step(args):
+    """ Training iterations per second of a single session run per step compared to the previous implementation,
+    that computed the loss in a first run and the update (on the next batch) in a second run
+
+    Requires tensorflow
+    """
+    from calamari_ocr.ocr.backends import create_backend_from_proto
+    from calamari_ocr.proto import NetworkParams, network_params_from_definition_string
+
+    rnd = np.random.RandomState(args.seed)
+    network_params = NetworkParams()
+    network_params_from_definition_string(args.network, network_params)
+    network_params.features = args.line_height
+    network_params.classes = args.n_classes
+    network_params.backend.random_seed = args.seed
+
+    n_lines = args.batch_size * 10
+    datas = [rnd.randint(0, 256, size=(rnd.randint(200, 600), args.line_height)).astype(np.uint8)
+             for _ in range(n_lines)]
+    labels = [list(rnd.randint(1, args.n_classes, size=rnd.randint(10, 40))) for _ in range(n_lines)]
+
+    backend = create_backend_from_proto(network_params)
+    net = backend.create_net(restore=None, weights=None, graph_type="train", batch_size=args.batch_size)
+    net.set_data(datas, labels)
+    net.prepare()
+
+    def two_runs():
+        feed_dict = {net.dropout_rate: network_params.dropout}
+        out = net.session.run([net.loss, net.softmax, net.output_seq_len, net.cer, net.decoded, net.targets,
+                               net.input_seq_len], feed_dict=feed_dict)
+        if np.isfinite(out[0]):
+            net.session.run([net.train_op], feed_dict=feed_dict)
+
+    # warm up
+    net.train_step()
+
+    print("{:>12s} {:>10s}".format("train step", "iters/s"))
+    for name, step in [("two runs", two_runs), ("single run", net.train_step)]:
+        print("{:>12s} {:>10.2f}".format(name, 1 / timeit(step, args.train_iters)))
+
+
+def benchmark_abbyy_loading(args):
+    """ Time to load all lines of FineReader pages by decoding the page image once per line (the previous
+    implementation) and by decoding each page once
+    """
+    import os
+    import tempfile
+    import skimage.io as skimage_io
+    from calamari_ocr.ocr.dataset import AbbyyDataSet
+    from calamari_ocr.test.test_abbyy_dataset import write_abbyy_page
+
+    rnd = np.random.RandomState(args.seed)
+    with tempfile.TemporaryDirectory() as d:
+        files = [os.path.join(d, "page{}.png".format(i)) for i in range(4)]
+        for f in files:
+            write_abbyy_page(f, rnd, n_lines=40, line_height=args.line_height * 2, width=2000)
+
+        dataset = AbbyyDataSet(files)
+
+        def decode_per_line():
+            for sample in dataset.samples():
+                rect = sample["line"].rect
+                skimage_io.imread(sample["image_path"], as_gray=True)[rect.top:rect.bottom, rect.left:rect.right]
+
+        def decode_per_page():
+            dataset.loaded = False
+            dataset.load_samples()
+
+        print("{:>10s} {:>10s}".format("decode", "time [s]"))
+        for name, f in [("per line", decode_per_line), ("per page", decode_per_page)]:
+            print("{:>10s} {:>10.3f}".format(name, timeit(f, 3)))
+
+
+def benchmark_binarization(args):
+    """ Time to binarize a 300 dpi page by thresholding each pixel in python (the previous implementation) and by
+    the vectorized binarizers
+    """
+    from calamari_ocr.ocr.data_processing.binarizer import BINARIZERS
+
+    rnd = np.random.RandomState(args.seed)
+    page = (rnd.rand(3500, 2500) * 255).astype(np.uint8)
+
+    def python_loop():
+        img = page[:args.line_height * 2].astype(np.float64) / 255
+        for i in range(len(img)):
+            for j in range(len(img[0])):
+                img[i][j] = 255 if img[i][j] > 0.9 else 0
+
+    # the python loop is only timed on a single line and extrapolated
+    print("{:>12s} {:>10s}".format("binarizer", "time [s]"))
+    print("{:>12s} {:>10.3f}".format("python", timeit(python_loop, 1) * page.shape[0] / (args.line_height * 2)))
+    for name in sorted(BINARIZERS.keys()):
+        binarizer = BINARIZERS[name]()
+        print("{:>12s} {:>10.3f}".format(name, timeit(lambda: binarizer.apply(page), 3)))
+
+
+def benchmark_synchronize(args):
+    """ Time to synchronize a ground truth line with a noisy prediction (5% errors) by scanning all pairs of
+    positions (the previous implementation) and by the dynamic program, for several line lengths
+    """
+    from calamari_ocr.ocr.text_processing import synchronize
+    from calamari_ocr.test.test_text_synchronizer import reference_synchronize
+
+    rnd = np.random.RandomState(args.seed)
+    alphabet = [chr(c) for c in range(ord("a"), ord("a") + 26)] + [" "] * 5
+
+    def noisy(text):
+        out = []
+        for c in text:
+            r = rnd.rand() / 0.05
+            if r < 1:
+                out.append(rnd.choice(alphabet))
+            elif r < 2:
+                out += [c, rnd.choice(alphabet)]
+            elif r >= 3:
+                out.append(c)
+
+        return "".join(out)
+
+    print("{:>8s} {:>14s} {:>14s}".format("length", "previous [ms]", "dp [ms]"))
+    for length in [20, 50, 100, 200, 500, 1000]:
+        gts = ["".join(rnd.choice(alphabet, length)) for _ in range(20)]
+        pairs = [[gt, noisy(gt)] for gt in gts]
+        times = [timeit(lambda: [f(pair) for pair in pairs], 1) / len(pairs) * 1000
+                 for f in [reference_synchronize, synchronize]]
+        print("{:>8d} {:>14.3f} {:>14.3f}".format(length, *times))
+
+
+BENCHMARKS = {
+    "prediction_logits": benchmark_prediction_logits,
+    "dewarp": benchmark_dewarp,
+    "center_normalizer_batch": benchmark_center_normalizer_batch,
+    "resampling": benchmark_resampling,
+    "preprocessing_latency": benchmark_preprocessing_latency,
+    "parallel_map": benchmark_parallel_map,
+    "train_step": benchmark_train_step,
+    "abbyy_loading": benchmark_abbyy_loading,
+    "binarization": benchmark_binarization,
+    "synchronize": benchmark_synchronize,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs="*", default=sorted(BENCHMARKS.keys()),
+                        help="The benchmarks to run, all by default. Available: {}".format(sorted(BENCHMARKS.keys())))
+    parser.add_argument("--n_lines", type=int, default=10000,
+                        help="Number of lines to process")
+    parser.add_argument("--batch_size", type=int, default=32,
+                        help="The batch size of the (simulated) network")
+    parser.add_argument("--line_length", type=int, default=400,
+                        help="The maximal number of frames of a line")
+    parser.add_argument("--n_classes", type=int, default=100,
+                        help="The number of classes of the codec")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the random input data")
+    parser.add_argument("--line_height", type=int, default=48,
+                        help="The line height of the data preprocessing")
+    parser.add_argument("--repeats", type=int, default=20,
+                        help="Number of repetitions of the timed preprocessing operations")
+    parser.add_argument("--network", type=str, default="cnn=40:3x3,pool=2x2,cnn=60:3x3,pool=2x2,lstm=200",
+                        help="The network structure of the training benchmark")
+    parser.add_argument("--train_iters", type=int, default=50,
+                        help="Number of timed training iterations")
+
+    args = parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            raise Exception("Unknown benchmark '{}'. Available: {}".format(name, sorted(BENCHMARKS.keys())))
+
+    for name in args.benchmarks:
+        print("Running benchmark '{}'".format(name))
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
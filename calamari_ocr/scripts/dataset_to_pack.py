@@ -0,0 +1,55 @@
+import argparse
+import os
+from tqdm import tqdm
+
+from calamari_ocr.utils import glob_all, split_all_ext
+from calamari_ocr.ocr.dataset import FileDataSet, PackedDataSet
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs="+", type=str, required=True,
+                        help="The image files to pack")
+    parser.add_argument("--output", type=str, required=True,
+                        help="The output file (by convention with extension '{}')".format(PackedDataSet.EXTENSION))
+    parser.add_argument("--gt_ext", type=str, default=".gt.txt",
+                        help="Extension of the ground truth files")
+    parser.add_argument("--no_gt", action="store_true",
+                        help="Only pack the images, e.g. for prediction")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Number of processes for loading the files")
+    parser.add_argument("--window_size", type=int, default=1000,
+                        help="Number of lines that are loaded at once")
+
+    args = parser.parse_args()
+
+    args.output = os.path.expanduser(args.output)
+
+    print("Resolving files")
+    image_files = glob_all(args.files)
+    gt_files = [] if args.no_gt else [split_all_ext(p)[0] + args.gt_ext for p in image_files]
+
+    if len(image_files) == 0:
+        raise Exception("No files found")
+
+    dataset = FileDataSet(image_files, gt_files, skip_invalid=True, remove_invalid=True)
+    print("Found {} files in the dataset".format(len(dataset)))
+
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    def samples():
+        with tqdm(total=len(dataset), desc="Packing") as pbar:
+            for window in dataset.stream_samples(args.window_size, processes=args.processes):
+                for sample in window:
+                    yield sample
+
+                pbar.update(len(window))
+
+    PackedDataSet.write(args.output, samples(), len(dataset))
+    print("Packed dataset written to '{}'".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -47,7 +47,8 @@ def main():
 
     # predict for all models
     n_models = len(args.checkpoint)
-    predictor = MultiPredictor(checkpoints=args.checkpoint, batch_size=args.batch_size, processes=args.processes)
+    predictor = MultiPredictor(checkpoints=args.checkpoint, batch_size=args.batch_size, processes=args.processes,
+                               logits_format="none")
     do_prediction = predictor.predict_dataset(dataset, progress_bar=True)
 
     voters = []
@@ -72,7 +73,7 @@ def main():
     # evaluation
     text_preproc = text_processor_from_proto(predictor.predictors[0].model_params.text_preprocessor)
     evaluator = Evaluator(text_preprocessor=text_preproc)
-    evaluator.preload_gt(gt_dataset=dataset, progress_bar=True)
+    evaluator.preload_gt(gt_dataset=dataset, progress_bar=True, processes=args.processes)
 
     def single_evaluation(predicted_sentences):
         if len(predicted_sentences) != len(dataset):
@@ -8,8 +8,9 @@ from google.protobuf.json_format import MessageToJson
 
 
 from calamari_ocr.utils.glob import glob_all
-from calamari_ocr.ocr.dataset import FileDataSet
+from calamari_ocr.ocr.dataset import FileDataSet, PackedDataSet
 from calamari_ocr.ocr import Predictor, MultiPredictor
+from calamari_ocr.ocr.data_processing import DataPreprocessorCache
 from calamari_ocr.ocr.voting import voter_from_proto
 from calamari_ocr.proto import VoterParams, Predictions
 
@@ -30,30 +31,55 @@ def run(args):
     voter = voter_from_proto(voter_params)
 
     # load files
-    input_image_files = sorted(glob_all(args.files))
-
     # skip invalid files, but keep then so that empty predictions are created
-    dataset = FileDataSet(input_image_files,
-                          skip_invalid=True,
-                          remove_invalid=False)
+    if len(args.files) == 1 and args.files[0].endswith(PackedDataSet.EXTENSION):
+        dataset = PackedDataSet(args.files[0],
+                                skip_invalid=True,
+                                remove_invalid=False)
+        # the predictions are written next to the packed file
+        input_image_files = [args.files[0]] * len(dataset)
+    else:
+        input_image_files = sorted(glob_all(args.files))
+
+        dataset = FileDataSet(input_image_files,
+                              skip_invalid=True,
+                              remove_invalid=False)
 
     print("Found {} files in the dataset".format(len(dataset)))
     if len(dataset) == 0:
         raise Exception("Empty dataset provided. Check your files argument (got {})!".format(args.files))
 
     # predict for all models
-    predictor = MultiPredictor(checkpoints=args.checkpoint, batch_size=args.batch_size, processes=args.processes)
-    do_prediction = predictor.predict_dataset(dataset, progress_bar=not args.no_progress_bars)
+    # logits are only written to the extended prediction data in the pred format
+    if args.extended_prediction_data and args.extended_prediction_data_format == "pred":
+        logits_format = "proto"
+    else:
+        logits_format = "none"
+
+    if args.preproc_cache_dir:
+        preproc_cache = DataPreprocessorCache(args.preproc_cache_dir, max_size=args.preproc_cache_size * 1024 ** 2)
+    else:
+        preproc_cache = None
+
+    predictor = MultiPredictor(checkpoints=args.checkpoint, batch_size=args.batch_size, processes=args.processes,
+                               prefetch=args.prefetch, logits_format=logits_format, preproc_cache=preproc_cache)
+    do_prediction = predictor.predict_dataset(dataset, progress_bar=not args.no_progress_bars,
+                                              window_size=args.window_size)
 
     # output the voted results to the appropriate files
     for (result, sample), filepath in zip(do_prediction, input_image_files):
-        for i, p in enumerate(result):
-            p.prediction.id = "fold_{}".format(i)
+        if len(result) == 1 and not args.extended_prediction_data:
+            # neither voting nor the extended prediction data is required, thus skip creating the prediction protos
+            sentence = result[0].sentence
+        else:
+            for i, p in enumerate(result):
+                p.prediction.id = "fold_{}".format(i)
+
+            # vote the results (if only one model is given, this will just return the sentences)
+            prediction = voter.vote_prediction_result(result)
+            prediction.id = "voted"
+            sentence = prediction.sentence
 
-        # vote the results (if only one model is given, this will just return the sentences)
-        prediction = voter.vote_prediction_result(result)
-        prediction.id = "voted"
-        sentence = prediction.sentence
         if args.verbose:
             lr = "\u202A\u202B"
             print("{}: '{}{}{}'".format(sample['id'], lr[get_base_level(sentence)], sentence, "\u202C" ))
@@ -89,13 +115,18 @@ def main():
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--files", nargs="+", required=True, default=[],
-                        help="List all image files that shall be processed")
+                        help="List all image files that shall be processed, or a single packed dataset file")
     parser.add_argument("--checkpoint", type=str, nargs="+", default=[],
                         help="Path to the checkpoint without file extension")
     parser.add_argument("-j", "--processes", type=int, default=1,
                         help="Number of processes to use")
     parser.add_argument("--batch_size", type=int, default=1,
                         help="The batch size during the prediction (number of lines to process in parallel)")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="The number of batches that are preprocessed in the background while the network predicts")
+    parser.add_argument("--window_size", type=int, default=1000,
+                        help="The number of lines that are loaded, preprocessed and predicted at once. This limits the "
+                             "memory consumption for large datasets. Use a value <= 0 to load all lines at once")
     parser.add_argument("--verbose", action="store_true",
                         help="Print additional information")
     parser.add_argument("--voter", type=str, default="confidence_voter_default_ctc",
@@ -110,6 +141,11 @@ def main():
                         help="Extension format: Either pred or json. Note that json will not print logits.")
     parser.add_argument("--no_progress_bars", action="store_true",
                         help="Do not show any progress bars")
+    parser.add_argument("--preproc_cache_dir", type=str, default=None,
+                        help="Directory of an on-disk cache of the preprocessed lines, that can be shared by "
+                             "several trainings and predictions. No cache is used by default")
+    parser.add_argument("--preproc_cache_size", type=int, default=1024,
+                        help="Maximum size of the preprocessing cache in MB")
 
     args = parser.parse_args()
 
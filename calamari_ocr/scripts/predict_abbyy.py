@@ -1,16 +1,23 @@
 import argparse
 import os
 import glob
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
 
 from bidi.algorithm import get_base_level
 
 from google.protobuf.json_format import MessageToJson
 
+from calamari_ocr.utils import background_iter
 from calamari_ocr.utils.glob import glob_all
-from calamari_ocr.ocr.dataset import AbbyyDataSet
+from calamari_ocr.ocr.dataset import AbbyyPageLoader
+from calamari_ocr.ocr.data_processing.binarizer import BINARIZERS, binarizer_from_name
 from calamari_ocr.ocr import MultiPredictor
 from calamari_ocr.ocr.voting import voter_from_proto
 from calamari_ocr.proto import VoterParams, Predictions
+from calamari_ocr.utils.Abbyy.Reader import XMLReader
 from calamari_ocr.utils.Abbyy.Writer import XMLWriter
 
 
@@ -29,32 +36,80 @@ def run(args):
     voter_params.type = VoterParams.Type.Value(args.voter.upper())
     voter = voter_from_proto(voter_params)
 
-    # load files
+    # predict for all models
+    # logits are only written to the extended prediction data in the pred format
+    if args.extended_prediction_data and args.extended_prediction_data_format == "pred":
+        logits_format = "proto"
+    else:
+        logits_format = "none"
+
+    predictor = MultiPredictor(checkpoints=args.checkpoint, batch_size=args.batch_size, processes=args.processes,
+                               prefetch=args.prefetch, logits_format=logits_format)
+
+    # the pages are processed by a pipeline of concurrent stages that are connected by bounded queues:
+    # parsing of the xml files, decoding of the page images and cropping of the lines, prediction, and writing.
+    # the ground truth is not required for the prediction
     files = glob.glob(args.files)
-    dataset = AbbyyDataSet(files,
-                           skip_invalid=True,
-                           remove_invalid=False,
-                           binary=args.binary)
-
-    dataset.load_samples(processes=args.processes, progress_bar=not args.no_progress_bars)
-
-    print("Found {} files in the dataset".format(len(dataset)))
-    if len(dataset) == 0:
+    reader = XMLReader(files, skip_invalid=True, remove_invalid=False, read_chars=False, processes=args.processes)
+    page_loader = AbbyyPageLoader(binarizer_from_name(args.binarization) if args.binary else None)
+
+    def parsed_pages():
+        for document in reader.iter_documents():
+            for page in document.pages:
+                yield document, page
+
+    def loaded_pages():
+        for document, page in background_iter(parsed_pages(), maxsize=args.prefetch_pages):
+            yield document, page, page_loader.load(page)
+
+    writer = None
+    n_pages, n_lines = 0, 0
+    with predictor, ThreadPoolExecutor(1) as write_pool, \
+            tqdm(desc="Prediction", unit="page", disable=args.no_progress_bars) as pbar:
+        pending = deque()
+        for document, page, lines in background_iter(loaded_pages(), maxsize=args.prefetch_pages):
+            output_dir = args.output_dir if args.output_dir else os.path.dirname(page.imgFile)
+            if writer is None:
+                writer = XMLWriter(output_dir, os.path.dirname(page.imgFile), document)
+
+            samples = []
+            for line, fo, image in lines:
+                sample = {"id": n_lines.__str__(), "line": line, "format": fo, "image": image}
+                n_lines += 1
+                # skip invalid lines (e. g. corrupted or empty page images, or empty rectangles)
+                if image is None or image.size == 0:
+                    print("Empty data: Image at '{}' is empty".format(sample['id']))
+                    continue
+
+                samples.append(sample)
+
+            results = list(predictor.predict_raw([sample["image"] for sample in samples], progress_bar=False))
+
+            # page N is written while page N + 1 is predicted
+            pending.append(write_pool.submit(write_page, args, voter, writer, page, output_dir, samples, results))
+            while len(pending) > args.prefetch_pages:
+                pending.popleft().result()
+
+            n_pages += 1
+            pbar.update(1)
+
+        while len(pending) > 0:
+            pending.popleft().result()
+
+    if n_lines == 0:
         raise Exception("Empty dataset provided. Check your files argument (got {})!".format(args.files))
 
-    # predict for all models
-    predictor = MultiPredictor(checkpoints=args.checkpoint, batch_size=args.batch_size, processes=args.processes)
-    do_prediction = predictor.predict_dataset(dataset, progress_bar=not args.no_progress_bars)
+    writer.close()
 
-    # output the voted results to the appropriate files
-    input_image_files = []
+    print("Predicted {} lines of {} pages".format(n_lines, n_pages))
+    print("All files written")
 
-    # creat input_image_files list for next loop
-    for page in dataset.book.pages:
-        for fo in page.getFormats():
-            input_image_files.append(page.imgFile)
 
-    for (result, sample), filepath in zip(do_prediction, input_image_files):
+def write_page(args, voter, writer, page, output_dir, samples, results):
+    """ Vote the predictions of the lines of `page`, write the extended prediction data of each line, and add the
+    page with the voted sentences to the `writer`
+    """
+    for result, sample in zip(results, samples):
         for i, p in enumerate(result):
             p.prediction.id = "fold_{}".format(i)
 
@@ -66,13 +121,11 @@ def run(args):
             lr = "\u202A\u202B"
             print("{}: '{}{}{}'".format(sample['id'], lr[get_base_level(sentence)], sentence, "\u202C" ))
 
-        output_dir = args.output_dir if args.output_dir else os.path.dirname(filepath)
-
         sample["format"].text = sentence
 
         if args.extended_prediction_data:
             ps = Predictions()
-            ps.line_path = filepath
+            ps.line_path = page.imgFile
             ps.predictions.extend([prediction] + [r.prediction for r in result])
             if args.extended_prediction_data_format == "pred":
                 with open(os.path.join(output_dir, sample['id'] + ".pred"), 'wb') as f:
@@ -89,10 +142,7 @@ def run(args):
             else:
                 raise Exception("Unknown prediction format.")
 
-    w = XMLWriter(output_dir, os.path.dirname(filepath), dataset.book)
-    w.write()
-
-    print("All files written")
+    writer.add_page(page)
 
 
 def main():
@@ -106,6 +156,11 @@ def main():
                         help="Number of processes to use")
     parser.add_argument("--batch_size", type=int, default=1,
                         help="The batch size during the prediction (number of lines to process in parallel)")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="The number of batches that are preprocessed in the background while the network predicts")
+    parser.add_argument("--prefetch_pages", type=int, default=2,
+                        help="The number of pages that are parsed and cropped ahead of, and written behind the "
+                             "prediction")
     parser.add_argument("--verbose", action="store_true",
                         help="Print additional information")
     parser.add_argument("--voter", type=str, default="confidence_voter_default_ctc",
@@ -122,6 +177,9 @@ def main():
                         help="Do not show any progress bars")
     parser.add_argument("--binary", action="store_true",
                         help="Works with binary images")
+    parser.add_argument("--binarization", type=str, default="fixed", choices=sorted(BINARIZERS.keys()),
+                        help="The thresholding of the pages if --binary is set: a fixed threshold, or Otsu's or "
+                             "Sauvola's threshold computed on each page")
 
     args = parser.parse_args()
 
@@ -2,10 +2,10 @@ import argparse
 
 from calamari_ocr.utils.glob import glob_all
 from calamari_ocr.utils.path import split_all_ext
-from calamari_ocr.ocr.dataset import FileDataSet
+from calamari_ocr.ocr.dataset import FileDataSet, PackedDataSet
 from calamari_ocr.ocr.augmentation.data_augmenter import SimpleDataAugmenter
 from calamari_ocr.ocr import Trainer
-from calamari_ocr.ocr.data_processing.default_data_preprocessor import DefaultDataPreprocessor
+from calamari_ocr.ocr.data_processing import data_processor_from_proto, DataPreprocessorCache
 from calamari_ocr.ocr.text_processing import DefaultTextPreprocessor, text_processor_from_proto, BidiTextProcessor, \
     default_text_normalizer_params, default_text_regularizer_params
 
@@ -17,7 +17,8 @@ def setup_train_args(parser, omit=[]):
     if "files" not in omit:
         parser.add_argument("--files", nargs="+",
                             help="List all image files that shall be processed. Ground truth fils with the same "
-                                 "base name but with '.gt.txt' as extension are required at the same location")
+                                 "base name but with '.gt.txt' as extension are required at the same location. "
+                                 "Alternatively a single packed dataset file (see dataset_to_pack.py)")
 
     parser.add_argument("--seed", type=int, default="0",
                         help="Seed for random operations. If negative or zero a 'random' seed is used")
@@ -29,6 +30,9 @@ def setup_train_args(parser, omit=[]):
                         help="The line height")
     parser.add_argument("--pad", type=int, default=16,
                         help="Padding (left right) of the line")
+    parser.add_argument("--fast_resampling", action="store_true",
+                        help="Scale the lines by a fast separable float32 interpolation instead of an affine "
+                             "transformation. The results only differ by rounding errors")
     parser.add_argument("--num_threads", type=int, default=1,
                         help="The number of threads to use for all operations")
     parser.add_argument("--display", type=int, default=1,
@@ -90,8 +94,16 @@ def setup_train_args(parser, omit=[]):
     if "early_stopping_best_model_output_dir" not in omit:
         parser.add_argument("--early_stopping_best_model_output_dir", type=str, default=None,
                             help="Path where to store the best model. Default is output_dir")
+    parser.add_argument("--async_early_stopping", action="store_true",
+                        help="Validate snapshots of the model in the background while the training continues, "
+                             "instead of pausing the training for each validation")
     parser.add_argument("--n_augmentations", type=int, default=0,
                         help="Number of data augmentation per line (done before training)")
+    parser.add_argument("--preproc_cache_dir", type=str, default=None,
+                        help="Directory of an on-disk cache of the preprocessed lines, that can be shared by "
+                             "several trainings and predictions. No cache is used by default")
+    parser.add_argument("--preproc_cache_size", type=int, default=1024,
+                        help="Maximum size of the preprocessing cache in MB")
 
     # backend specific params
     parser.add_argument("--fuzzy_ctc_library_path", type=str, default="",
@@ -129,26 +141,32 @@ def run(args):
 
     # Training dataset
     print("Resolving input files")
-    input_image_files = glob_all(args.files)
-    gt_txt_files = [split_all_ext(f)[0] + ".gt.txt" for f in input_image_files]
+    if len(args.files) == 1 and args.files[0].endswith(PackedDataSet.EXTENSION):
+        dataset = PackedDataSet(args.files[0], skip_invalid=not args.no_skip_invalid_gt)
+    else:
+        input_image_files = glob_all(args.files)
+        gt_txt_files = [split_all_ext(f)[0] + ".gt.txt" for f in input_image_files]
 
-    if len(set(gt_txt_files)) != len(gt_txt_files):
-        raise Exception("Some image are occurring more than once in the data set.")
+        if len(set(gt_txt_files)) != len(gt_txt_files):
+            raise Exception("Some image are occurring more than once in the data set.")
 
-    dataset = FileDataSet(input_image_files, gt_txt_files, skip_invalid=not args.no_skip_invalid_gt)
+        dataset = FileDataSet(input_image_files, gt_txt_files, skip_invalid=not args.no_skip_invalid_gt)
     print("Found {} files in the dataset".format(len(dataset)))
 
     # Validation dataset
     if args.validation:
         print("Resolving validation files")
-        validation_image_files = glob_all(args.validation)
-        val_txt_files = [split_all_ext(f)[0] + ".gt.txt" for f in validation_image_files]
+        if len(args.validation) == 1 and args.validation[0].endswith(PackedDataSet.EXTENSION):
+            validation_dataset = PackedDataSet(args.validation[0], skip_invalid=not args.no_skip_invalid_gt)
+        else:
+            validation_image_files = glob_all(args.validation)
+            val_txt_files = [split_all_ext(f)[0] + ".gt.txt" for f in validation_image_files]
 
-        if len(set(val_txt_files)) != len(val_txt_files):
-            raise Exception("Some validation images are occurring more than once in the data set.")
+            if len(set(val_txt_files)) != len(val_txt_files):
+                raise Exception("Some validation images are occurring more than once in the data set.")
 
-        validation_dataset = FileDataSet(validation_image_files, val_txt_files,
-                                         skip_invalid=not args.no_skip_invalid_gt)
+            validation_dataset = FileDataSet(validation_image_files, val_txt_files,
+                                             skip_invalid=not args.no_skip_invalid_gt)
         print("Found {} files in the validation dataset".format(len(validation_dataset)))
     else:
         validation_dataset = None
@@ -174,6 +192,7 @@ def run(args):
     params.model.data_preprocessor.type = DataPreprocessorParams.DEFAULT_NORMALIZER
     params.model.data_preprocessor.line_height = args.line_height
     params.model.data_preprocessor.pad = args.pad
+    params.model.data_preprocessor.fast_resampling = args.fast_resampling
 
     # Text pre processing (reading)
     params.model.text_preprocessor.type = TextProcessorParams.MULTI_NORMALIZER
@@ -214,14 +233,21 @@ def run(args):
     params.model.network.backend.num_inter_threads = args.num_inter_threads
     params.model.network.backend.num_intra_threads = args.num_intra_threads
 
+    data_preproc = data_processor_from_proto(params.model.data_preprocessor)
+    if args.preproc_cache_dir:
+        preproc_cache = DataPreprocessorCache(args.preproc_cache_dir, max_size=args.preproc_cache_size * 1024 ** 2)
+        data_preproc = preproc_cache.wrap(data_preproc, params.model.data_preprocessor)
+
     # create the actual trainer
     trainer = Trainer(params,
                       dataset,
                       validation_dataset=validation_dataset,
+                      data_preproc=data_preproc,
                       data_augmenter=SimpleDataAugmenter(),
                       n_augmentations=args.n_augmentations,
                       weights=args.weights,
                       codec_whitelist=whitelist,
+                      async_early_stopping=args.async_early_stopping,
                       )
     trainer.train(progress_bar=not args.no_progress_bars)
 
@@ -0,0 +1,177 @@
+import os
+import tempfile
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+from unittest import mock
+
+import numpy as np
+import skimage.io as skimage_io
+
+from calamari_ocr.ocr.data_processing import binarizer_from_name
+from calamari_ocr.ocr.dataset import AbbyyDataSet
+from calamari_ocr.utils.Abbyy.Reader import XMLReader
+from calamari_ocr.utils.Abbyy.Writer import XMLWriter
+
+
+def write_abbyy_page(path, rnd, n_lines=5, line_height=20, width=300):
+    """ Write a random page image with `n_lines` lines and the matching FineReader xml file """
+    page = (rnd.rand(n_lines * line_height, width) * 255).astype(np.uint8)
+    skimage_io.imsave(path, page, check_contrast=False)
+
+    lines = []
+    for i in range(n_lines):
+        lines.append('<line baseline="{b}" l="5" t="{t}" r="{r}" b="{b}"><formatting lang="English">line {i}'
+                     '</formatting></line>'.format(t=i * line_height, b=(i + 1) * line_height, r=width - 5, i=i))
+
+    with open(os.path.splitext(path)[0] + ".xml", 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>'
+                '<document xmlns="http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml" version="1.0" '
+                'producer="test" languages="" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                'xsi:schemaLocation="http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml '
+                'http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml">'
+                '<page width="{w}" height="{h}" resolution="300" originalCoords="1">'
+                '<block blockType="Text" blockName="" l="0" t="0" r="{w}" b="{h}"><text><par>{lines}</par></text>'
+                '</block></page></document>'.format(w=width, h=page.shape[0], lines="".join(lines)))
+
+    return page
+
+
+class TestAbbyyDataSet(unittest.TestCase):
+    def test_page_is_decoded_once(self):
+        rnd = np.random.RandomState(0)
+        with tempfile.TemporaryDirectory() as d:
+            pages = [write_abbyy_page(os.path.join(d, "page{}.png".format(i)), rnd) for i in range(3)]
+            dataset = AbbyyDataSet([os.path.join(d, "page{}.png".format(i)) for i in range(3)])
+
+            with mock.patch.object(skimage_io, "imread", wraps=skimage_io.imread) as imread:
+                samples = dataset.load_samples()
+                self.assertEqual(imread.call_count, len(pages))
+
+            self.assertEqual(len(samples), 15)
+            self.assertEqual(len(dataset._page_cache), 0)
+            for i, sample in enumerate(samples):
+                page, line = divmod(i, 5)
+                np.testing.assert_array_equal(sample["image"], pages[page][line * 20:(line + 1) * 20, 5:-5])
+                self.assertEqual(sample["text"], "line {}".format(line))
+
+    def test_lru(self):
+        rnd = np.random.RandomState(1)
+        with tempfile.TemporaryDirectory() as d:
+            files = [os.path.join(d, "page{}.png".format(i)) for i in range(3)]
+            pages = [write_abbyy_page(f, rnd, n_lines=2) for f in files]
+            # interleaved access of the lines of all pages
+            order = [0, 2, 4, 1, 3, 5]
+            for max_cached_pages, decodes in [(3, 3), (1, 6)]:
+                dataset = AbbyyDataSet(files, max_cached_pages=max_cached_pages)
+                with mock.patch.object(skimage_io, "imread", wraps=skimage_io.imread) as imread:
+                    images = [dataset._load_sample(dataset.samples()[i])[0] for i in order]
+                    self.assertEqual(imread.call_count, decodes)
+
+                for i, image in zip(order, images):
+                    page, line = divmod(i, 2)
+                    np.testing.assert_array_equal(image, pages[page][line * 20:(line + 1) * 20, 5:-5])
+
+    def test_one_bit_page(self):
+        rnd = np.random.RandomState(3)
+        with tempfile.TemporaryDirectory() as d:
+            f = os.path.join(d, "page.png")
+            page = write_abbyy_page(f, rnd) > 128
+
+            # 1-bit images are decoded as bool
+            dataset = AbbyyDataSet([f])
+            with mock.patch.object(skimage_io, "imread", return_value=page):
+                samples = dataset.load_samples(processes=2, use_thread_pool=True)
+
+            self.assertEqual(len(samples), 5)
+            self.assertEqual(len(dataset._page_cache), 0)
+            for line, sample in enumerate(samples):
+                np.testing.assert_array_equal(sample["image"], page[line * 20:(line + 1) * 20, 5:-5] * 255)
+
+    def test_decode_error(self):
+        rnd = np.random.RandomState(4)
+        with tempfile.TemporaryDirectory() as d:
+            f = os.path.join(d, "page.png")
+            write_abbyy_page(f, rnd)
+            dataset = AbbyyDataSet([f])
+
+            def fail(image_path):
+                # the other threads wait for the page meanwhile
+                time.sleep(0.1)
+                raise ValueError("unknown image type")
+
+            with mock.patch.object(dataset.page_loader, "decode", side_effect=fail), ThreadPool(5) as pool:
+                results = [pool.apply_async(dataset._load_sample, (sample,)) for sample in dataset.samples()]
+                for result in results:
+                    self.assertRaises(ValueError, result.get, 10)
+
+            self.assertEqual(len(dataset._page_cache), 0)
+
+    def test_binary(self):
+        rnd = np.random.RandomState(2)
+        with tempfile.TemporaryDirectory() as d:
+            f = os.path.join(d, "page.png")
+            page = write_abbyy_page(f, rnd)
+            for binarization in ["fixed", "otsu", "sauvola"]:
+                # the threshold is computed on the full page
+                binary_page = binarizer_from_name(binarization).apply(page)
+                dataset = AbbyyDataSet([f], binary=True, binarization=binarization)
+                for i, sample in enumerate(dataset.load_samples()):
+                    np.testing.assert_array_equal(sample["image"], binary_page[i * 20:(i + 1) * 20, 5:-5])
+
+
+class TestXMLReader(unittest.TestCase):
+    def test_read(self):
+        rnd = np.random.RandomState(3)
+        with tempfile.TemporaryDirectory() as d:
+            files = [os.path.join(d, "page{}.png".format(i)) for i in range(6)]
+            for i, f in enumerate(files):
+                write_abbyy_page(f, rnd, n_lines=i + 1)
+
+            # a line that consists of single chars
+            xmlfile = os.path.splitext(files[0])[0] + ".xml"
+            with open(xmlfile) as f:
+                xml = f.read()
+            with open(xmlfile, 'w') as f:
+                f.write(xml.replace('<formatting lang="English">line 0</formatting>',
+                                    '<formatting lang="German">\n<charParams>a</charParams>'
+                                    '<charParams>b</charParams></formatting>'))
+
+            for processes in [1, 3]:
+                pages = list(XMLReader(files, False, False, processes=processes).iter_pages())
+                self.assertEqual([page.imgFile for page in pages], sorted(files))
+                self.assertEqual([len(page.getLines()) for page in pages], list(range(1, 7)))
+                self.assertEqual(pages[0].getFormats()[0].lang, "German")
+                self.assertEqual(pages[0].getFormats()[0].text, "ab")
+                self.assertEqual(pages[1].getFormats()[1].text, "line 1")
+                self.assertEqual(pages[1].getLines()[1].rect.bottom, 40)
+
+            book = XMLReader(files, False, False, read_chars=False).read()
+            self.assertEqual(len(book.pages), 6)
+            self.assertEqual(book.getFormats()[0].text, "")
+
+    def test_write_incrementally(self):
+        rnd = np.random.RandomState(4)
+        with tempfile.TemporaryDirectory() as d:
+            files = [os.path.join(d, "page{}.png".format(i)) for i in range(3)]
+            for f in files:
+                write_abbyy_page(f, rnd, n_lines=2)
+
+            documents = list(XMLReader(files, False, False).iter_documents())
+            writer = XMLWriter(os.path.join(d, "out"), d, documents[0])
+            for i, document in enumerate(documents):
+                for page in document.pages:
+                    for fo in page.getFormats():
+                        fo.text = "predicted"
+                    writer.add_page(page)
+
+                # a document is written as soon as the pages of the next one start
+                self.assertEqual(len(os.listdir(os.path.join(d, "out", "save"))) if i > 0 else 0, 2 * i)
+
+            writer.close()
+            book = XMLReader([os.path.join(d, "out", "save", os.path.basename(f)) for f in files], False, False).read()
+            self.assertEqual([fo.text for fo in book.getFormats()], ["predicted"] * 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
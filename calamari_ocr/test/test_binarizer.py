@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+from skimage.filters import threshold_otsu, threshold_sauvola
+
+from calamari_ocr.ocr.data_processing import Binarizer, FixedThresholdBinarizer, OtsuBinarizer, SauvolaBinarizer, \
+    binarizer_from_name
+
+
+def reference_binarization(img, threshold=0.9):
+    # previous implementation on float images
+    img = img.copy()
+    for i in range(len(img)):
+        for j in range(len(img[0])):
+            if img[i][j] > threshold:
+                img[i][j] = 255
+            else:
+                img[i][j] = 0
+
+    return img
+
+
+class TestBinarizer(unittest.TestCase):
+    def test_fixed(self):
+        rnd = np.random.RandomState(0)
+        img = rnd.rand(40, 60)
+        expected = reference_binarization(img)
+        np.testing.assert_array_equal(FixedThresholdBinarizer().apply(img), expected)
+        self.assertEqual(FixedThresholdBinarizer().apply(img).dtype, np.uint8)
+
+        # the threshold is relative to the value range
+        img = (img * 255).astype(np.uint8)
+        np.testing.assert_array_equal(FixedThresholdBinarizer(0.5).apply(img), np.where(img > 127.5, 255, 0))
+
+    def test_otsu_and_sauvola(self):
+        rnd = np.random.RandomState(1)
+        img = (rnd.rand(50, 80) * 255).astype(np.uint8)
+        np.testing.assert_array_equal(OtsuBinarizer().apply(img), np.where(img > threshold_otsu(img), 255, 0))
+        np.testing.assert_array_equal(SauvolaBinarizer(window_size=15).apply(img),
+                                      np.where(img > threshold_sauvola(img, window_size=15), 255, 0))
+
+        # empty images are background
+        np.testing.assert_array_equal(OtsuBinarizer().apply(np.zeros((5, 5), dtype=np.uint8)), 255)
+
+    def test_from_name(self):
+        self.assertIsInstance(binarizer_from_name("sauvola"), SauvolaBinarizer)
+        self.assertRaises(Exception, binarizer_from_name, "unknown")
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, Binarizer)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.data_processing import CenterNormalizer
+from calamari_ocr.ocr.data_processing.center_normalizer import scale_to_h, scale_to_h_separable
+
+
+def reference_dewarp(normalizer, img, cval=0, dtype=np.dtype('f')):
+    temp = np.amax(img) - img
+    amax = np.amax(temp)
+    if amax == 0:
+        return temp
+
+    temp = temp * 1.0 / np.amax(temp)
+    center, r = normalizer.measure(temp)
+    h, w = img.shape
+    padded = np.vstack([cval * np.ones((r, w)), img, cval * np.ones((r, w))])
+    center = center + r
+    dewarped = [padded[center[i] - r:center[i] + r, i] for i in range(w)]
+    return np.array(dewarped, dtype=dtype).T
+
+
+def reference_normalize(normalizer, img, cval):
+    intermediate_height = int(normalizer.target_height * 1.5)
+    if intermediate_height < img.shape[0]:
+        img = scale_to_h(img, intermediate_height, cval=cval)
+
+    dewarped = reference_dewarp(normalizer, img, cval=cval)
+    return scale_to_h(dewarped, normalizer.target_height, cval=cval)
+
+
+def random_line(rnd, h, w):
+    # a bright background with a dark text line that drifts vertically
+    img = np.ones((h, w))
+    baseline = (h / 2 + h / 4 * np.sin(np.arange(w) / w * 2 * np.pi * rnd.rand())).astype(int)
+    for x in range(0, w, 3):
+        top = max(0, baseline[x] - rnd.randint(2, h // 3))
+        img[top:baseline[x], x:x + 2] = rnd.rand()
+
+    return img
+
+
+class TestCenterNormalizer(unittest.TestCase):
+    def test_dewarp(self):
+        rnd = np.random.RandomState(0)
+        normalizer = CenterNormalizer(target_height=48)
+        for h, w in [(20, 1), (30, 100), (72, 1000), (50, 2345)]:
+            img = random_line(rnd, h, w)
+            expected = reference_dewarp(normalizer, img, cval=np.amax(img))
+            result = normalizer.dewarp(img, cval=np.amax(img))
+            self.assertEqual(expected.dtype, result.dtype)
+            np.testing.assert_array_equal(expected, result)
+
+    def test_normalize_batch(self):
+        rnd = np.random.RandomState(1)
+        normalizer = CenterNormalizer(target_height=48)
+        # lines of the same (intermediate) height are processed together, white lines are kept
+        imgs = [random_line(rnd, h, w) for h, w in [(30, 200), (100, 300), (30, 50), (72, 1000), (150, 20), (30, 400)]]
+        imgs.append(np.ones((30, 100)))
+        expected = [reference_normalize(normalizer, img, cval=np.amax(img)) for img in imgs]
+        results = normalizer.normalize_batch(imgs, cvals=[np.amax(img) for img in imgs])
+        for e, r in zip(expected, results):
+            np.testing.assert_array_equal(e, r)
+
+    def test_scale_to_h_separable(self):
+        rnd = np.random.RandomState(2)
+        for h, w, target_height in [(72, 500, 48), (30, 100, 48), (100, 1000, 72), (48, 33, 48), (17, 1, 48)]:
+            img = rnd.rand(h, w)
+            expected = scale_to_h(img, target_height, cval=1)
+            result = scale_to_h_separable(img, target_height, cval=1)
+            self.assertEqual(expected.shape, result.shape)
+            np.testing.assert_allclose(expected, result, rtol=0, atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.backends.ctc_decoder.default_ctc_decoder import DefaultCTCDecoder
+from calamari_ocr.ocr.backends.ctc_decoder.fuzzy_ctc_decoder import FuzzyCTCDecoder
+from calamari_ocr.proto import Prediction
+
+
+def reference_greedy_sentence(probabilities, blank=0):
+    last_char = blank
+    chars = np.argmax(probabilities, axis=1)
+    sentence = []
+    for idx, c in enumerate(chars):
+        if c != blank:
+            if c != last_char:
+                sentence.append((c, idx, idx + 1))
+            else:
+                _, start, end = sentence[-1]
+                del sentence[-1]
+                sentence.append((c, start, idx + 1))
+
+        last_char = c
+
+    return sentence
+
+
+def reference_find_alternatives(probabilities, sentence, threshold):
+    pred = Prediction()
+    pred.labels[:] = [c for c, _, _ in sentence]
+    pred.is_voted_result = False
+    pred.logits.rows, pred.logits.cols = probabilities.shape
+    pred.logits.data[:] = probabilities.reshape([-1])
+    for c, start, end in sentence:
+        p = probabilities[start:end]
+        p = np.max(p, axis=0)
+
+        pos = pred.positions.add()
+        pos.start = start
+        pos.end = end
+
+        for label in reversed(sorted(range(len(p)), key=lambda v: p[v])):
+            if p[label] < threshold and len(pos.chars) > 0:
+                break
+            else:
+                char = pos.chars.add()
+                char.label = label
+                char.probability = p[label]
+
+    return pred
+
+
+def random_batch(rnd, batch_size, max_len, n_classes, blank_ratio=0.5, noise=0.1, min_len=0):
+    # peaky distributions with many blanks and repetitions as produced by a CTC trained net
+    labels = rnd.randint(0, n_classes, size=(batch_size, max_len))
+    labels[rnd.rand(batch_size, max_len) < blank_ratio] = 0
+    probabilities = rnd.rand(batch_size, max_len, n_classes) * noise
+    probabilities[np.arange(batch_size)[:, np.newaxis], np.arange(max_len)[np.newaxis, :], labels] += 1
+    probabilities /= np.sum(probabilities, axis=2, keepdims=True)
+    seq_len = rnd.randint(min_len, max_len + 1, size=batch_size)
+    return probabilities.astype(np.float32), seq_len
+
+
+class TestDefaultCTCDecoder(unittest.TestCase):
+    def test_greedy_sentences_equal_reference(self):
+        rnd = np.random.RandomState(42)
+        decoder = DefaultCTCDecoder()
+        for _ in range(20):
+            probabilities, seq_len = random_batch(rnd, 8, 50, 5)
+            sentences = decoder.greedy_sentences(probabilities, seq_len)
+            self.assertEqual(len(sentences), len(probabilities))
+            for p, s, sentence in zip(probabilities, seq_len, sentences):
+                self.assertEqual(sentence, reference_greedy_sentence(p[:s]))
+
+    def test_decode_batch_equals_single_decode(self):
+        rnd = np.random.RandomState(24)
+        decoder = DefaultCTCDecoder()
+        probabilities, seq_len = random_batch(rnd, 6, 30, 10)
+        for batch_pred, p, s in zip(decoder.decode_batch(probabilities, seq_len), probabilities, seq_len):
+            expected = reference_find_alternatives(p[:s], reference_greedy_sentence(p[:s]), decoder.threshold)
+            self.assertEqual(batch_pred, expected)
+            self.assertEqual(decoder.decode(p[:s]), expected)
+
+
+class TestFindAlternatives(unittest.TestCase):
+    def test_alternatives_equal_reference(self):
+        rnd = np.random.RandomState(7)
+        decoder = FuzzyCTCDecoder()
+        for threshold in [0.0001, 0.05, 0.99]:
+            probabilities, seq_len = random_batch(rnd, 10, 40, 30)
+            for p, s in zip(probabilities, seq_len):
+                sentence = reference_greedy_sentence(p[:s])
+                expected = reference_find_alternatives(p[:s], sentence, threshold)
+                self.assertEqual(decoder.find_alternatives(p[:s], sentence, threshold), expected)
+                self.assertEqual(decoder.find_alternatives(p[:s], sentence, threshold, lazy=True).to_prediction(),
+                                 expected)
+
+    def test_alternatives_with_equal_probabilities(self):
+        decoder = FuzzyCTCDecoder()
+        probabilities = np.array([[0.0, 0.5, 0.5, 0.0], [0.25, 0.25, 0.25, 0.25], [1.0, 0.0, 0.0, 0.0]],
+                                 dtype=np.float32)
+        sentence = [(1, 0, 1), (2, 1, 3)]
+        for threshold in [0.0001, 0.3, 0.6]:
+            self.assertEqual(decoder.find_alternatives(probabilities, sentence, threshold),
+                             reference_find_alternatives(probabilities, sentence, threshold))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.data_processing import DefaultDataPreprocessor, DataPreprocessorCache
+from calamari_ocr.proto import DataPreprocessorParams
+
+
+def random_lines(rnd, n):
+    return [rnd.randint(0, 256, size=(rnd.randint(20, 40), rnd.randint(50, 200))).astype(np.uint8) for _ in range(n)]
+
+
+class TestDataPreprocessorCache(unittest.TestCase):
+    def setUp(self):
+        self.params = DataPreprocessorParams()
+        self.params.type = DataPreprocessorParams.DEFAULT_NORMALIZER
+        self.params.line_height = 32
+        self.params.pad = 4
+        self.data_preproc = DefaultDataPreprocessor(self.params.line_height, self.params.pad)
+
+    def test_cached_outputs(self):
+        lines = random_lines(np.random.RandomState(0), 10)
+        expected = self.data_preproc.apply(lines)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached_preproc = DataPreprocessorCache(cache_dir).wrap(self.data_preproc, self.params)
+            for _ in range(2):
+                for e, r in zip(expected, cached_preproc.apply(lines, processes=2)):
+                    np.testing.assert_array_equal(e, r)
+
+            # other params must not use the entries
+            other_params = DataPreprocessorParams()
+            other_params.CopyFrom(self.params)
+            other_params.pad = 0
+            other_preproc = DataPreprocessorCache(cache_dir).wrap(
+                DefaultDataPreprocessor(other_params.line_height, other_params.pad), other_params)
+            for e, r in zip(expected, other_preproc.apply(lines)):
+                self.assertEqual(e.shape[0], r.shape[0] + 2 * self.params.pad)
+
+    def test_eviction(self):
+        lines = random_lines(np.random.RandomState(1), 20)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = DataPreprocessorCache(cache_dir, max_size=50000)
+            cache.wrap(self.data_preproc, self.params).apply(lines)
+            cache.evict()
+            sizes = [os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(cache_dir) for f in files]
+            self.assertGreater(len(sizes), 0)
+            self.assertLess(len(sizes), len(lines))
+            self.assertLessEqual(sum(sizes), cache.max_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
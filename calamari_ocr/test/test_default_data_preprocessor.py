@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.data_processing import DefaultDataPreprocessor, MultiDataProcessor
+from calamari_ocr.test.test_center_normalizer import random_line
+
+
+class TestDefaultDataPreprocessor(unittest.TestCase):
+    def test_fused_equals_chained(self):
+        rnd = np.random.RandomState(0)
+        data_preproc = DefaultDataPreprocessor(48, pad=16, fast_resampling=True)
+        chained = MultiDataProcessor(data_preproc.sub_processors)
+
+        lines = []
+        for i in range(40):
+            line = (random_line(rnd, rnd.randint(20, 150), rnd.randint(30, 1000)) * 255).astype(np.uint8)
+            lines.append(np.dstack([line] * 3) if i % 4 == 0 else line)
+
+        # white lines are passed as they are
+        lines.append(np.full((30, 100), 255, dtype=np.uint8))
+
+        for expected, single, batched in zip(chained.apply(lines), [data_preproc.apply(l) for l in lines],
+                                             data_preproc.apply(lines)):
+            for result in [single, batched]:
+                self.assertEqual(expected.shape, result.shape)
+                self.assertEqual(expected.dtype, result.dtype)
+                # float32 instead of float64 arithmetic may round differently
+                self.assertLessEqual(np.max(np.abs(expected.astype(int) - result.astype(int))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
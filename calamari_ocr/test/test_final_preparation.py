@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.data_processing import FinalPreparation
+
+
+def reference_final_preparation(fp, data):
+    # previous implementation that allocates a new array in each step
+    if fp.normalize:
+        amax = np.amax(data)
+        if amax > 0:
+            data = data * 1.0 / amax
+
+    if fp.invert:
+        data = np.amax(data) - data
+
+    if fp.transpose:
+        data = data.T
+
+    if fp.pad > 0:
+        if fp.transpose:
+            w = data.shape[1]
+            data = np.vstack([np.full((fp.pad, w), fp.pad_value), data, np.full((fp.pad, w), fp.pad_value)])
+        else:
+            w = data.shape[0]
+            data = np.hstack([np.full((w, fp.pad), fp.pad_value), data, np.full((w, fp.pad), fp.pad_value)])
+
+    if fp.as_uint8:
+        data = (data * 255).astype(np.uint8)
+
+    return data
+
+
+class TestFinalPreparation(unittest.TestCase):
+    def test_reference(self):
+        rnd = np.random.RandomState(0)
+        for pad in [0, 16]:
+            for transpose in [True, False]:
+                fp = FinalPreparation(pad=pad, transpose=transpose)
+                for _ in range(10):
+                    data = (rnd.rand(32, rnd.randint(1, 300)) * rnd.rand()).astype(np.float32)
+                    expected = reference_final_preparation(fp, data)
+                    result = fp._apply_single(data)
+                    self.assertEqual(expected.shape, result.shape)
+                    self.assertEqual(expected.dtype, result.dtype)
+                    # float32 instead of float64 arithmetic may round differently
+                    self.assertLessEqual(np.max(np.abs(expected.astype(int) - result.astype(int))), 1)
+
+    def test_apply(self):
+        rnd = np.random.RandomState(1)
+        fp = FinalPreparation(pad=4)
+        datas = [rnd.rand(32, rnd.randint(1, 300)).astype(np.float32) for _ in range(8)]
+        for data, line in zip(datas, fp.apply(datas)):
+            np.testing.assert_array_equal(fp._apply_single(data), line)
+            # each line owns its memory and does not keep other lines alive
+            self.assertIsNone(line.base)
+
+
+if __name__ == "__main__":
+    unittest.main()
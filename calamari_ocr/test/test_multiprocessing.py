@@ -0,0 +1,130 @@
+import os
+import threading
+import unittest
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from calamari_ocr.utils import parallel_map, prefetch_map, pool_scope, background_iter
+from calamari_ocr.utils.multiprocessing import shared_memory_transport, get_pool, shutdown_pools, auto_chunksize
+
+
+def flip_sample(sample):
+    image, (text, small) = sample
+    return {"image": image[:, ::-1], "text": text, "small": small * 2}
+
+
+class TestSharedMemoryTransport(unittest.TestCase):
+    def setUp(self):
+        rnd = np.random.RandomState(0)
+        self.samples = [(rnd.randint(0, 256, size=(48, rnd.randint(500, 1000))).astype(np.uint8),
+                         (str(i), rnd.rand(4))) for i in range(20)]
+
+    def check_outputs(self, outputs):
+        self.assertEqual(len(outputs), len(self.samples))
+        for (image, (text, small)), out in zip(self.samples, outputs):
+            np.testing.assert_array_equal(image[:, ::-1], out["image"])
+            np.testing.assert_array_equal(small * 2, out["small"])
+            self.assertEqual(text, out["text"])
+
+    def test_parallel_map(self):
+        self.check_outputs(parallel_map(flip_sample, self.samples, processes=2))
+        self.check_outputs(parallel_map(flip_sample, self.samples, processes=2, progress_bar=True))
+
+    def test_prefetch_map(self):
+        chunks = [self.samples[i:i + 6] for i in range(0, len(self.samples), 6)]
+        self.check_outputs([o for chunk in prefetch_map(flip_sample, chunks, processes=2) for o in chunk])
+
+    def test_scratch_files_are_removed(self):
+        with shared_memory_transport() as transport:
+            f = transport.function(flip_sample)
+            outputs = [transport.receive(f(transport.pack(sample))) for sample in self.samples]
+            self.assertEqual(os.listdir(transport.scratch_dir), [])
+
+        self.assertFalse(os.path.exists(transport.scratch_dir))
+        self.check_outputs(outputs)
+
+    @unittest.skipIf(resource is None, "file descriptor limits are not available")
+    def test_results_keep_no_files_open(self):
+        # more results than open files are allowed
+        lines = [np.full((48, 400), i % 256, dtype=np.uint8) for i in range(300)]
+        get_pool(2)
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (128, hard))
+        try:
+            outputs = parallel_map(np.transpose, lines, processes=2)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+        for line, out in zip(lines, outputs):
+            np.testing.assert_array_equal(line.T, out)
+
+
+class TestPool(unittest.TestCase):
+    def test_pool_is_reused(self):
+        self.assertIs(get_pool(2), get_pool(2))
+        self.assertEqual(parallel_map(abs, list(range(-100, 0)), processes=2), list(range(100, 0, -1)))
+        self.assertEqual(parallel_map(abs, list(range(-100, 0)), processes=2, chunksize=7), list(range(100, 0, -1)))
+
+    def test_thread_pool_does_not_run_in_caller(self):
+        caller = threading.get_ident()
+        threads = parallel_map(lambda _: threading.get_ident(), list(range(10)), processes=2, use_thread_pool=True)
+        self.assertNotIn(caller, threads)
+
+    def test_unsized_data(self):
+        self.assertEqual(parallel_map(abs, (x for x in range(-10, 0)), processes=2), list(range(10, 0, -1)))
+
+    def test_pool_scope(self):
+        shutdown_pools()
+        # pools of other users outside of any scope are kept
+        unscoped = get_pool(3)
+        with pool_scope():
+            pool = get_pool(2)
+            with pool_scope():
+                self.assertIs(pool, get_pool(2))
+                self.assertIs(unscoped, get_pool(3))
+
+            # the outer scope still uses the pool
+            self.assertIs(pool, get_pool(2))
+
+        self.assertIsNot(pool, get_pool(2))
+        self.assertIs(unscoped, get_pool(3))
+        self.assertEqual(unscoped.map(abs, [-1, -2]), [1, 2])
+
+    def test_auto_chunksize(self):
+        # cheap functions are amortized, but each process gets multiple chunks
+        self.assertEqual(auto_chunksize(100000, 4, 1e-5), 5000)
+        self.assertEqual(auto_chunksize(1000, 4, 1e-6), 62)
+        # expensive functions are sent element by element
+        self.assertEqual(auto_chunksize(1000, 4, 1.0), 1)
+        self.assertEqual(auto_chunksize(2, 4, 1e-6), 1)
+
+
+class TestBackgroundIter(unittest.TestCase):
+    def test_pipeline(self):
+        squares = background_iter((x * x for x in background_iter(range(100), maxsize=3)), maxsize=1)
+        self.assertEqual(list(squares), [x * x for x in range(100)])
+
+    def test_exception(self):
+        def fail():
+            yield 1
+            raise ValueError("in the producer")
+
+        it = background_iter(fail())
+        self.assertEqual(next(it), 1)
+        self.assertRaises(ValueError, next, it)
+
+    def test_early_stop(self):
+        n_threads = threading.active_count()
+        it = background_iter(background_iter(iter(range(1000)), maxsize=2), maxsize=2)
+        self.assertEqual(next(it), 0)
+        it.close()
+        self.assertEqual(threading.active_count(), n_threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.dataset import FileDataSet, PackedDataSet
+from calamari_ocr.utils import glob_all, split_all_ext
+
+this_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestPackedDataSet(unittest.TestCase):
+    def test_pack_and_load(self):
+        images = glob_all([os.path.join(this_dir, "data", "uw3_50lines", "test", "*.png")])
+        texts = [split_all_ext(f)[0] + ".gt.txt" for f in images]
+        dataset = FileDataSet(images, texts)
+        samples = dataset.load_samples()
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "test" + PackedDataSet.EXTENSION)
+            PackedDataSet.write(path, samples, len(samples))
+            packed = PackedDataSet(path)
+
+            self.assertEqual(len(samples), len(packed))
+            for window in packed.stream_samples(7):
+                for sample in window:
+                    expected = samples[sample["pack_index"]]
+                    self.assertEqual(expected["id"], sample["id"])
+                    self.assertEqual(expected["text"], sample["text"])
+                    self.assertIsInstance(sample["image"], np.memmap)
+                    # images are stored as uint8
+                    np.testing.assert_allclose(expected["image"] * 255, sample["image"], atol=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
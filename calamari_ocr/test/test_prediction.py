@@ -14,6 +14,10 @@ class PredictionAttrs():
         self.checkpoint = [os.path.join(this_dir, "test_models", "uw3_50lines_best.ckpt")]
         self.processes = 1
         self.batch_size = 1
+        self.window_size = 1000
+        self.prefetch = 2
+        self.preproc_cache_dir = None
+        self.preproc_cache_size = 1024
         self.verbose = True
         self.voter = "confidence_voter_default_ctc"
         self.output_dir = None
@@ -14,6 +14,7 @@ class Attrs():
         self.network = "cnn=40:3x3,pool=2x2,cnn=60:3x3,pool=2x2,lstm=200,dropout=0.5"
         self.line_height = 48
         self.pad = 16
+        self.fast_resampling = False
         self.num_threads = 1
         self.display = 1
         self.batch_size = 1
@@ -35,12 +36,15 @@ class Attrs():
         self.early_stopping_nbest = 10
         self.early_stopping_best_model_prefix = "uw3_50lines_best"
         self.early_stopping_best_model_output_dir = self.output_dir
+        self.async_early_stopping = False
         self.n_augmentations = 0
         self.fuzzy_ctc_library_path = ""
         self.num_inter_threads = 0
         self.num_intra_threads = 0
         self.text_regularization = ["extended"]
         self.text_normalization = "NFC"
+        self.preproc_cache_dir = None
+        self.preproc_cache_size = 1024
 
 
 class TestSimpleTrain(unittest.TestCase):
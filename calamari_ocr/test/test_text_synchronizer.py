@@ -0,0 +1,152 @@
+import unittest
+
+import numpy as np
+
+from calamari_ocr.ocr.text_processing import synchronize
+from calamari_ocr.ocr.text_processing.text_synchronizer import Sync
+
+
+def reference_synchronize(texts):
+    # previous implementation that scans all pairs of positions for the longest match
+    num_text = len(texts)
+
+    def init():
+        sync = Sync(texts)
+        for i, text in enumerate(texts):
+            sync.set_all(i, [0, len(text) - 1, len(text)])
+
+        if sync.is_valid():
+            return [sync]
+
+        return []
+
+    def longest_match(maxlen, c1, start1, stop1, c2, start2, stop2):
+        mstart1 = 0
+        mstart2 = 0
+        s1limit = stop1 - maxlen
+        s2limit = stop2 - maxlen
+        for s1 in range(start1, s1limit + 1):
+            for s2 in range(start2, s2limit + 1):
+                if c1[s1] == c2[s2]:
+                    i1 = s1 + 1
+                    i2 = s2 + 1
+                    while i1 <= stop1 and i2 <= stop2 and c1[i1] == c2[i2]:
+                        i1 += 1
+                        i2 += 1
+
+                    increase = i1 - s1 - maxlen
+                    if increase > 0:
+                        s1limit -= increase
+                        s2limit -= increase
+                        maxlen += increase
+                        mstart1 = s1
+                        mstart2 = s2
+
+        return maxlen, mstart1, mstart2
+
+    def save_match(synclist, num_text, sync, start, length, match):
+        left, right = Sync(texts), Sync(texts)
+        for i in range(num_text):
+            stop = start[i] + length - 1
+            left.set_all(i, [sync.start(i), start[i] - 1, start[i] - sync.start(i)])
+            right.set_all(i, [stop + 1, sync.stop(i), sync.stop(i) - stop])
+            sync.set_all(i, [start[i], stop, length])
+
+        sync.match = match
+        if left.is_valid():
+            synclist.insert(synclist.index(sync), left)
+
+        if right.is_valid():
+            synclist.insert(synclist.index(sync) + 1, right)
+
+    def recursive_sync(synclist, texts, start_index):
+        sync = synclist[start_index]
+        if np.any(sync.lengths() == 0):
+            return
+
+        start = np.zeros(len(texts), dtype=int)
+        start[0] = sync.start(0)
+        length = sync.length(0)
+        for i, text in enumerate(texts[1:], 1):
+            length, new_start, start[i] = longest_match(0, texts[0], start[0], start[0] + length - 1,
+                                                        text, sync.start(i), sync.stop(i))
+
+            if length == 0:
+                return
+
+            change = new_start - start[0]
+            if change > 0:
+                for j in range(i):
+                    start[j] += change
+
+        save_match(synclist, len(texts), sync, start, length, True)
+
+        start_index = synclist.index(sync)
+        if start_index - 1 >= 0:
+            recursive_sync(synclist, texts, start_index - 1)
+
+        start_index = synclist.index(sync)
+        if start_index + 1 < len(synclist):
+            recursive_sync(synclist, texts, start_index + 1)
+
+    synclist = init()
+
+    if len(synclist) > 0:
+        recursive_sync(synclist, texts, 0)
+
+    return synclist
+
+
+def random_texts(rnd, alphabet, max_length, n_texts):
+    """ Random texts, about half of them are noisy copies of a common text """
+    base = list(rnd.choice(alphabet, rnd.randint(0, max_length + 1)))
+    texts = []
+    for _ in range(n_texts):
+        if rnd.rand() < 0.5:
+            texts.append(list(rnd.choice(alphabet, rnd.randint(0, max_length + 1))))
+            continue
+
+        text = list(base)
+        for _ in range(rnd.randint(0, 6)):
+            op, p = rnd.randint(3), rnd.randint(0, len(text) + 1)
+            if op == 0:
+                text.insert(p, rnd.choice(alphabet))
+            elif p < len(text):
+                if op == 1:
+                    del text[p]
+                else:
+                    text[p] = rnd.choice(alphabet)
+
+        texts.append(text)
+
+    return texts
+
+
+class TestTextSynchronizer(unittest.TestCase):
+    def assert_same_syncs(self, expected, result):
+        self.assertEqual([(s.substr.tolist(), s.match) for s in expected],
+                         [(s.substr.tolist(), s.match) for s in result])
+
+    def test_example(self):
+        synclist = synchronize(["AbcdEfG", "cdEFG"])
+        self.assertEqual([s.get_text() for s in synclist], [["Ab", ""], ["cdE", "cdE"], ["f", "F"], ["G", "G"]])
+        self.assertEqual(synchronize(["", ""]), [])
+
+    def test_random_strings(self):
+        rnd = np.random.RandomState(0)
+        for _ in range(2000):
+            alphabet = list("abcdefgh"[:rnd.randint(1, 9)])
+            texts = ["".join(t) for t in random_texts(rnd, alphabet, 30, rnd.randint(1, 5))]
+            self.assert_same_syncs(reference_synchronize(texts), synchronize(texts))
+
+    def test_random_sequences(self):
+        # sequences of arbitrary hashable elements, e.g. the voters
+        rnd = np.random.RandomState(1)
+        for _ in range(200):
+            alphabet = ["ab", "c", "de", "f"]
+            texts = random_texts(rnd, alphabet, 100, rnd.randint(2, 4))
+            self.assert_same_syncs(reference_synchronize(texts), synchronize(texts))
+
+
+if __name__ == "__main__":
+    unittest.main()
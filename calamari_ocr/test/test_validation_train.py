@@ -12,6 +12,15 @@ class TestValidationTrain(unittest.TestCase):
 
         run(args)
 
+    def test_validation_train_async(self):
+        args = Attrs()
+        args.validation = glob_all([os.path.join(this_dir, "data", "uw3_50lines", "test", "*.png")])
+        args.max_iters = 3000
+        args.early_stopping_best_model_prefix = args.early_stopping_best_model_prefix + "async_"
+        args.async_early_stopping = True
+
+        run(args)
+
     def test_validation_pretrain(self):
         args = Attrs()
         args.validation = glob_all([os.path.join(this_dir, "data", "uw3_50lines", "test", "*.png")])
@@ -1,28 +1,42 @@
 from lxml import etree as ET
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from calamari_ocr.utils.Abbyy import Data, Exceptions
 from calamari_ocr.utils.Abbyy.Data import Book
 from tqdm import tqdm
 
 
+NS_FINE_READER = '{http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml}'
+
+# the structure of a document: document -> page -> block -> text -> par -> line (-> formatting -> char)
+STRUCTURE_TAGS = [NS_FINE_READER + tag for tag in ['document', 'page', 'block', 'text', 'par', 'line']]
+
+
 class XMLReader:
     """
     This class can read Abbyy documents out of a directory
     """
 
-    def __init__(self, imgfiles: [], skip_invalid: bool, remove_invalid: bool):
+    def __init__(self, imgfiles: [], skip_invalid: bool, remove_invalid: bool, read_chars: bool = True,
+                 processes: int = 1):
 
         """
         Constructs an XMLReader class with the :param directory
 
+        The xml files are streamed with `lxml.etree.iterparse`, processed elements are cleared immediately, thus the
+        complete xml tree of a document is never held in memory.
+
         :param directory: Absolute or relative path of the directory there the abbyy documents are located
+        :param read_chars: Read the text of formattings that consist of char nodes. Otherwise the char nodes are
+                           skipped and the text of these formattings is empty (e.g. if the text is predicted anyway).
+        :param processes: Number of xml files that are read in parallel (by threads)
         """
         self.imgfiles = sorted(imgfiles)
         self.skip_invalid = skip_invalid
         self.remove_invalid = remove_invalid
-        self.pagecount = 0
-        self.blockcount = 0
-        self.linecount = 0
+        self.read_chars = read_chars
+        self.processes = processes
 
     def read(self) -> Data.Book:
 
@@ -35,11 +49,64 @@ class XMLReader:
         :exception XMLParseError: Is raised then there are errors in a xml file
         """
 
-        xmlfiles = []
         book: Book = None
 
-        # Searching for the xml abbyy files and handling Errors in the data structure
-        for imgfile in self.imgfiles:
+        for document in tqdm(self.iter_documents(), desc='Reading', total=len(self.imgfiles)):
+            # initialize a book class if its not None
+            if book is None:
+                book = document
+            else:
+                book.pages.extend(document.pages)
+
+        if book is None or not book.pages:
+            raise Exceptions.XMLParseError('In this selected directory there is no suitable data!')
+
+        return book
+
+    def iter_documents(self):
+
+        """
+        Reads the xml files in parallel but yields them in order of the image files.
+        At most two files per process are read ahead.
+
+        :return: generator of a Data.Book class for each xml file
+        """
+
+        files = self._files()
+        if self.processes <= 1:
+            for imgfile, xmlfile in files:
+                yield self.read_document(imgfile, xmlfile)
+            return
+
+        with ThreadPoolExecutor(self.processes) as executor:
+            futures = deque()
+            for imgfile, xmlfile in files:
+                futures.append(executor.submit(self.read_document, imgfile, xmlfile))
+                if len(futures) >= 2 * self.processes:
+                    yield futures.popleft().result()
+
+            while futures:
+                yield futures.popleft().result()
+
+    def iter_pages(self):
+
+        """
+        :return: generator of all the pages of all xml files
+        """
+
+        for document in self.iter_documents():
+            yield from document.pages
+
+    def _files(self) -> []:
+
+        """
+        Searching for the xml abbyy files and handling Errors in the data structure
+
+        :return: pairs of the image and the xml file
+        """
+
+        files = []
+        for imgfile in list(self.imgfiles):
             split = imgfile.split('.')
             split[len(split) - 1] = 'xml'
             xmlfile = split[0]
@@ -56,195 +123,163 @@ class XMLReader:
                     os.remove(imgfile)
                     os.remove(xmlfile)
             else:
-                xmlfiles.append(xmlfile)
-
-        # Starts reading the xml files
-        for imgfile, xmlfile in tqdm(zip(self.imgfiles, xmlfiles), desc='Reading', total=len(xmlfiles)):
-
-            # Reads the xml file with the xml.etree.ElementTree package
-            try:
-                tree = ET.parse(xmlfile)
-            except ET.ParseError as e:
-                raise Exceptions.XMLParseError('The xml file \'' + xmlfile + '\' couldn\'t be read because of a '
-                                                                             'syntax error in the xml file. ' + e.msg)
+                files.append((imgfile, xmlfile))
 
-            root = tree.getroot()
+        return files
 
-            if root is None:
-                raise Exceptions.XMLParseError('The xml file \'' + xmlfile + '\' is empty.')
+    def read_document(self, imgfile: str, xmlfile: str) -> Data.Book:
 
-            schemaLocation = root.get('{http://www.w3.org/2001/XMLSchema-instance}schemaLocation')
-            version = root.get('version')
-            producer = root.get('producer')
-            languages = root.get('languages')
+        """
+        Streams a single xml file
 
-            # initialize a book class if its not None
-            if book is None:
-                book: Book = Data.Book(os.path.dirname(xmlfile), schemaLocation, version, producer, languages)
-
-            for pageNode in root:
-
-                self.pagecount = self.pagecount + 1
-
-                # Constructs a page class out of the xml data
-                width = pageNode.get('width')
-                height = pageNode.get('height')
-                res = pageNode.get('resolution')
-                oC = pageNode.get('originalCoords')
-
-                # Controls the existence of the variable
-                if width is None:
-                    raise Exceptions.XMLParseError('On the page ' + self.pagecount.__str__() + ' in the document \''
-                                                   + xmlfile + '\' the \'width\' attribute is missing in the page tag.')
-                if height is None:
-                    raise Exceptions.XMLParseError('On the page ' + self.pagecount.__str__() + ' in the document \''
-                                                   + xmlfile + '\' the \'height\' attribute is missing in the page tag.')
-                if res is None:
-                    raise Exceptions.XMLParseError('On the page ' + self.pagecount.__str__() + ' in the document \''
-                                                   + xmlfile + '\' the \'resolution\' attribute '
-                                                               'is missing in the page tag.')
-                if oC is None:
-                    raise Exceptions.XMLParseError('On the page ' + self.pagecount.__str__() + ' in the document \''
-                                                   + xmlfile + '\' the \'original coords\' attribute'
-                                                               ' is missing in the page tag.')
-
-                page: Data.Page = Data.Page(width, height, res, oC, imgfile, xmlfile)
-
-                for blockNode in pageNode:
-
-                    self.blockcount = self.blockcount + 1
-
-                    # Checks if the blockType is text, ignoring all other types
-                    type = blockNode.get('blockType')
-                    if type is not None and type == 'Text':
-
-                        # Reads rectangle data and controls if they are empty
-                        name = blockNode.get('blockName')
-
-                        l = blockNode.get('l')
-                        t = blockNode.get('t')
-                        r = blockNode.get('r')
-                        b = blockNode.get('b')
-
-                        if l is None:
-                            raise Exceptions.XMLParseError(
-                                'On the page number ' + self.pagecount.__str__() + ' in the block number ' + self.blockcount +
-                                ' in the document \'' + xmlfile + '\' the rectangle attribute \'l\' is missing.')
-                        if t is None:
-                            raise Exceptions.XMLParseError(
-                                'On the page number ' + self.pagecount.__str__() + ' in the block number ' + self.blockcount +
-                                ' in the document \'' + xmlfile + '\' the rectangle attribute \'t\' is missing.')
-                        if r is None:
-                            raise Exceptions.XMLParseError(
-                                'On the page number ' + self.pagecount.__str__() + ' in the block number ' + self.blockcount +
-                                ' in the document \'' + xmlfile + '\' the rectangle attribute \'r\' is missing.')
-                        if b is None:
-                            raise Exceptions.XMLParseError(
-                                'On the page number ' + self.pagecount.__str__() + ' in the block number ' + self.blockcount +
-                                ' in the document \'' + xmlfile + '\' the rectangle attribute \'b\' is missing.')
-
-                        try:
-                            rect: Data.Rect = Data.Rect(int(l), int(t), int(r), int(b))
-                        except ValueError:
-                            raise Exceptions.XMLParseError(
-                                    'On the page number ' + self.pagecount.__str__() + ' in the block number ' + self.blockcount +
-                                    ' in the document \'' + xmlfile + '\' one of the rectangle attributes is not a number')
-
-                        block: Data.Block = Data.Block(type, name, rect)
-
-                        for textNode in blockNode:
-
-                            # Again only text nodes will be considered
-
-                            if textNode.tag == '{http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml}text':
-                                for parNode in textNode:
-
-                                    align = parNode.get('align')
-                                    startIndent = parNode.get('startIndent')
-                                    lineSpacing = parNode.get('lineSpacing')
-
-                                    par: Data.Par = Data.Par(align, startIndent, lineSpacing)
-
-                                    for lineNode in parNode:
-
-                                        self.linecount = self.linecount + 1
-
-                                        baseline = lineNode.get('baseline')
-
-                                        l = lineNode.get('l')
-                                        t = lineNode.get('t')
-                                        r = lineNode.get('r')
-                                        b = lineNode.get('b')
-
-                                        if l is None:
-                                            raise Exceptions.XMLParseError(
-                                                'On the page number ' + self.pagecount.__str__() + ' in the block number'
-                                                + self.blockcount.__str__() + ' in the line number ' + self.linecount.__str__() +
-                                                ' in the document \'' + xmlfile +
-                                                '\' the rectangle attribute \'l\' is missing.')
-                                        if t is None:
-                                            raise Exceptions.XMLParseError(
-                                                'On the page number ' + self.pagecount.__str__() + ' in the block number'
-                                                + self.blockcount.__str__() + ' in the line number ' + self.linecount.__str__() +
-                                                ' in the document \'' + xmlfile +
-                                                '\' the rectangle attribute \'t\' is missing.')
-                                        if r is None:
-                                            raise Exceptions.XMLParseError(
-                                                'On the page number ' + self.pagecount.__str__() + ' in the block number'
-                                                + self.blockcount.__str__() + ' in the line number ' + self.linecount.__str__() +
-                                                ' in the document \'' + xmlfile +
-                                                '\' the rectangle attribute \'r\' is missing.')
-                                        if b is None:
-                                            raise Exceptions.XMLParseError(
-                                                'On the page number ' + self.pagecount.__str__() + ' in the block number'
-                                                + self.blockcount.__str__() + ' in the line number ' + self.linecount.__str__() +
-                                                ' in the document \'' + xmlfile +
-                                                '\' the rectangle attribute \'b\' is missing.')
-
-                                        try:
-                                            rect: Data.Rect = Data.Rect(int(l), int(t), int(r), int(b))
-                                        except ValueError:
-                                            raise Exceptions.XMLParseError(
-                                                'On the page number ' + self.pagecount.__str__() + ' in the block number'
-                                                + self.blockcount.__str__() + ' in the line number ' + self.linecount.__str__() +
-                                                ' in the document \'' + xmlfile +
-                                                '\' one of the rectangle attributes is not a number.')
-
-                                        line: Data.Line = Data.Line(baseline, rect)
-
-                                        lang = None
-                                        text = ""
-                                        maxCount = 0
-                                        for formNode in lineNode:
-                                            countChars = 0
-                                            if formNode.text is None or formNode.text == "\n" or formNode.text == "":
-                                                for charNode in formNode:
-                                                    text += charNode.text.__str__()
-                                                    countChars = countChars + 1
-                                                if countChars > maxCount:
-                                                    maxCount = countChars
-                                                    lang = formNode.get('lang')
-
-
-                                            else:
-                                                lang = formNode.get('lang')
-                                                text = formNode.text.__str__()
-
-                                        format: Data.Format = Data.Format(lang, text)
-                                        line.formats.append(format)
-                                        par.lines.append(line)
-
-                                    self.linecount = 0
-                                    block.pars.append(par)
+        :param imgfile: the image file of the pages
+        :param xmlfile: the abbyy xml file
+        :return: a Data.Book class with the pages of this file
+        """
 
+        book: Book = None
+        page: Data.Page = None
+        block: Data.Block = None
+        par: Data.Par = None
+        pagecount, blockcount, linecount = 0, 0, 0
+        # whether the current block is a text block and whether its text node is read
+        in_text_block, in_text = False, False
+
+        try:
+            # only events of the structure are generated, not of the formattings and single chars within the lines
+            for event, node in ET.iterparse(xmlfile, events=('start', 'end'), tag=STRUCTURE_TAGS):
+                tag = node.tag[len(NS_FINE_READER):]
+                if event == 'start':
+                    if tag == 'document':
+                        book = Data.Book(os.path.dirname(xmlfile),
+                                         node.get('{http://www.w3.org/2001/XMLSchema-instance}schemaLocation'),
+                                         node.get('version'), node.get('producer'), node.get('languages'))
+                    elif tag == 'page':
+                        pagecount = pagecount + 1
+                        page = self._read_page(node, pagecount, imgfile, xmlfile)
+                    elif tag == 'block':
+                        blockcount = blockcount + 1
+                        # Checks if the blockType is text, ignoring all other types
+                        in_text_block = node.get('blockType') == 'Text'
+                        if in_text_block:
+                            block = self._read_block(node, pagecount, blockcount, xmlfile)
+                    elif tag == 'text':
+                        # Again only text nodes will be considered
+                        in_text = in_text_block
+                    elif tag == 'par' and in_text:
+                        par = Data.Par(node.get('align'), node.get('startIndent'), node.get('lineSpacing'))
+
+                    continue
+
+                # all children of an element are available at its end
+                if tag == 'line' and in_text:
+                    linecount = linecount + 1
+                    par.lines.append(self._read_line(node, pagecount, blockcount, linecount, xmlfile))
+                elif tag == 'par' and in_text:
+                    linecount = 0
+                    block.pars.append(par)
+                elif tag == 'text':
+                    in_text = False
+                elif tag == 'block':
+                    if in_text_block:
                         page.blocks.append(block)
+                    in_text_block = False
+                elif tag == 'page':
+                    blockcount = 0
+                    book.pages.append(page)
 
-                self.blockcount = 0
-                book.pages.append(page)
+                if tag != 'document':
+                    # the processed elements are released, thus the tree never grows beyond a single line
+                    node.clear()
+                    while node.getprevious() is not None:
+                        del node.getparent()[0]
 
-            self.pagecount = 0
+        except ET.ParseError as e:
+            raise Exceptions.XMLParseError('The xml file \'' + xmlfile + '\' couldn\'t be read because of a '
+                                                                         'syntax error in the xml file. ' + e.msg)
 
-        if not book.pages:
-            raise Exceptions.XMLParseError('In this selected directory there is no suitable data!')
+        if book is None:
+            raise Exceptions.XMLParseError('The xml file \'' + xmlfile + '\' is empty.')
 
         return book
+
+    def _read_page(self, pageNode, pagecount: int, imgfile: str, xmlfile: str) -> Data.Page:
+
+        # Constructs a page class out of the xml data
+        width = pageNode.get('width')
+        height = pageNode.get('height')
+        res = pageNode.get('resolution')
+        oC = pageNode.get('originalCoords')
+
+        # Controls the existence of the variable
+        if width is None:
+            raise Exceptions.XMLParseError('On the page ' + pagecount.__str__() + ' in the document \''
+                                           + xmlfile + '\' the \'width\' attribute is missing in the page tag.')
+        if height is None:
+            raise Exceptions.XMLParseError('On the page ' + pagecount.__str__() + ' in the document \''
+                                           + xmlfile + '\' the \'height\' attribute is missing in the page tag.')
+        if res is None:
+            raise Exceptions.XMLParseError('On the page ' + pagecount.__str__() + ' in the document \''
+                                           + xmlfile + '\' the \'resolution\' attribute '
+                                                       'is missing in the page tag.')
+        if oC is None:
+            raise Exceptions.XMLParseError('On the page ' + pagecount.__str__() + ' in the document \''
+                                           + xmlfile + '\' the \'original coords\' attribute'
+                                                       ' is missing in the page tag.')
+
+        return Data.Page(width, height, res, oC, imgfile, xmlfile)
+
+    def _read_rect(self, node, location: str, xmlfile: str) -> Data.Rect:
+
+        # Reads rectangle data and controls if they are empty
+        values = []
+        for key in ['l', 't', 'r', 'b']:
+            value = node.get(key)
+            if value is None:
+                raise Exceptions.XMLParseError(
+                    location + ' in the document \'' + xmlfile + '\' the rectangle attribute \'' + key +
+                    '\' is missing.')
+
+            values.append(value)
+
+        try:
+            return Data.Rect(*[int(value) for value in values])
+        except ValueError:
+            raise Exceptions.XMLParseError(
+                location + ' in the document \'' + xmlfile + '\' one of the rectangle attributes is not a number.')
+
+    def _read_block(self, blockNode, pagecount: int, blockcount: int, xmlfile: str) -> Data.Block:
+
+        location = 'On the page number ' + pagecount.__str__() + ' in the block number ' + blockcount.__str__()
+        rect = self._read_rect(blockNode, location, xmlfile)
+        return Data.Block(blockNode.get('blockType'), blockNode.get('blockName'), rect)
+
+    def _read_line(self, lineNode, pagecount: int, blockcount: int, linecount: int, xmlfile: str) -> Data.Line:
+
+        location = 'On the page number ' + pagecount.__str__() + ' in the block number' + blockcount.__str__() + \
+                   ' in the line number ' + linecount.__str__()
+        rect = self._read_rect(lineNode, location, xmlfile)
+
+        line: Data.Line = Data.Line(lineNode.get('baseline'), rect)
+
+        lang = None
+        text = ""
+        maxCount = 0
+        for formNode in lineNode:
+            if formNode.text is None or formNode.text == "\n" or formNode.text == "":
+                # the language of the formatting with the most chars is used
+                countChars = len(formNode)
+                if self.read_chars:
+                    for charNode in formNode:
+                        text += charNode.text.__str__()
+                if countChars > maxCount:
+                    maxCount = countChars
+                    lang = formNode.get('lang')
+
+            else:
+                lang = formNode.get('lang')
+                text = formNode.text.__str__()
+
+        format: Data.Format = Data.Format(lang, text)
+        line.formats.append(format)
+        return line
@@ -1,6 +1,6 @@
 from lxml import etree as ET
 import os, stat
-from calamari_ocr.utils.Abbyy.Data import Book
+from calamari_ocr.utils.Abbyy.Data import Book, Page
 from shutil import copy
 
 
@@ -15,15 +15,24 @@ class XMLWriter:
         """
         Initialize an XMLWriter class to write an AbbyyDocument
 
+        The pages can either be written at once (`write`) or incrementally (`add_page` and `close`). Incrementally
+        each xml file is written as soon as the pages of the next xml file are added, thus only the pages of a single
+        xml file are held in memory.
+
         :param imgpath: path of all the image (and xml) files
-        :param book: the abbyy book class which should be written
+        :param book: the abbyy book class which should be written (the meta data is used for all xml files)
         """
 
-        self.directory = savepath + "\\save"
+        self.directory = os.path.join(savepath, "save")
         self.book = book
         self.imgpath = imgpath
         self.savepath = savepath
 
+        # the document of the pages that are not written yet
+        self.root = None
+        self.xmlfile = None
+        self.imgfile = None
+
     def write(self):
 
         """
@@ -31,8 +40,81 @@ class XMLWriter:
         and copy the image files into the path :param self.directory
         """
 
+        for page in self.book.pages:
+            self.add_page(page)
+
+        self.close()
+
+    def add_page(self, page: Page):
+
+        """
+        Adds a page to the document of its xml file. The previous document is written if the page belongs to
+        another xml file.
+
+        :param page: the page to add
+        """
+
+        if self.xmlfile is not None and self.xmlfile != page.xmlFile:
+            self._write_document()
+
+        if self.root is None:
+            self.root = self._create_root()
+
+        pageNode = ET.SubElement(self.root, "page")
+        self._addElement(pageNode, "width", page.width)
+        self._addElement(pageNode, "height", page.height)
+        self._addElement(pageNode, "resolution", page.resolution)
+        self._addElement(pageNode, "originalCoords", page.resolution)
+
+        for block in page.blocks:
+
+            blockNode = ET.SubElement(pageNode, "block")
+            self._addElement(blockNode, "blockType", block.blockType)
+            self._addElement(blockNode, "blockName", block.blockName)
+            self._addElement(blockNode, "l", block.rect.left.__str__())
+            self._addElement(blockNode, "t", block.rect.top.__str__())
+            self._addElement(blockNode, "r", block.rect.right.__str__())
+            self._addElement(blockNode, "b", block.rect.bottom.__str__())
+
+            textNode = ET.SubElement(blockNode, "text")
+
+            for par in block.pars:
+
+                parNode = ET.SubElement(textNode, "par")
+                self._addElement(parNode, "align", par.align)
+                self._addElement(parNode, "startIndent", par.startIndent)
+                self._addElement(parNode, "lineSpacing", par.lineSpacing)
+
+                for line in par.lines:
+
+                    lineNode = ET.SubElement(parNode, "line")
+                    self._addElement(lineNode, "baseline", line.baseline)
+                    self._addElement(lineNode, "l", line.rect.left.__str__())
+                    self._addElement(lineNode, "t", line.rect.top.__str__())
+                    self._addElement(lineNode, "r", line.rect.right.__str__())
+                    self._addElement(lineNode, "b", line.rect.bottom.__str__())
+
+                    for fo in line.formats:
+
+                        foNode = ET.SubElement(lineNode, "formatting")
+                        self._addElement(foNode, "lang", fo.lang)
+                        foNode.text = fo.text
+
+        self.xmlfile = page.xmlFile
+        self.imgfile = page.imgFile
+
+    def close(self):
+
+        """
+        Writes the document of the last added pages
+        """
+
+        if self.root is not None:
+            self._write_document()
+
+    def _create_root(self):
+
         root = ET.Element('document')
-        tree = ET.ElementTree(root)
 
         self._addElement(root, "xmlns", self.book.schemaLocation.split(' ')[0])
         self._addElement(root, "version", self.book.version)
@@ -41,95 +123,28 @@ class XMLWriter:
         NS_XSI: str = "{http://www.w3.org/2001/XMLSchema-instance}"
         root.set(NS_XSI + "schemaLocation",
                  "http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml")
-        oldxmlfile = None
-        oldimgfile = None
 
-        for page in self.book.pages:
+        return root
 
-            if oldxmlfile is not None and oldxmlfile != page.xmlFile:
-                #print(page.xmlFile)
-                try:
-                    os.mkdir(self.directory)
-                    os.chdir(self.directory)
-                except FileExistsError:
-                    os.chdir(self.directory)
-
-                index = len(oldxmlfile.split('\\'))-1
-                tree.write(open(self.directory + '\\' + oldxmlfile.split('\\')[index], 'wb'), encoding='utf-8', xml_declaration=True, pretty_print=True)
-                tree.write(open(self.directory + '\\' + oldxmlfile.split('\\')[index], 'wb'), encoding='utf-8', xml_declaration=True, pretty_print=True)
-                try:
-                    copy(oldimgfile, self.directory)
-                except PermissionError:
-                    pass
-
-                root = ET.Element('document')
-                tree = ET.ElementTree(root)
-
-                self._addElement(root, "xmlns", self.book.schemaLocation.split(' ')[0])
-                self._addElement(root, "version", self.book.version)
-                self._addElement(root, "producer", self.book.producer)
-                self._addElement(root, "languages", self.book.languages)
-                NS_XSI: str = "{http://www.w3.org/2001/XMLSchema-instance}"
-                root.set(NS_XSI + "schemaLocation",
-                         "http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml http://www.abbyy.com/FineReader_xml/FineReader10-schema-v1.xml")
-
-            pageNode = ET.SubElement(root, "page")
-            self._addElement(pageNode, "width", page.width)
-            self._addElement(pageNode, "height", page.height)
-            self._addElement(pageNode, "resolution", page.resolution)
-            self._addElement(pageNode, "originalCoords", page.resolution)
-
-            for block in page.blocks:
-
-                blockNode = ET.SubElement(pageNode, "block")
-                self._addElement(blockNode, "blockType", block.blockType)
-                self._addElement(blockNode, "blockName", block.blockName)
-                self._addElement(blockNode, "l", block.rect.left.__str__())
-                self._addElement(blockNode, "t", block.rect.top.__str__())
-                self._addElement(blockNode, "r", block.rect.right.__str__())
-                self._addElement(blockNode, "b", block.rect.bottom.__str__())
-
-                textNode = ET.SubElement(blockNode, "text")
-
-                for par in block.pars:
-
-                    parNode = ET.SubElement(textNode, "par")
-                    self._addElement(parNode, "align", par.align)
-                    self._addElement(parNode, "startIndent", par.startIndent)
-                    self._addElement(parNode, "lineSpacing", par.lineSpacing)
-
-                    for line in par.lines:
-
-                        lineNode = ET.SubElement(parNode, "line")
-                        self._addElement(lineNode, "baseline", line.baseline)
-                        self._addElement(lineNode, "l", line.rect.left.__str__())
-                        self._addElement(lineNode, "t", line.rect.top.__str__())
-                        self._addElement(lineNode, "r", line.rect.right.__str__())
-                        self._addElement(lineNode, "b", line.rect.bottom.__str__())
-
-                        for fo in line.formats:
-
-                            foNode = ET.SubElement(lineNode, "formatting")
-                            self._addElement(foNode, "lang", fo.lang)
-                            foNode.text = fo.text
-
-            oldxmlfile = page.xmlFile
-            oldimgfile = page.imgFile
+    def _write_document(self):
 
+        """
+        Writes the current document into :param self.directory and copies its image file
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(os.path.join(self.directory, os.path.basename(self.xmlfile)), 'wb') as f:
+            ET.ElementTree(self.root).write(f, encoding='utf-8', xml_declaration=True, pretty_print=True)
         try:
-            os.mkdir(self.directory)
-            os.chdir(self.directory)
-        except FileExistsError:
-            os.chdir(self.directory)
-
-        index = len(oldxmlfile.split('\\')) - 1
-        tree.write(open(self.directory + '\\' + oldxmlfile.split('\\')[index], 'wb'), encoding='utf-8', xml_declaration=True,
-                   pretty_print=True)
-        try:
-            copy(oldimgfile, self.directory)
+            copy(self.imgfile, self.directory)
         except PermissionError:
             pass
 
+        self.root = None
+        self.xmlfile = None
+        self.imgfile = None
+
     def _addElement(self, element, key, value):
 
         """
@@ -143,4 +158,3 @@ class XMLWriter:
 
         if value is not None:
             element.set(key, value)
-
@@ -1,4 +1,4 @@
 from calamari_ocr.utils.running_statistics import RunningStatistics
-from calamari_ocr.utils.multiprocessing import parallel_map
+from calamari_ocr.utils.multiprocessing import parallel_map, prefetch_map, pool_scope, background_iter
 from calamari_ocr.utils.path import split_all_ext, checkpoint_path
 from calamari_ocr.utils.glob import glob_all
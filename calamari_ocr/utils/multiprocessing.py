@@ -1,12 +1,347 @@
+import atexit
 import multiprocessing
 from multiprocessing.pool import ThreadPool
+from collections import deque
+from collections.abc import Sequence
+from contextlib import contextmanager
 import os
+import queue
+import shutil
+import tempfile
+import threading
 import time
 import subprocess
+import numpy as np
 from tqdm import tqdm
 
 
-def parallel_map(f, d, _sentinel=None, desc="", processes=1, progress_bar=False, use_thread_pool=False, max_tasks_per_child=None):
+class SharedArray:
+    def __init__(self, offset, shape, dtype):
+        """ Reference to an array in a scratch file of a `SharedMemoryTransport` """
+        self.offset = offset
+        self.shape = shape
+        self.dtype = dtype
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape, dtype=np.int64)) * self.dtype.itemsize
+
+
+class SharedMemoryTransport:
+    # offsets of the arrays in a scratch file are aligned to cache lines
+    alignment = 64
+
+    def __init__(self, scratch_dir, min_size=16 * 1024):
+        """ Transfer numpy arrays between processes by scratch files instead of pickling them through a pipe
+
+        The arrays of an object (also nested in lists, tuples, and dicts) that are larger than `min_size` are
+        written into one scratch file and replaced by `SharedArray` references, so only the offsets, shapes, and
+        types are pickled. The receiver reads the arrays directly into new arrays and removes the file afterwards,
+        thus the results keep no file descriptors or mappings open. The scratch files should be located in a memory
+        file system (e.g. /dev/shm), see `shared_memory_transport`. If a scratch file can not be written (e.g. if
+        the file system is full) the object is sent as usual.
+
+        Parameters
+        ----------
+        scratch_dir : str
+            directory for the scratch files
+        min_size : int
+            minimum size in bytes of arrays that are transferred by a scratch file
+        """
+        self.scratch_dir = scratch_dir
+        self.min_size = min_size
+
+    def pack(self, obj):
+        """ Write the (large) arrays of `obj` into a new scratch file
+
+        Returns
+        -------
+        tuple
+            the path of the scratch file (None if there are no large arrays) and `obj` with references
+        """
+        arrays = []
+        size = [0]
+
+        def replace(o):
+            if isinstance(o, np.ndarray) and o.nbytes >= self.min_size and not o.dtype.hasobject:
+                arrays.append(o)
+                ref = SharedArray(size[0], o.shape, o.dtype)
+                size[0] += (ref.nbytes + self.alignment - 1) // self.alignment * self.alignment
+                return ref
+            elif type(o) is list:
+                return [replace(x) for x in o]
+            elif type(o) is tuple:
+                return tuple(replace(x) for x in o)
+            elif type(o) is dict:
+                return {k: replace(v) for k, v in o.items()}
+
+            return o
+
+        packed = replace(obj)
+        if len(arrays) == 0:
+            return None, obj
+
+        fd, path = tempfile.mkstemp(dir=self.scratch_dir, suffix=".bin")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for a in arrays:
+                    a = np.ascontiguousarray(a)
+                    f.write(a.data)
+                    f.write(b"\0" * (-a.nbytes % self.alignment))
+        except OSError:
+            self.remove(path)
+            return None, obj
+
+        return path, packed
+
+    def unpack(self, path, packed, remove=False):
+        """ Replace the references in `packed` by the arrays of the scratch file at `path`
+
+        Parameters
+        ----------
+        path : str or None
+            the scratch file as returned by `pack`
+        packed : object
+            the object with references
+        remove : bool
+            remove the scratch file after reading it
+
+        Returns
+        -------
+        object
+            the object with arrays
+        """
+        if path is None:
+            return packed
+
+        def replace(o, f):
+            if isinstance(o, SharedArray):
+                # each array is read into its own memory, thus the results keep neither a mapping nor a file open
+                a = np.empty(o.shape, dtype=o.dtype)
+                f.seek(o.offset)
+                f.readinto(a.reshape(-1).view(np.uint8))
+                return a
+            elif type(o) is list:
+                return [replace(x, f) for x in o]
+            elif type(o) is tuple:
+                return tuple(replace(x, f) for x in o)
+            elif type(o) is dict:
+                return {k: replace(v, f) for k, v in o.items()}
+
+            return o
+
+        with open(path, "rb") as f:
+            obj = replace(packed, f)
+
+        if remove:
+            self.remove(path)
+
+        return obj
+
+    def function(self, f):
+        return SharedMemoryFunction(f, self)
+
+    def receive(self, task_output):
+        """ Unpack the output of a `SharedMemoryFunction` and remove all of its scratch files """
+        input_path, output_path, packed = task_output
+        if input_path is not None:
+            self.remove(input_path)
+
+        return self.unpack(output_path, packed, remove=True)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SharedMemoryFunction:
+    def __init__(self, f, transport):
+        """ Apply `f` on packed inputs of a `SharedMemoryTransport` and pack its output """
+        self.f = f
+        self.transport = transport
+
+    def __call__(self, task_input):
+        input_path, packed = task_input
+        output_path, packed = self.transport.pack(self.f(self.transport.unpack(input_path, packed)))
+        return input_path, output_path, packed
+
+
+@contextmanager
+def shared_memory_transport(min_size=16 * 1024):
+    """ Create a `SharedMemoryTransport` with a temporary scratch directory (in /dev/shm if available) """
+    scratch_dir = tempfile.mkdtemp(prefix="calamari_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    try:
+        yield SharedMemoryTransport(scratch_dir, min_size=min_size)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# number of active `pool_scope`s and the keys of the pools that were created within them
+_pool_users = 0
+_scoped_pool_keys = set()
+
+
+def get_pool(processes, max_tasks_per_child=None):
+    """ Long-lived process pool that is shared by all calls of `parallel_map` and `prefetch_map`
+
+    Creating a pool forks (and on some platforms re-imports) the complete application for each worker, which is
+    expensive, especially after TensorFlow is loaded. Thus one pool per configuration is created lazily and reused
+    by all components (preprocessing, text processing, evaluation, ...). A pool that is created within a
+    `pool_scope` lives until the outermost scope is left, any other pool until `shutdown_pools` (which is called at
+    exit). Pools of other (e.g. forked) processes are never reused.
+
+    Parameters
+    ----------
+    processes : int
+        number of worker processes
+    max_tasks_per_child : int or None
+        number of tasks after which a worker is replaced, None for workers that live as long as the pool
+
+    Returns
+    -------
+    multiprocessing.Pool
+    """
+    key = (os.getpid(), processes, max_tasks_per_child)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = multiprocessing.Pool(processes=processes, maxtasksperchild=max_tasks_per_child)
+            _pools[key] = pool
+            if _pool_users > 0:
+                _scoped_pool_keys.add(key)
+
+        return pool
+
+
+def discard_pool(pool):
+    """ Terminate a pool of `get_pool`, e.g. if it was interrupted and still processes tasks """
+    with _pools_lock:
+        for key, p in list(_pools.items()):
+            if p is pool:
+                del _pools[key]
+                _scoped_pool_keys.discard(key)
+
+    pool.terminate()
+
+
+def shutdown_pools():
+    """ Close all pools of `get_pool` of this process and wait for their workers """
+    with _pools_lock:
+        pools = [pool for (pid, _, _), pool in _pools.items() if pid == os.getpid()]
+        _pools.clear()
+        _scoped_pool_keys.clear()
+
+    _close_pools(pools)
+
+
+def _close_pools(pools):
+    for pool in pools:
+        pool.close()
+        pool.join()
+
+
+atexit.register(shutdown_pools)
+
+
+def acquire_pools():
+    """ Register a user of the pools of `get_pool`, see `pool_scope` """
+    global _pool_users
+    with _pools_lock:
+        _pool_users += 1
+
+
+def release_pools():
+    """ Unregister a user of the pools of `get_pool`, the pools of the scopes are shut down if it was the last one """
+    global _pool_users
+    with _pools_lock:
+        _pool_users -= 1
+        pools = []
+        if _pool_users == 0:
+            pools = [_pools.pop(key) for key in _scoped_pool_keys if key in _pools and key[0] == os.getpid()]
+            _scoped_pool_keys.clear()
+
+    _close_pools(pools)
+
+
+@contextmanager
+def pool_scope():
+    """ Keep the pools of `get_pool` alive within this scope
+
+    The scopes of e.g. a training and of the predictions of its early stopping may be nested, the pools that were
+    created within the scopes are shut down when the outermost scope is left. Pools that were created outside of
+    any scope live until exit, even if they are used within a scope.
+    """
+    acquire_pools()
+    try:
+        yield
+    finally:
+        release_pools()
+
+
+def auto_chunksize(n, processes, cost, min_chunk_time=0.05, chunks_per_process=4):
+    """ Number of elements that are sent at once to a worker
+
+    The chunks are large enough to take at least `min_chunk_time` seconds, so that the costs of the inter process
+    communication are amortized for cheap functions, but small enough that each process gets about
+    `chunks_per_process` chunks to balance the load.
+
+    Parameters
+    ----------
+    n : int
+        number of elements
+    processes : int
+        number of processes
+    cost : float
+        (measured) time in seconds to process a single element
+
+    Returns
+    -------
+    int
+    """
+    balanced = n // (processes * chunks_per_process)
+    amortized = int(np.ceil(min_chunk_time / max(cost, 1e-6)))
+    return max(1, min(balanced, amortized))
+
+
+def parallel_map(f, d, _sentinel=None, desc="", processes=1, progress_bar=False, use_thread_pool=False, max_tasks_per_child=None,
+                 shared_memory=True, chunksize=None):
+    """ Apply `f` on all elements of `d` in parallel, the order is preserved
+
+    Processes of the long-lived pool of `get_pool` are used, or a new thread pool if `use_thread_pool` is set.
+
+    Parameters
+    ----------
+    f : callable
+        function to apply on each element
+    d : iterable
+        the data
+    desc : str
+        description of the progress bar
+    processes : int
+        number of processes (or threads) to use. If <= 0 all cpus are used
+    progress_bar : bool
+        show a progress bar
+    use_thread_pool : bool
+        use threads instead of processes
+    max_tasks_per_child : int or None
+        replace worker processes after this number of tasks
+    shared_memory : bool
+        transfer numpy arrays between the processes by scratch files, see `SharedMemoryTransport`
+    chunksize : int or None
+        number of elements that are sent at once to a worker. By default, if more elements than processes are
+        mapped by the process pool, the first element is processed in this process to measure the cost of `f` and
+        the chunk size is chosen by `auto_chunksize`. Otherwise the default chunk size of the pool is used
+
+    Returns
+    -------
+    list
+        the results
+    """
     if _sentinel:
         raise Exception("You must call parallel_map by using parameter names to specify additional parameters besides the default map(func, data).")
 
@@ -15,25 +350,171 @@ def parallel_map(f, d, _sentinel=None, desc="", processes=1, progress_bar=False,
 
     if processes == 1:
         if progress_bar:
-            out = list(tqdm(map(f, d), desc=desc, total=len(d)))
+            return list(tqdm(map(f, d), desc=desc, total=len(d)))
         else:
-            out = list(map(f, d))
+            return list(map(f, d))
 
-    else:
-        if use_thread_pool:
-            with ThreadPool(processes=processes) as pool:
-                if progress_bar:
-                    out = list(tqdm(pool.imap(f, d), desc=desc, total=len(d)))
-                else:
-                    out = pool.map(f, d)
+    out = []
+    if chunksize is None and not use_thread_pool and isinstance(d, Sequence) and len(d) > processes:
+        # measure the cost of f on the first element, the thread pools and small data are scheduled as usual
+        start = time.time()
+        out.append(f(d[0]))
+        chunksize = auto_chunksize(len(d) - 1, processes, time.time() - start)
+        d = d[1:]
+
+    # without a chunk size the defaults of the pool are used
+    chunk_args = {} if chunksize is None else {"chunksize": chunksize}
+
+    def run(pool, f, tasks, receive=None):
+        if progress_bar:
+            results = tqdm(pool.imap(f, tasks, **chunk_args), desc=desc, initial=len(out), total=len(out) + len(d))
+        else:
+            results = pool.map(f, tasks, **chunk_args)
+
+        return [receive(r) for r in results] if receive else list(results)
+
+    if use_thread_pool:
+        with ThreadPool(processes=processes) as pool:
+            return out + run(pool, f, d)
+
+    pool = get_pool(processes, max_tasks_per_child)
+    try:
+        if shared_memory:
+            # numpy arrays are transferred by scratch files, see SharedMemoryTransport
+            with shared_memory_transport() as transport:
+                return out + run(pool, transport.function(f), (transport.pack(x) for x in d), transport.receive)
+        else:
+            return out + run(pool, f, d)
+    except (KeyboardInterrupt, SystemExit):
+        # do not leave the remaining tasks running in the shared pool
+        discard_pool(pool)
+        raise
+
+
+def prefetch_map(f, chunks, _sentinel=None, processes=1, prefetch=2, use_thread_pool=False, shared_memory=True):
+    """ Lazily apply `f` to all elements of each chunk in a background process (or thread) pool
+
+    The chunks are processed asynchronously and in order by the pool while the consumer works on the previous
+    results. At most `prefetch` chunks are processed in advance, which bounds the memory consumption.
+
+    Parameters
+    ----------
+    f : callable
+        function to apply on each element
+    chunks : iterable of list
+        the chunks of data
+    processes : int
+        number of processes to use. If <= 0 all cpus are used
+    prefetch : int
+        number of chunks to process ahead of the consumer
+    use_thread_pool : bool
+        use threads instead of processes, e.g. if `f` releases the GIL (like image decoding)
+    shared_memory : bool
+        transfer numpy arrays between the processes by scratch files, see `SharedMemoryTransport`
+
+    Yields
+    ------
+    list
+        the processed chunk
+    """
+    if _sentinel:
+        raise Exception("You must call prefetch_map by using parameter names to specify additional parameters besides the default map(func, data).")
+
+    if processes <= 0:
+        processes = os.cpu_count()
+
+    def run(pool, f, tasks, receive=lambda x: x):
+        pending = deque()
+        for chunk in tasks:
+            pending.append(pool.map_async(f, chunk))
+            if len(pending) > prefetch:
+                yield [receive(r) for r in pending.popleft().get()]
+
+        while len(pending) > 0:
+            yield [receive(r) for r in pending.popleft().get()]
+
+    if use_thread_pool:
+        with ThreadPool(processes=processes) as pool:
+            yield from run(pool, f, chunks)
+
+        return
+
+    pool = get_pool(processes)
+    try:
+        if shared_memory:
+            with shared_memory_transport() as transport:
+                yield from run(pool, transport.function(f), ([transport.pack(x) for x in chunk] for chunk in chunks),
+                               transport.receive)
         else:
-            with multiprocessing.Pool(processes=processes, maxtasksperchild=max_tasks_per_child) as pool:
-                if progress_bar:
-                    out = list(tqdm(pool.imap(f, d), desc=desc, total=len(d)))
-                else:
-                    out = pool.map(f, d)
+            yield from run(pool, f, chunks)
+    except (KeyboardInterrupt, SystemExit):
+        # do not leave the remaining tasks running in the shared pool
+        discard_pool(pool)
+        raise
+
+
+def background_iter(iterable, maxsize=2):
+    """ Iterate `iterable` in a background thread
+
+    The elements are produced by the background thread while the consumer works on the previous ones, at most
+    `maxsize` elements are produced ahead of the consumer, which bounds the memory consumption. Chaining several
+    background iterators yields a pipeline whose stages run concurrently. Exceptions of the producer are raised in
+    the consumer, the producer is stopped if the consumer stops early.
+
+    Parameters
+    ----------
+    iterable : iterable
+        the elements, e.g. a generator that does the work of a pipeline stage
+    maxsize : int
+        maximum number of elements that are produced ahead
+
+    Yields
+    ------
+    the elements of `iterable`
+    """
+    elements = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+    end = object()
+
+    def put(element):
+        while not stopped.is_set():
+            try:
+                elements.put(element, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def produce():
+        try:
+            for element in iterable:
+                if not put((element, None)):
+                    return
+
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+        finally:
+            # stops nested background iterators (or other generators) as well
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            element, exception = elements.get()
+            if element is end:
+                if exception is not None:
+                    raise exception
+
+                return
 
-    return out
+            yield element
+    finally:
+        stopped.set()
+        thread.join()
 
 
 def prefix_run_command(command, prefix, args):